@@ -0,0 +1,40 @@
+"""add user autocomplete indexes
+
+Revision ID: 0b2d4f6a8c1e
+Revises: e8f0a2c4d6b9
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b2d4f6a8c1e'
+down_revision: Union[str, None] = 'e8f0a2c4d6b9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Expressions must match app/models/user.py and app/core/autocomplete.py
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_prefix "
+            "ON users ((lower(username) COLLATE \"C\"))"
+        )
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_autocomplete_trgm ON users USING gin "
+            "(lower(username || ' ' || coalesce(first_name, '') || ' ' || coalesce(last_name, '')) gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_autocomplete_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_username_prefix")
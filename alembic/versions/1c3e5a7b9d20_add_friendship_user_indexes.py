@@ -0,0 +1,45 @@
+"""add friendship user indexes
+
+Revision ID: 1c3e5a7b9d20
+Revises: 0b2d4f6a8c1e
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c3e5a7b9d20'
+down_revision: Union[str, None] = '0b2d4f6a8c1e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Both sides of a user's friendships, built concurrently to keep friend requests flowing
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_friendships_sender_id_status", "friendships", ["sender_id", "status", "receiver_id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_friendships_receiver_id_status", "friendships", ["receiver_id", "status", "sender_id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_friendships_receiver_id_status", table_name="friendships",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_friendships_sender_id_status", table_name="friendships",
+            postgresql_concurrently=True,
+        )
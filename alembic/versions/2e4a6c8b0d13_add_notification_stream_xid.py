@@ -0,0 +1,65 @@
+"""add notification stream xid
+
+Revision ID: 2e4a6c8b0d13
+Revises: 1c3e5a7b9d20
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e4a6c8b0d13'
+down_revision: Union[str, None] = '1c3e5a7b9d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows updated per backfill statement, every batch commits on its own
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Added without a default, then the default is set for new rows only: a volatile
+    # default on ADD COLUMN would rewrite the whole table
+    op.add_column("notifications", sa.Column("stream_xid", sa.BigInteger(), nullable=True))
+    op.alter_column(
+        "notifications", "stream_xid", server_default=sa.text("(pg_current_xact_id()::text::bigint)"))
+
+    # Existing rows come before anything the stream sends from now on
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        params = {"batch_size": BACKFILL_BATCH_SIZE}
+        last_id = None
+        while True:
+            last_id = bind.execute(sa.text(
+                """
+                WITH batch AS (
+                    SELECT id FROM notifications {} ORDER BY id LIMIT :batch_size
+                ), filled AS (
+                    UPDATE notifications SET stream_xid = 0
+                    FROM batch WHERE notifications.id = batch.id AND notifications.stream_xid IS NULL
+                )
+                SELECT id FROM batch ORDER BY id DESC LIMIT 1
+                """.format("WHERE id > :last_id" if last_id else "")
+            ), params).scalar()
+            if last_id is None:
+                break
+            params["last_id"] = last_id
+        op.create_index(
+            "ix_notifications_user_id_stream_xid_id", "notifications", ["user_id", "stream_xid", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_notifications_user_id_stream_xid_id", table_name="notifications",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("notifications", "stream_xid")
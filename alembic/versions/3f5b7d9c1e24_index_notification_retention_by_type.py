@@ -0,0 +1,44 @@
+"""index notification retention by type
+
+Revision ID: 3f5b7d9c1e24
+Revises: 2e4a6c8b0d13
+Create Date: 2026-10-18 01:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f5b7d9c1e24'
+down_revision: Union[str, None] = '2e4a6c8b0d13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The purge walks every type up to its own TTL, the new index replaces the global walk's
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_notifications_type_created_at_id",
+            "notifications",
+            ["type", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.drop_index("ix_notifications_created_at_id", table_name="notifications", postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_notifications_created_at_id",
+            "notifications",
+            ["created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_notifications_type_created_at_id", table_name="notifications", postgresql_concurrently=True)
@@ -0,0 +1,38 @@
+"""add message keyset indexes
+
+Revision ID: 3f9a1c2b7d10
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2b7d10'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_messages_group_id_created_at_id",
+        "messages",
+        ["group_id", "created_at", "id"],
+    )
+    op.create_index(
+        "ix_messages_sender_id_receiver_id_created_at",
+        "messages",
+        ["sender_id", "receiver_id", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_sender_id_receiver_id_created_at", table_name="messages")
+    op.drop_index("ix_messages_group_id_created_at_id", table_name="messages")
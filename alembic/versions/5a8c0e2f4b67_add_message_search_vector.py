@@ -0,0 +1,80 @@
+"""add message search vector
+
+Revision ID: 5a8c0e2f4b67
+Revises: e1f3a5c7d902
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a8c0e2f4b67'
+down_revision: Union[str, None] = 'e1f3a5c7d902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Rows filled per backfill statement, every batch commits on its own
+BACKFILL_BATCH_SIZE = 10000
+
+# Keeps search_vector in sync on insert and edit, must match app/models/messages.py
+SEARCH_VECTOR_FUNCTION = """
+CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('simple', NEW.content);
+    RETURN NEW;
+END
+$$
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A nullable column without default is a catalog change only; a stored
+    # generated column would rewrite the whole table under an exclusive lock
+    op.add_column("messages", sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True))
+    op.execute(SEARCH_VECTOR_FUNCTION)
+    op.execute(
+        "CREATE TRIGGER messages_search_vector_update BEFORE INSERT OR UPDATE OF content ON messages "
+        "FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()"
+    )
+
+    # Backfill the existing rows in keyset batches on id, each in its own transaction
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        params = {"batch_size": BACKFILL_BATCH_SIZE}
+        last_id = None
+        while True:
+            # The batch is the next ids in order, rows already filled by the trigger are skipped
+            last_id = bind.execute(sa.text(
+                """
+                WITH batch AS (
+                    SELECT id FROM messages {} ORDER BY id LIMIT :batch_size
+                ), filled AS (
+                    UPDATE messages SET search_vector = to_tsvector('simple', messages.content)
+                    FROM batch WHERE messages.id = batch.id AND messages.search_vector IS NULL
+                )
+                SELECT id FROM batch ORDER BY id DESC LIMIT 1
+                """.format("WHERE id > :last_id" if last_id else "")
+            ), params).scalar()
+            if last_id is None:
+                break
+            params["last_id"] = last_id
+        op.create_index(
+            "ix_messages_search_vector", "messages", ["search_vector"],
+            postgresql_using="gin", postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_messages_search_vector", table_name="messages", postgresql_concurrently=True)
+    op.execute("DROP TRIGGER IF EXISTS messages_search_vector_update ON messages")
+    op.execute("DROP FUNCTION IF EXISTS messages_search_vector_update()")
+    op.drop_column("messages", "search_vector")
@@ -0,0 +1,209 @@
+"""partition messages by month
+
+The copy, the row count check and the swap run in the migration's single
+transaction, with messages locked in SHARE ROW EXCLUSIVE mode first: reads go
+on, but every write to messages waits until the migration commits, so no row
+can be committed after the copy and lost with the old table. Plan for message
+sends to stall for the duration of the copy.
+
+Revision ID: 7d1e3f5a9c24
+Revises: 5a8c0e2f4b67
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d1e3f5a9c24'
+down_revision: Union[str, None] = '5a8c0e2f4b67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Future months created up front, the application keeps extending this on startup
+MONTHS_AHEAD = 3
+
+COPIED_COLUMNS = (
+    "id, sender_id, receiver_id, group_id, conversation_id, content, search_vector, attachment_id, "
+    "is_read, is_edited, reply_to_message_id, created_at, edited_at, updated_at"
+)
+
+# Foreign keys pointing at messages.id; a partitioned table's id alone is not unique
+REFERENCING_FOREIGN_KEYS = (
+    ("attachments", "attachments_message_id_fkey"),
+    ("notifications", "notifications_message_id_fkey"),
+    ("read_cursors", "read_cursors_last_read_message_id_fkey"),
+    ("messages", "messages_reply_to_message_id_fkey"),
+)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    op.execute(
+        """
+        CREATE TABLE messages_partitioned (
+            id UUID NOT NULL,
+            sender_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            receiver_id UUID REFERENCES users (id) ON DELETE CASCADE,
+            group_id UUID REFERENCES groups (id) ON DELETE CASCADE,
+            conversation_id UUID,
+            content TEXT NOT NULL,
+            search_vector TSVECTOR,
+            attachment_id UUID REFERENCES attachments (id) ON DELETE SET NULL,
+            is_read BOOLEAN,
+            is_edited BOOLEAN,
+            reply_to_message_id UUID,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            edited_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE,
+            PRIMARY KEY (id, created_at),
+            CHECK (NOT(receiver_id IS NULL AND group_id IS NULL)),
+            CHECK (NOT(receiver_id IS NOT NULL AND group_id IS NOT NULL))
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+
+    # Writes wait from here to the commit, so the copy below sees every row
+    op.execute("LOCK TABLE messages IN SHARE ROW EXCLUSIVE MODE")
+
+    # One partition per month from the oldest message up to MONTHS_AHEAD from now
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM messages")).scalar()
+    today = datetime.now(timezone.utc).date().replace(day=1)
+    month = oldest.date().replace(day=1) if oldest else today
+    last = _add_months(today, MONTHS_AHEAD)
+    months = []
+    while month <= last:
+        months.append(month)
+        op.execute(
+            f"CREATE TABLE messages_y{month.year}m{month.month:02d} PARTITION OF messages_partitioned "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')"
+        )
+        month = _add_months(month, 1)
+    # Catches rows past the last monthly partition, the app moves them out when it creates their month
+    op.execute("CREATE TABLE messages_default PARTITION OF messages_partitioned DEFAULT")
+
+    # Copy one month at a time, each INSERT writes into a single partition; all
+    # of it is one transaction under the lock taken above
+    op.execute("UPDATE messages SET created_at = now() WHERE created_at IS NULL")
+    for month in months:
+        bind.execute(sa.text(
+            f"INSERT INTO messages_partitioned ({COPIED_COLUMNS}) "
+            f"SELECT {COPIED_COLUMNS} FROM messages WHERE created_at >= :start AND created_at < :end"
+        ), {
+            "start": datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+            "end": datetime(_add_months(month, 1).year, _add_months(month, 1).month, 1, tzinfo=timezone.utc),
+        })
+    bind.execute(sa.text(
+        f"INSERT INTO messages_partitioned ({COPIED_COLUMNS}) SELECT {COPIED_COLUMNS} FROM messages WHERE created_at >= :end"
+    ), {"end": datetime(_add_months(last, 1).year, _add_months(last, 1).month, 1, tzinfo=timezone.utc)})
+
+    # Never drop the source table unless every row made it across
+    source = bind.execute(sa.text("SELECT count(*) FROM messages")).scalar()
+    copied = bind.execute(sa.text("SELECT count(*) FROM messages_partitioned")).scalar()
+    if source != copied:
+        raise RuntimeError(f"Copied {copied} of {source} messages into the partitioned table, aborting.")
+
+    for table, constraint in REFERENCING_FOREIGN_KEYS:
+        op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}")
+    op.drop_table("messages")
+    op.rename_table("messages_partitioned", "messages")
+    # Row triggers on a partitioned table apply to every partition (Postgres 13+)
+    op.execute(
+        "CREATE TRIGGER messages_search_vector_update BEFORE INSERT OR UPDATE OF content ON messages "
+        "FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()"
+    )
+
+    # Indexes on the parent are created on every partition
+    op.create_index("ix_messages_id", "messages", ["id"])
+    op.create_index("ix_messages_group_id_created_at_id", "messages", ["group_id", "created_at", "id"])
+    op.create_index(
+        "ix_messages_conversation_id_created_at_id", "messages", ["conversation_id", "created_at", "id"])
+    op.create_index("ix_messages_search_vector", "messages", ["search_vector"], postgresql_using="gin")
+    op.create_index("ix_attachments_message_id", "attachments", ["message_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    op.execute(
+        """
+        CREATE TABLE messages_unpartitioned (
+            id UUID PRIMARY KEY,
+            sender_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            receiver_id UUID REFERENCES users (id) ON DELETE CASCADE,
+            group_id UUID REFERENCES groups (id) ON DELETE CASCADE,
+            conversation_id UUID,
+            content TEXT NOT NULL,
+            search_vector TSVECTOR,
+            attachment_id UUID REFERENCES attachments (id) ON DELETE SET NULL,
+            is_read BOOLEAN,
+            is_edited BOOLEAN,
+            reply_to_message_id UUID,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            edited_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE,
+            CHECK (NOT(receiver_id IS NULL AND group_id IS NULL)),
+            CHECK (NOT(receiver_id IS NOT NULL AND group_id IS NOT NULL))
+        )
+        """
+    )
+
+    # Same as the upgrade, writes wait until the migration commits
+    op.execute("LOCK TABLE messages IN SHARE ROW EXCLUSIVE MODE")
+    # Copy partition by partition (archived partitions are not part of the table and are not restored)
+    partitions = bind.execute(sa.text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = 'messages'"
+    )).scalars().all()
+    for partition in partitions:
+        op.execute(
+            f"INSERT INTO messages_unpartitioned ({COPIED_COLUMNS}) SELECT {COPIED_COLUMNS} FROM {partition}"
+        )
+    source = bind.execute(sa.text("SELECT count(*) FROM messages")).scalar()
+    copied = bind.execute(sa.text("SELECT count(*) FROM messages_unpartitioned")).scalar()
+    if source != copied:
+        raise RuntimeError(f"Copied {copied} of {source} messages back into the plain table, aborting.")
+
+    op.drop_table("messages")
+    op.rename_table("messages_unpartitioned", "messages")
+    op.execute(
+        "CREATE TRIGGER messages_search_vector_update BEFORE INSERT OR UPDATE OF content ON messages "
+        "FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()"
+    )
+    op.create_index("ix_messages_id", "messages", ["id"])
+    op.create_index("ix_messages_group_id_created_at_id", "messages", ["group_id", "created_at", "id"])
+    op.create_index(
+        "ix_messages_conversation_id_created_at_id", "messages", ["conversation_id", "created_at", "id"])
+    op.create_index("ix_messages_search_vector", "messages", ["search_vector"], postgresql_using="gin")
+    op.drop_index("ix_attachments_message_id", table_name="attachments")
+
+    # Referencing rows whose message is gone (e.g. dropped partitions) cannot get their foreign key back
+    op.execute("DELETE FROM attachments WHERE message_id IS NOT NULL AND message_id NOT IN (SELECT id FROM messages)")
+    op.execute("UPDATE notifications SET message_id = NULL WHERE message_id NOT IN (SELECT id FROM messages)")
+    op.execute(
+        "UPDATE read_cursors SET last_read_message_id = NULL "
+        "WHERE last_read_message_id NOT IN (SELECT id FROM messages)")
+    op.execute(
+        "UPDATE messages SET reply_to_message_id = NULL "
+        "WHERE reply_to_message_id NOT IN (SELECT id FROM messages)")
+    op.create_foreign_key("attachments_message_id_fkey", "attachments", "messages", ["message_id"], ["id"])
+    op.create_foreign_key(
+        "notifications_message_id_fkey", "notifications", "messages", ["message_id"], ["id"], ondelete="SET NULL")
+    op.create_foreign_key(
+        "read_cursors_last_read_message_id_fkey", "read_cursors", "messages",
+        ["last_read_message_id"], ["id"], ondelete="SET NULL")
+    op.create_foreign_key(
+        "messages_reply_to_message_id_fkey", "messages", "messages", ["reply_to_message_id"], ["id"])
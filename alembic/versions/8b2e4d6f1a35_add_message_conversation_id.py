@@ -0,0 +1,85 @@
+"""add message conversation id
+
+Revision ID: 8b2e4d6f1a35
+Revises: 3f9a1c2b7d10
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a35'
+down_revision: Union[str, None] = '3f9a1c2b7d10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows updated per backfill statement, every batch commits on its own
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("messages", sa.Column("conversation_id", postgresql.UUID(as_uuid=True), nullable=True))
+
+    # Backfill direct messages in keyset batches on id, each in its own transaction;
+    # mirrors app.models.messages.get_conversation_id
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        params = {"batch_size": BACKFILL_BATCH_SIZE}
+        last_id = None
+        while True:
+            # The batch is the next ids in order, rows already written by the app are skipped
+            last_id = bind.execute(sa.text(
+                """
+                WITH batch AS (
+                    SELECT id FROM messages {} ORDER BY id LIMIT :batch_size
+                ), filled AS (
+                    UPDATE messages SET conversation_id = md5(
+                        least(sender_id, receiver_id)::text || ':' || greatest(sender_id, receiver_id)::text
+                    )::uuid
+                    FROM batch
+                    WHERE messages.id = batch.id
+                    AND messages.receiver_id IS NOT NULL AND messages.conversation_id IS NULL
+                )
+                SELECT id FROM batch ORDER BY id DESC LIMIT 1
+                """.format("WHERE id > :last_id" if last_id else "")
+            ), params).scalar()
+            if last_id is None:
+                break
+            params["last_id"] = last_id
+
+        # Built without blocking writes to the tables
+        op.create_index(
+            "ix_messages_conversation_id_created_at_id",
+            "messages",
+            ["conversation_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_messages_sender_id_receiver_id_created_at", table_name="messages", postgresql_concurrently=True)
+        op.create_index(
+            "ix_friendships_user_pair",
+            "friendships",
+            [sa.text("least(sender_id, receiver_id)"), sa.text("greatest(sender_id, receiver_id)")],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_friendships_user_pair", table_name="friendships", postgresql_concurrently=True)
+        op.create_index(
+            "ix_messages_sender_id_receiver_id_created_at",
+            "messages",
+            ["sender_id", "receiver_id", "created_at"],
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_messages_conversation_id_created_at_id", table_name="messages", postgresql_concurrently=True)
+    op.drop_column("messages", "conversation_id")
@@ -0,0 +1,32 @@
+"""add message reply index
+
+Revision ID: 9e4b6d8f0a13
+Revises: 7d1e3f5a9c24
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4b6d8f0a13'
+down_revision: Union[str, None] = '7d1e3f5a9c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_messages_reply_to_message_id_created_at",
+        "messages",
+        ["reply_to_message_id", "created_at"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_messages_reply_to_message_id_created_at", table_name="messages")
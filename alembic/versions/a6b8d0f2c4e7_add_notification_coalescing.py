@@ -0,0 +1,39 @@
+"""add notification coalescing
+
+Revision ID: a6b8d0f2c4e7
+Revises: f5a7c9e1b3d6
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6b8d0f2c4e7'
+down_revision: Union[str, None] = 'f5a7c9e1b3d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("notifications", sa.Column("coalesce_key", sa.String(), nullable=True))
+    op.add_column("notifications", sa.Column("count", sa.Integer(), server_default="1", nullable=False))
+    # Existing rows have no coalesce_key, so the index starts empty
+    op.create_index(
+        "uq_notifications_unread_coalesce_key",
+        "notifications",
+        ["user_id", "type", "coalesce_key"],
+        unique=True,
+        postgresql_where=sa.text("is_read IS NOT true AND coalesce_key IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("uq_notifications_unread_coalesce_key", table_name="notifications")
+    op.drop_column("notifications", "count")
+    op.drop_column("notifications", "coalesce_key")
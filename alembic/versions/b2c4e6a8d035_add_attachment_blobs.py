@@ -0,0 +1,44 @@
+"""add attachment blobs
+
+Revision ID: b2c4e6a8d035
+Revises: 9e4b6d8f0a13
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2c4e6a8d035'
+down_revision: Union[str, None] = '9e4b6d8f0a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "blobs",
+        sa.Column("digest", sa.String(length=64), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("content_type", sa.String(), nullable=True),
+        sa.Column("storage_key", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("digest"),
+    )
+    op.add_column("attachments", sa.Column("size", sa.BigInteger(), nullable=True))
+    op.add_column("attachments", sa.Column("digest", sa.String(length=64), nullable=True))
+    op.create_foreign_key("attachments_digest_fkey", "attachments", "blobs", ["digest"], ["digest"])
+    op.create_index("ix_attachments_digest", "attachments", ["digest"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_attachments_digest", table_name="attachments")
+    op.drop_constraint("attachments_digest_fkey", "attachments", type_="foreignkey")
+    op.drop_column("attachments", "digest")
+    op.drop_column("attachments", "size")
+    op.drop_table("blobs")
@@ -0,0 +1,46 @@
+"""add read cursors
+
+Revision ID: c4d7e9a2b6f1
+Revises: 8b2e4d6f1a35
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d7e9a2b6f1'
+down_revision: Union[str, None] = '8b2e4d6f1a35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "read_cursors",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("conversation_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("group_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("last_read_message_id", postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column("last_read_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.CheckConstraint("NOT(conversation_id IS NULL AND group_id IS NULL)"),
+        sa.CheckConstraint("NOT(conversation_id IS NOT NULL AND group_id IS NOT NULL)"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["group_id"], ["groups.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["last_read_message_id"], ["messages.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "conversation_id", name="uq_read_cursors_user_id_conversation_id"),
+        sa.UniqueConstraint("user_id", "group_id", name="uq_read_cursors_user_id_group_id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("read_cursors")
@@ -0,0 +1,35 @@
+"""add notification retention index
+
+Revision ID: c7d9f1b3e5a8
+Revises: a6b8d0f2c4e7
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d9f1b3e5a8'
+down_revision: Union[str, None] = 'a6b8d0f2c4e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_notifications_created_at_id",
+            "notifications",
+            ["created_at", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_notifications_created_at_id", table_name="notifications", postgresql_concurrently=True)
@@ -0,0 +1,62 @@
+"""add unread counters
+
+Revision ID: e1f3a5c7d902
+Revises: c4d7e9a2b6f1
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f3a5c7d902'
+down_revision: Union[str, None] = 'c4d7e9a2b6f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+counter_scope = postgresql.ENUM("CONVERSATION", "GROUP", "NOTIFICATIONS", name="counterscope", create_type=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    counter_scope.create(op.get_bind(), checkfirst=True)
+    op.create_table(
+        "unread_counters",
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("scope", counter_scope, nullable=False),
+        sa.Column("scope_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("unread_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id", "scope", "scope_id"),
+    )
+
+    # Seed the counters from the existing unread state
+    op.execute(
+        """
+        INSERT INTO unread_counters (user_id, scope, scope_id, unread_count)
+        SELECT receiver_id, 'CONVERSATION', sender_id, count(*)
+        FROM messages
+        WHERE receiver_id IS NOT NULL AND NOT coalesce(is_read, false)
+        GROUP BY receiver_id, sender_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO unread_counters (user_id, scope, scope_id, unread_count)
+        SELECT user_id, 'NOTIFICATIONS', user_id, count(*)
+        FROM notifications
+        WHERE NOT coalesce(is_read, false)
+        GROUP BY user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("unread_counters")
+    counter_scope.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,45 @@
+"""add notification listing indexes
+
+Revision ID: f5a7c9e1b3d6
+Revises: d4f6a8c0e2b5
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a7c9e1b3d6'
+down_revision: Union[str, None] = 'd4f6a8c0e2b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently, notifications is large and written to constantly
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_notifications_user_id_created_at_id",
+            "notifications",
+            ["user_id", "created_at", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_notifications_user_id_unread",
+            "notifications",
+            ["user_id", "created_at", "id"],
+            postgresql_where=sa.text("is_read IS NOT true"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_notifications_user_id_unread", table_name="notifications", postgresql_concurrently=True)
+        op.drop_index(
+            "ix_notifications_user_id_created_at_id", table_name="notifications", postgresql_concurrently=True)
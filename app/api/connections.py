@@ -0,0 +1,129 @@
+"""This script houses the WebSocket connection registry for the chat app.
+Every connected client gets a bounded send queue drained by its own task, so
+fan-out only enqueues events and a slow client can never stall delivery to
+everyone else. A client whose queue overflows is disconnected and is expected
+to reconnect and catch up through the message history endpoints."""
+
+from app.core.config import settings
+from app.core.presence import presence_tracker
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette import status
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Connection:
+    """A single WebSocket connection and its bounded send queue."""
+
+    def __init__(self, user_id: UUID, websocket: WebSocket, max_queue_size: int) -> None:
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._sender: Optional[asyncio.Task] = None
+
+    def push(self, event: Dict[str, Any]) -> bool:
+        """Enqueues an event without waiting.
+        Returns:
+            bool: False if the queue is full."""
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _send_loop(self) -> None:
+        """Drains the send queue into the socket."""
+        try:
+            while True:
+                event = await self.queue.get()
+                await self.websocket.send_json(event)
+        except (WebSocketDisconnect, RuntimeError):
+            # The client went away
+            pass
+
+    async def _receive_loop(self) -> None:
+        """Reads incoming frames until the client disconnects.
+        They are only used as keep-alives (presence heartbeats) for now."""
+        while True:
+            await self.websocket.receive_text()
+            await presence_tracker.heartbeat(self.user_id)
+
+    async def serve(self) -> None:
+        """Runs the connection until the client disconnects or the sender stops.
+        The sender and the receiver are watched together: when the sender ends
+        for any reason (a dropped socket, an event that cannot be encoded) the
+        socket is closed, instead of leaving a client connected that no longer
+        gets any event."""
+        self._sender = asyncio.create_task(self._send_loop())
+        receiver = asyncio.create_task(self._receive_loop())
+        try:
+            await asyncio.wait({self._sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            self._sender.cancel()
+            receiver.cancel()
+            await asyncio.gather(self._sender, receiver, return_exceptions=True)
+
+        if not receiver.cancelled() and receiver.exception() is not None:
+            if isinstance(receiver.exception(), WebSocketDisconnect):
+                return
+            raise receiver.exception()
+        # The sender stopped first, the client would never hear from us again
+        if not self._sender.cancelled() and self._sender.exception() is not None:
+            logger.error(
+                "WebSocket sender of user %s failed", self.user_id, exc_info=self._sender.exception())
+            await self.close(code=status.WS_1011_INTERNAL_ERROR)
+        else:
+            await self.close()
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE) -> None:
+        """Stops the sender and closes the socket."""
+        if self._sender:
+            self._sender.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except RuntimeError:
+            # The socket is already closed
+            pass
+
+
+class ConnectionManager:
+    """Registry of the open connections of this worker, keyed by user id."""
+
+    def __init__(self, max_queue_size: int) -> None:
+        self.max_queue_size = max_queue_size
+        self._connections: Dict[UUID, Set[Connection]] = {}
+
+    def register(self, user_id: UUID, websocket: WebSocket) -> Connection:
+        """Registers an accepted WebSocket for a user."""
+        connection = Connection(user_id, websocket, self.max_queue_size)
+        self._connections.setdefault(user_id, set()).add(connection)
+        return connection
+
+    def unregister(self, connection: Connection) -> None:
+        """Removes a connection from the registry."""
+        connections = self._connections.get(connection.user_id)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self._connections[connection.user_id]
+
+    def is_connected(self, user_id: UUID) -> bool:
+        """Checks if a user has at least one open connection on this worker."""
+        return user_id in self._connections
+
+    async def deliver(self, user_ids: List[UUID], event: Dict[str, Any]) -> None:
+        """Enqueues an event on every connection of the given users.
+        This is the broker handler; it never awaits a socket write."""
+        for user_id in set(user_ids):
+            for connection in list(self._connections.get(user_id, ())):
+                if not connection.push(event):
+                    logger.warning("Dropping slow WebSocket consumer for user %s", user_id)
+                    self.unregister(connection)
+                    asyncio.create_task(connection.close(code=status.WS_1013_TRY_AGAIN_LATER))
+
+manager = ConnectionManager(settings.WS_SEND_QUEUE_SIZE)
@@ -0,0 +1,57 @@
+"""Shared dependencies for the API routes."""
+
+from app.core.cache import detached_copy, principal_cache
+from app.core.config import settings
+from app.crud.user import get_user_by_id
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.token import TokenPayload
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from uuid import UUID
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+
+
+async def get_user_from_token(db: AsyncSession, token: str) -> Optional[User]:
+    """Resolves the user an access token was issued for.
+    Users are served from the principal cache when possible, so authenticating
+    a request usually costs no query; the cached copy is merged into the
+    session without loading it.
+    Args:
+        db (AsyncSession): The database session.
+        token (str): The encoded access token.
+    Returns:
+        Optional[User]: The user, or None if the token is invalid."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        token_data = TokenPayload(**payload)
+        user_id = UUID(token_data.sub)
+    except (JWTError, ValidationError, TypeError, ValueError):
+        return None
+    cached = principal_cache.get(user_id)
+    if cached is not None:
+        return await db.merge(cached, load=False)
+    user = await get_user_by_id(db, user_id)
+    if user:
+        principal_cache.set(user_id, detached_copy(user))
+    return user
+
+async def get_current_user(
+        db: AsyncSession = Depends(get_db),
+        token: str = Depends(oauth2_scheme)) -> User:
+    """Returns the authenticated, active user of the request."""
+    user = await get_user_from_token(db, token)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user")
+    return user
@@ -0,0 +1,48 @@
+"""API routes for friends."""
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.friend_graph import friend_graph
+from app.crud.user import get_users_by_ids
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.friendship import FriendSuggestion, FriendSuggestions, MutualFriends
+from app.schemas.user import User as UserSchema
+from fastapi import APIRouter, Depends, Query
+from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[UserSchema])
+async def read_friends(
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> List[UserSchema]:
+    """Get the caller's friends, from the friend graph and the user profile cache."""
+    friend_ids = await friend_graph.friends(db, current_user.id)
+    profiles = await get_users_by_ids(db, friend_ids)
+    return sorted(profiles.values(), key=lambda profile: profile.username or "")
+
+@router.get("/suggestions", response_model=FriendSuggestions)
+async def read_friend_suggestions(
+        limit: int = Query(10, ge=1, le=settings.FRIEND_SUGGESTIONS_MAX_RESULTS),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> FriendSuggestions:
+    """Suggest friends of friends, ranked by the number of mutual friends."""
+    suggestions = await friend_graph.suggestions(db, current_user.id, limit)
+    profiles = await get_users_by_ids(db, [user_id for user_id, _ in suggestions])
+    return FriendSuggestions(items=[
+        FriendSuggestion(user=profiles[user_id], mutual_friends=count)
+        for user_id, count in suggestions if user_id in profiles
+    ])
+
+@router.get("/{user_id}/mutual", response_model=MutualFriends)
+async def read_mutual_friends(
+        user_id: UUID4,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> MutualFriends:
+    """Get the friends the caller has in common with another user."""
+    mutual = await friend_graph.mutual_friends(db, current_user.id, user_id)
+    return MutualFriends(user_id=user_id, count=len(mutual), friend_ids=sorted(mutual))
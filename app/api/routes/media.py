@@ -0,0 +1,53 @@
+"""API routes serving attachment content."""
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.security import verify_upload_token
+from app.core.storage import object_store
+from app.crud.attachment import get_blob
+from app.crud.message import is_blob_visible
+from app.db.database import get_db
+from app.models.user import User
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+router = APIRouter()
+
+
+async def _may_download(db: AsyncSession, user: User, digest: str, upload_token: Optional[str]) -> bool:
+    """Check if the user uploaded the content or may see a message attaching it."""
+    if upload_token:
+        try:
+            if verify_upload_token(upload_token, user.id) == digest:
+                return True
+        except ValueError:
+            pass
+    return await is_blob_visible(db, user.id, digest)
+
+@router.get("/{digest}")
+async def download(
+        digest: str = Path(..., pattern="^[0-9a-f]{64}$"),
+        upload_token: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> StreamingResponse:
+    """Stream the content of an uploaded file from the object store.
+    The caller must see a message with an attachment of this content, or pass
+    the upload token they got for it (e.g. to preview a file not sent yet).
+    Anything else is a 404, whether the content exists or not. Objects are
+    content-addressed and never change, so clients may cache them forever."""
+    if not await _may_download(db, current_user, digest, upload_token):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    blob = await get_blob(db, digest)
+    if blob is None or not await object_store.exists(blob.storage_key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return StreamingResponse(
+        object_store.read(blob.storage_key, settings.ATTACHMENT_DOWNLOAD_CHUNK_SIZE),
+        media_type=blob.content_type or "application/octet-stream",
+        headers={
+            "Content-Length": str(blob.size),
+            "ETag": f'"{blob.digest}"',
+            "Cache-Control": "private, max-age=31536000, immutable",
+        },
+    )
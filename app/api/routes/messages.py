@@ -0,0 +1,329 @@
+"""API routes for messages."""
+
+from app.api.deps import get_current_user
+from app.core.config import settings
+from app.core.pagination import cursor_for, encode_ranked_cursor
+from app.core.security import create_upload_token
+from app.core.storage import object_store
+from app.crud.attachment import store_blob
+from app.crud.group import is_group_member
+from app.crud.message import (
+    create_messages_bulk, export_messages, get_conversation_messages, get_group_messages, get_message_thread,
+    get_visible_message_ids, mark_conversation_as_read, search_messages)
+from app.crud.reaction import add_reaction, get_reaction_summaries, remove_reaction
+from app.crud.read_cursor import advance_read_cursor, get_read_cursor, get_unread_count
+from app.crud.user import get_users_by_ids
+from app.db.database import async_session_maker, get_db
+from app.models.user import User
+from app.schemas.message import (
+    Attachment, AttachmentUpload, Message, MessageBulkCreate, MessageBulkResult, MessageInDBBase, MessagePage,
+    MessageSearchHit, MessageSearchPage, MessageThread, MessageThreadNode, ReactionSummaries, ReactionSummary)
+from app.schemas.read_cursor import MarkAsRead, ReadCursor, ReadCursorUpdate, UnreadCount
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, status
+from fastapi.responses import StreamingResponse
+from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Dict, List, Optional
+import json
+import zlib
+
+router = APIRouter()
+
+
+async def _ndjson(records: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Encode records as newline-delimited JSON."""
+    async for record in records:
+        yield (json.dumps(record, default=str) + "\n").encode()
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip a byte stream incrementally."""
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+async def _message_page(
+        db: AsyncSession, messages: List[Any], limit: int, before: Optional[str], after: Optional[str]) -> MessagePage:
+    """Build a history page (newest first) with the reaction counts of its messages
+    and the profiles of their senders, served from the user profile cache.
+    next_cursor is passed as `before` to load older messages, prev_cursor as
+    `after` to load newer ones; each is only set when there may be such messages."""
+    summaries = await get_reaction_summaries(db, [message.id for message in messages])
+    senders = await get_users_by_ids(db, [message.sender_id for message in messages])
+    items = [
+        Message(
+            **MessageInDBBase.model_validate(message, from_attributes=True).model_dump(),
+            attachments=[Attachment.model_validate(attachment, from_attributes=True) for attachment in message.attachments],
+            reactions=summaries[message.id],
+        )
+        for message in messages
+    ]
+    has_older = bool(after) or len(messages) == limit
+    has_newer = len(messages) == limit if after else bool(before)
+    return MessagePage(
+        items=items,
+        senders=senders,
+        next_cursor=cursor_for(messages[-1]) if messages and has_older else None,
+        prev_cursor=cursor_for(messages[0]) if messages and has_newer else None,
+    )
+
+
+@router.post("/bulk", response_model=MessageBulkResult, status_code=status.HTTP_201_CREATED)
+async def create_messages_in_bulk(
+        batch: MessageBulkCreate,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> MessageBulkResult:
+    """Create a batch of messages in one transaction and return their ids in input order."""
+    try:
+        ids = await create_messages_bulk(db, batch.messages, current_user.id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return MessageBulkResult(ids=ids)
+
+
+@router.put("/read-cursor", response_model=ReadCursor)
+async def update_read_cursor(
+        cursor_in: ReadCursorUpdate,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> ReadCursor:
+    """Mark everything up to a message as read in a conversation or group."""
+    try:
+        cursor = await advance_read_cursor(
+            db, current_user.id, cursor_in.message_id,
+            group_id=cursor_in.group_id, other_user_id=cursor_in.other_user_id)
+        if cursor is None:
+            # Either the watermark is already past the message or the message is not in this chat
+            cursor = await get_read_cursor(
+                db, current_user.id, group_id=cursor_in.group_id, other_user_id=cursor_in.other_user_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if cursor is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found in this chat")
+    return ReadCursor.model_validate(cursor, from_attributes=True)
+
+@router.put("/conversations/{other_user_id}/read", response_model=ReadCursor)
+async def read_conversation(
+        other_user_id: UUID4,
+        mark_in: MarkAsRead,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> ReadCursor:
+    """Advance the caller's conversation read watermark to a message or timestamp (now if neither is given)."""
+    try:
+        cursor = await mark_conversation_as_read(
+            db, current_user.id, other_user_id, up_to_message_id=mark_in.up_to_message_id, up_to=mark_in.up_to)
+        if cursor is None:
+            cursor = await get_read_cursor(db, current_user.id, other_user_id=other_user_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if cursor is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No message to mark as read in this conversation")
+    return ReadCursor.model_validate(cursor, from_attributes=True)
+
+@router.put("/groups/{group_id}/read", response_model=ReadCursor)
+async def read_group(
+        group_id: UUID4,
+        mark_in: MarkAsRead,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> ReadCursor:
+    """Advance the caller's group read watermark to a message or timestamp (now if neither is given)."""
+    up_to = mark_in.up_to
+    if not mark_in.up_to_message_id and not up_to:
+        up_to = datetime.now(timezone.utc)
+    try:
+        cursor = await advance_read_cursor(
+            db, current_user.id, mark_in.up_to_message_id, group_id=group_id, up_to=up_to)
+        if cursor is None:
+            cursor = await get_read_cursor(db, current_user.id, group_id=group_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    if cursor is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No message to mark as read in this group")
+    return ReadCursor.model_validate(cursor, from_attributes=True)
+
+@router.get("/conversations/{other_user_id}", response_model=MessagePage)
+async def read_conversation_history(
+        other_user_id: UUID4,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=100),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> MessagePage:
+    """Get a page of a conversation's history, newest first (the latest messages without a cursor)."""
+    try:
+        messages = await get_conversation_messages(
+            db, current_user.id, other_user_id, limit=limit, before=before, after=after)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return await _message_page(db, messages, limit, before, after)
+
+@router.get("/groups/{group_id}", response_model=MessagePage)
+async def read_group_history(
+        group_id: UUID4,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=100),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> MessagePage:
+    """Get a page of a group's history, newest first (the latest messages without a cursor)."""
+    if not await is_group_member(db, group_id, current_user.id):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of the group.")
+    try:
+        messages = await get_group_messages(db, group_id, limit=limit, before=before, after=after)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return await _message_page(db, messages, limit, before, after)
+
+@router.get("/unread-count", response_model=UnreadCount)
+async def read_unread_count(
+        group_id: Optional[UUID4] = None,
+        other_user_id: Optional[UUID4] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> UnreadCount:
+    """Count the messages above the caller's read watermark in a conversation or group."""
+    try:
+        unread = await get_unread_count(db, current_user.id, group_id=group_id, other_user_id=other_user_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return UnreadCount(unread=unread)
+
+@router.get("/search", response_model=MessageSearchPage)
+async def search(
+        q: str = Query(..., min_length=1),
+        group_id: Optional[UUID4] = None,
+        other_user_id: Optional[UUID4] = None,
+        limit: int = Query(20, ge=1, le=100),
+        cursor: Optional[str] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> MessageSearchPage:
+    """Search the caller's conversations and groups, optionally within one chat."""
+    try:
+        hits = await search_messages(
+            db, current_user.id, q, group_id=group_id, other_user_id=other_user_id, limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    items = [
+        MessageSearchHit(**MessageInDBBase.model_validate(hit.message, from_attributes=True).model_dump(), rank=hit.rank)
+        for hit in hits
+    ]
+    next_cursor = None
+    if len(hits) == limit:
+        last = hits[-1]
+        next_cursor = encode_ranked_cursor(last.rank, last.created_at, last.message_id)
+    return MessageSearchPage(items=items, next_cursor=next_cursor)
+
+@router.get("/export")
+async def export_history(
+        other_user_id: Optional[UUID4] = None,
+        group_id: Optional[UUID4] = None,
+        compress: bool = False,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> StreamingResponse:
+    """Stream the full history of a conversation or group as NDJSON, optionally gzip-compressed."""
+    if bool(other_user_id) == bool(group_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Exactly one of other_user_id or group_id must be provided.")
+    if group_id:
+        if not await is_group_member(db, group_id, current_user.id):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of the group.")
+
+    # The export opens its own short-lived sessions, the request session is not held while streaming
+    body = _ndjson(export_messages(async_session_maker, current_user.id, other_user_id=other_user_id, group_id=group_id))
+    filename = f"messages-{group_id or other_user_id}.ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}{".gz" if compress else ""}"'}
+    if compress:
+        return StreamingResponse(_gzip(body), media_type="application/gzip", headers=headers)
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+@router.post("/attachments", response_model=AttachmentUpload, status_code=status.HTTP_201_CREATED)
+async def upload_attachment(
+        request: Request,
+        file_name: str = Query(..., min_length=1),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> AttachmentUpload:
+    """Upload a file as the raw request body.
+    The body is streamed to the object store and deduplicated by content; the
+    returned file name, digest and upload token are then sent as one of a
+    message's attachments."""
+    content_type = request.headers.get("content-type") or "application/octet-stream"
+    try:
+        blob, deduplicated = await store_blob(db, request.stream(), content_type)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(exc))
+    return AttachmentUpload(
+        file_name=file_name,
+        file_url=object_store.url_for(blob.storage_key),
+        file_type=content_type,
+        size=blob.size,
+        digest=blob.digest,
+        upload_token=create_upload_token(current_user.id, blob.digest),
+        deduplicated=deduplicated,
+    )
+
+@router.get("/reactions", response_model=ReactionSummaries)
+async def read_reactions(
+        message_ids: List[UUID4] = Query(..., max_length=200),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> ReactionSummaries:
+    """Get the reaction counts of a page of messages (two queries, whatever the page size).
+    Messages the user cannot see are left out."""
+    visible = await get_visible_message_ids(db, current_user.id, message_ids)
+    summaries = await get_reaction_summaries(db, visible)
+    return ReactionSummaries(items=[
+        ReactionSummary(message_id=message_id, reactions=summaries[message_id])
+        for message_id in message_ids if message_id in summaries
+    ])
+
+
+@router.get("/{message_id}/thread", response_model=MessageThread)
+async def read_thread(
+        message_id: UUID4,
+        max_depth: int = Query(settings.THREAD_MAX_DEPTH, ge=0, le=settings.THREAD_MAX_DEPTH),
+        max_replies: int = Query(settings.THREAD_MAX_REPLIES, ge=1, le=settings.THREAD_MAX_REPLIES),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> MessageThread:
+    """Get a message and its replies, flattened depth-first, in one query."""
+    await _visible_message_or_404(db, message_id, current_user)
+    nodes = await get_message_thread(db, message_id, max_depth=max_depth, max_replies=max_replies)
+    if not nodes:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+    reactions = await get_reaction_summaries(db, [message.id for message, _, _ in nodes])
+    return MessageThread(items=[
+        MessageThreadNode(
+            **MessageInDBBase.model_validate(message, from_attributes=True).model_dump(),
+            depth=depth, reply_count=reply_count, reactions=reactions[message.id])
+        for message, depth, reply_count in nodes
+    ])
+
+
+async def _visible_message_or_404(db: AsyncSession, message_id: UUID4, user: User) -> None:
+    """Raise 404 unless the message exists and the user may see it."""
+    if not await get_visible_message_ids(db, user.id, [message_id]):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Message not found")
+
+@router.put("/{message_id}/reactions/{emoji}", response_model=ReactionSummary)
+async def react(
+        message_id: UUID4,
+        emoji: str = Path(..., min_length=1, max_length=32),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> ReactionSummary:
+    """React to a message; reacting twice with the same emoji is a no-op."""
+    await _visible_message_or_404(db, message_id, current_user)
+    await add_reaction(db, message_id, current_user.id, emoji)
+    summaries = await get_reaction_summaries(db, [message_id])
+    return ReactionSummary(message_id=message_id, reactions=summaries[message_id])
+
+@router.delete("/{message_id}/reactions/{emoji}", response_model=ReactionSummary)
+async def unreact(
+        message_id: UUID4,
+        emoji: str = Path(..., min_length=1, max_length=32),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> ReactionSummary:
+    """Remove a reaction from a message."""
+    await _visible_message_or_404(db, message_id, current_user)
+    await remove_reaction(db, message_id, current_user.id, emoji)
+    summaries = await get_reaction_summaries(db, [message_id])
+    return ReactionSummary(message_id=message_id, reactions=summaries[message_id])
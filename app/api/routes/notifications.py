@@ -0,0 +1,137 @@
+"""API routes for notifications."""
+
+from app.api.deps import get_current_user, get_user_from_token
+from app.core.config import settings
+from app.core.notification_stream import notification_broadcaster
+from app.core.pagination import cursor_for, decode_position_cursor, encode_position_cursor
+from app.crud.notifications import get_notifications_after, get_user_notifications, mark_all_notifications_as_read
+from app.crud.unread_counter import get_badge_counts
+from app.db.database import async_session_maker, get_db
+from app.models.notification import Notification, NotificationType as NotificationTypeModel
+from app.models.user import User
+from app.schemas.notification import NotificationPage, NotificationType
+from app.schemas.read_cursor import MarkAsReadResult
+from app.schemas.unread_counter import BadgeCounts
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Dict, Optional
+from uuid import UUID
+import asyncio
+import json
+
+router = APIRouter()
+
+# Rows read per wake-up of a live stream
+STREAM_BATCH_SIZE = 100
+
+
+def _stream_cursor(notification: Notification) -> str:
+    """The live stream cursor pointing at a notification."""
+    return encode_position_cursor(notification.stream_xid or 0, notification.id)
+
+def _notification_event(notification: Notification) -> Dict[str, Any]:
+    """Build the payload of a notification sent on the live stream."""
+    return {
+        "id": str(notification.id),
+        "type": notification.type.value,
+        "content": notification.content,
+        "count": notification.count,
+        "sender_id": str(notification.sender_id) if notification.sender_id else None,
+        "group_id": str(notification.group_id) if notification.group_id else None,
+        "message_id": str(notification.message_id) if notification.message_id else None,
+        "friendship_id": str(notification.friendship_id) if notification.friendship_id else None,
+        "is_read": bool(notification.is_read),
+        "created_at": notification.created_at.isoformat(),
+    }
+
+async def _notification_stream(request: Request, user_id: UUID, cursor: Optional[str]) -> AsyncIterator[bytes]:
+    """Yield the user's new notifications as Server-Sent Events.
+    The event id is the notification's stream cursor, so a reconnecting client resumes
+    through Last-Event-ID. Every wake-up reads the rows after the last sent event
+    in a short-lived session, no connection is held while the stream is idle."""
+    wake = notification_broadcaster.subscribe(user_id)
+    try:
+        if cursor is None:
+            async with async_session_maker() as db:
+                latest = await get_notifications_after(db, user_id, None)
+            cursor = _stream_cursor(latest[0]) if latest else encode_position_cursor(0, UUID(int=0))
+        yield b"retry: 5000\n\n"
+        while not await request.is_disconnected():
+            # Cleared before reading, a signal arriving meanwhile triggers another read
+            wake.clear()
+            async with async_session_maker() as db:
+                notifications = await get_notifications_after(db, user_id, cursor, limit=STREAM_BATCH_SIZE)
+            for notification in notifications:
+                cursor = _stream_cursor(notification)
+                data = json.dumps(_notification_event(notification))
+                yield f"id: {cursor}\nevent: notification\ndata: {data}\n\n".encode()
+            if len(notifications) == STREAM_BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), settings.NOTIFICATION_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing the idle connection
+                yield b": keep-alive\n\n"
+    finally:
+        notification_broadcaster.unsubscribe(user_id, wake)
+
+
+@router.get("/", response_model=NotificationPage)
+async def read_notifications(
+        is_read: Optional[bool] = None,
+        before: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=100),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> NotificationPage:
+    """List the caller's notifications, newest first.
+    Pass the returned next_cursor as `before` to fetch older notifications."""
+    try:
+        notifications = await get_user_notifications(
+            db, current_user.id, is_read=is_read, limit=limit, before=before)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return NotificationPage(
+        items=notifications,
+        next_cursor=cursor_for(notifications[-1]) if len(notifications) == limit else None,
+    )
+
+@router.get("/stream")
+async def stream_notifications(
+        request: Request,
+        token: str = Query(...),
+        last_event_id: Optional[str] = Header(None)) -> StreamingResponse:
+    """Stream the caller's notifications as Server-Sent Events as they are created.
+    The access token is passed as a query parameter since EventSource cannot set
+    headers. Reconnections resume after the Last-Event-ID the browser sends."""
+    async with async_session_maker() as db:
+        user = await get_user_from_token(db, token)
+    if not user or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    if last_event_id:
+        try:
+            decode_position_cursor(last_event_id)
+        except ValueError as exc:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return StreamingResponse(
+        _notification_stream(request, user.id, last_event_id or None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/badges", response_model=BadgeCounts)
+async def read_badge_counts(
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> BadgeCounts:
+    """Get the caller's unread counts per conversation and group plus unread notifications."""
+    return BadgeCounts(**await get_badge_counts(db, current_user.id))
+
+@router.put("/read-all", response_model=MarkAsReadResult)
+async def read_all_notifications(
+        type: Optional[NotificationType] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> MarkAsReadResult:
+    """Mark all of the caller's notifications, or all of one type, as read."""
+    updated = await mark_all_notifications_as_read(
+        db, current_user.id, NotificationTypeModel(type.value) if type else None)
+    return MarkAsReadResult(updated=updated)
@@ -0,0 +1,28 @@
+"""API routes for user presence."""
+
+from app.api.deps import get_current_user
+from app.core.presence import get_presence, presence_tracker
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.presence import Presence, PresenceList
+from fastapi import APIRouter, Depends, Query, status
+from pydantic import UUID4
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+router = APIRouter()
+
+
+@router.get("/", response_model=PresenceList)
+async def read_presence(
+        user_ids: List[UUID4] = Query(..., max_length=500),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> PresenceList:
+    """Get the presence of many users at once, e.g. the caller's friend list."""
+    presence = await get_presence(db, user_ids)
+    return PresenceList(items=[Presence(**vars(entry)) for entry in presence])
+
+@router.post("/heartbeat", status_code=status.HTTP_204_NO_CONTENT)
+async def heartbeat(current_user: User = Depends(get_current_user)) -> None:
+    """Keep the caller online, for clients without an open WebSocket."""
+    await presence_tracker.heartbeat(current_user.id)
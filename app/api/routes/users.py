@@ -0,0 +1,29 @@
+"""API routes for users."""
+
+from app.api.deps import get_current_user
+from app.core.autocomplete import autocomplete_backend
+from app.core.config import settings
+from app.db.database import get_db
+from app.models.user import User
+from app.schemas.user import UserSuggestion, UserSuggestions
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter()
+
+
+@router.get("/autocomplete", response_model=UserSuggestions)
+async def autocomplete_users(
+        q: str = Query(..., min_length=1, max_length=64),
+        limit: int = Query(10, ge=1, le=settings.AUTOCOMPLETE_MAX_RESULTS),
+        db: AsyncSession = Depends(get_db),
+        current_user: User = Depends(get_current_user)) -> UserSuggestions:
+    """Suggest users for the add-friend and invite boxes.
+    Username prefix matches come first, then first or last name prefixes, then fuzzy matches."""
+    suggestions = await autocomplete_backend.complete(db, q, limit, exclude=current_user.id)
+    return UserSuggestions(items=[
+        UserSuggestion(
+            user_id=suggestion.user_id, username=suggestion.username,
+            first_name=suggestion.first_name, last_name=suggestion.last_name)
+        for suggestion in suggestions
+    ])
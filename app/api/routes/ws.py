@@ -0,0 +1,31 @@
+"""The WebSocket gateway pushing real-time events to connected clients."""
+
+from app.api.connections import manager
+from app.api.deps import get_user_from_token
+from app.core.presence import presence_tracker
+from app.db.database import async_session_maker
+from fastapi import APIRouter, Query, WebSocket, status
+
+router = APIRouter()
+
+
+@router.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket, token: str = Query(...)) -> None:
+    """Streams new direct and group messages to the authenticated user.
+    The access token is passed as a query parameter since browsers cannot set
+    headers on WebSocket requests."""
+    # Use a short-lived session so an idle socket does not pin a pooled connection
+    async with async_session_maker() as db:
+        user = await get_user_from_token(db, token)
+    if not user or not user.is_active:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    connection = manager.register(user.id, websocket)
+    await presence_tracker.connect(user.id)
+    try:
+        await connection.serve()
+    finally:
+        manager.unregister(connection)
+        await presence_tracker.disconnect(user.id)
@@ -0,0 +1,234 @@
+"""This script defines the user autocomplete backends of the chat app.
+Both backends answer the "add friend" and "invite to group" boxes: prefix
+matches on the username come first, then prefix matches on a first or last
+name, then (Postgres only) fuzzy matches, and at most AUTOCOMPLETE_MAX_RESULTS
+suggestions are returned. The Postgres backend reads the expression indexes of
+the users table; the in-memory backend keeps a sorted prefix index in the
+worker, for tests and small deployments."""
+
+from abc import ABC, abstractmethod
+from app.core.config import settings
+from app.models.user import User
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from sqlalchemy import case, func, literal, literal_column, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+# Queries shorter than this only match username prefixes; trigrams need three characters
+TRIGRAM_MIN_LENGTH = 3
+
+# Same expressions as the indexes declared on the users table. The constants are
+# inlined, a bound parameter would keep the planner from matching the index
+USERNAME_KEY = func.lower(User.username).collate("C")
+AUTOCOMPLETE_TEXT = func.lower(
+    User.username + literal_column("' '") + func.coalesce(User.first_name, literal_column("''"))
+    + literal_column("' '") + func.coalesce(User.last_name, literal_column("''")))
+
+
+def normalize(query: str) -> str:
+    """Lowercases and trims an autocomplete query."""
+    return " ".join(query.lower().split())
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """The smallest string greater than every string starting with prefix (in the C collation)."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def _escape_like(value: str) -> str:
+    """Escapes the LIKE wildcards of a user-provided value."""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@dataclass
+class UserSuggestion:
+    """A user matching an autocomplete query; lower ranks come first."""
+    user_id: UUID
+    username: str
+    first_name: Optional[str]
+    last_name: Optional[str]
+    rank: float
+
+
+class AutocompleteBackend(ABC):
+    """The interface every autocomplete backend implements."""
+
+    @abstractmethod
+    async def complete(
+            self, db: AsyncSession, query: str, limit: int, exclude: Optional[UUID] = None) -> List[UserSuggestion]:
+        """Returns the best suggestions for what the user typed.
+        Args:
+            db (AsyncSession): The database session.
+            query (str): The typed text.
+            limit (int): The maximum number of suggestions, capped by AUTOCOMPLETE_MAX_RESULTS.
+            exclude (Optional[UUID]): A user never suggested, e.g. the one typing.
+        Returns:
+            List[UserSuggestion]: The suggestions, best first."""
+
+    async def index_users(self, users: Iterable[User]) -> None:
+        """Adds or refreshes users in the index (after create or update)."""
+
+    async def remove_users(self, user_ids: Iterable[UUID]) -> None:
+        """Removes deleted users from the index."""
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """Loads the index from the database, for backends keeping their own."""
+
+
+class PostgresAutocompleteBackend(AutocompleteBackend):
+    """Backend using the username prefix and trigram indexes of the users table.
+    Username prefixes are always an index range scan on lower(username) that
+    stops after `limit` rows. Queries of three characters or more fill the
+    remaining slots with name prefixes and fuzzy matches (substrings and word
+    similarity) read through the GIN trigram index; at most
+    AUTOCOMPLETE_FUZZY_CANDIDATES of them are scored, so a common trigram does
+    not rank the whole table."""
+
+    async def complete(self, db, query, limit, exclude=None):
+        query = normalize(query)
+        limit = min(limit, settings.AUTOCOMPLETE_MAX_RESULTS)
+        if not query:
+            return []
+        columns = (User.id, User.username, User.first_name, User.last_name)
+        active = [User.is_active.is_not(False)]
+        if exclude:
+            active.append(User.id != exclude)
+
+        # A range instead of LIKE, so prepared (generic) plans still use the index
+        result = await db.execute(
+            select(*columns, literal(0.0))
+            .filter(USERNAME_KEY >= query, USERNAME_KEY < _prefix_upper_bound(query), *active)
+            .order_by(USERNAME_KEY)
+            .limit(limit)
+        )
+        rows = result.all()
+        if len(rows) < limit and len(query) >= TRIGRAM_MIN_LENGTH:
+            prefix = _escape_like(query) + "%"
+            candidates = (
+                select(*columns, AUTOCOMPLETE_TEXT.label("text"))
+                .filter(
+                    or_(
+                        AUTOCOMPLETE_TEXT.like("%" + _escape_like(query) + "%"),
+                        # Word similarity above pg_trgm.word_similarity_threshold
+                        literal(query).op("<%")(AUTOCOMPLETE_TEXT),
+                    ),
+                    # Already suggested as username prefixes
+                    ~func.lower(User.username).like(prefix),
+                    *active,
+                )
+                # Keep the closest matches when more than the cap qualify
+                .order_by(func.word_similarity(query, AUTOCOMPLETE_TEXT).desc())
+                .limit(settings.AUTOCOMPLETE_FUZZY_CANDIDATES)
+                .subquery()
+            )
+            name_prefix = or_(
+                func.lower(candidates.c.first_name).like(prefix),
+                func.lower(candidates.c.last_name).like(prefix),
+            )
+            rank = case((name_prefix, 1), else_=2) - func.word_similarity(query, candidates.c.text)
+            result = await db.execute(
+                select(
+                    candidates.c.id, candidates.c.username, candidates.c.first_name, candidates.c.last_name, rank)
+                .order_by(rank, func.lower(candidates.c.username))
+                .limit(limit - len(rows))
+            )
+            rows.extend(result.all())
+        return [
+            UserSuggestion(user_id=user_id, username=username, first_name=first_name, last_name=last_name, rank=rank)
+            for user_id, username, first_name, last_name, rank in rows
+        ]
+
+
+class InMemoryAutocompleteBackend(AutocompleteBackend):
+    """Backend keeping sorted (key, user id) lists in the worker, one for
+    lowercased usernames and one for first and last names.
+    A lookup is a binary search per list and reads at most `limit` entries past
+    it, whatever the number of users. Fuzzy matching is not supported."""
+
+    def __init__(self) -> None:
+        self._usernames: List[Tuple[str, UUID]] = []
+        self._names: List[Tuple[str, UUID]] = []
+        self._users: Dict[UUID, Tuple[str, Optional[str], Optional[str]]] = {}
+
+    @staticmethod
+    def _name_keys(user_id: UUID, first_name: Optional[str], last_name: Optional[str]):
+        return {(normalize(name), user_id) for name in (first_name, last_name) if name}
+
+    @staticmethod
+    def _discard(keys: List[Tuple[str, UUID]], key: Tuple[str, UUID]) -> None:
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            del keys[index]
+
+    async def index_users(self, users):
+        for user in users:
+            await self.remove_users([user.id])
+            if user.is_active is False:
+                continue
+            self._users[user.id] = (user.username, user.first_name, user.last_name)
+            insort(self._usernames, (normalize(user.username), user.id))
+            for key in self._name_keys(user.id, user.first_name, user.last_name):
+                insort(self._names, key)
+
+    async def remove_users(self, user_ids):
+        for user_id in user_ids:
+            fields = self._users.pop(user_id, None)
+            if fields is None:
+                continue
+            self._discard(self._usernames, (normalize(fields[0]), user_id))
+            for key in self._name_keys(user_id, fields[1], fields[2]):
+                self._discard(self._names, key)
+
+    async def rebuild(self, db):
+        self._usernames.clear()
+        self._names.clear()
+        self._users.clear()
+        result = await db.stream(
+            select(User).filter(User.is_active.is_not(False)).execution_options(yield_per=5000))
+        async for user in result.scalars():
+            self._users[user.id] = (user.username, user.first_name, user.last_name)
+            self._usernames.append((normalize(user.username), user.id))
+            self._names.extend(self._name_keys(user.id, user.first_name, user.last_name))
+        self._usernames.sort()
+        self._names.sort()
+
+    @staticmethod
+    def _prefixed(keys: List[Tuple[str, UUID]], query: str):
+        index = bisect_left(keys, (query,))
+        while index < len(keys) and keys[index][0].startswith(query):
+            yield keys[index][1]
+            index += 1
+
+    async def complete(self, db, query, limit, exclude=None):
+        query = normalize(query)
+        limit = min(limit, settings.AUTOCOMPLETE_MAX_RESULTS)
+        if not query:
+            return []
+        ranks: Dict[UUID, float] = {}
+        for rank, keys in ((0.0, self._usernames), (1.0, self._names)):
+            for user_id in self._prefixed(keys, query):
+                if len(ranks) >= limit:
+                    break
+                if user_id != exclude:
+                    ranks.setdefault(user_id, rank)
+        return [
+            UserSuggestion(user_id=user_id, username=self._users[user_id][0], first_name=self._users[user_id][1],
+                           last_name=self._users[user_id][2], rank=rank)
+            for user_id, rank in ranks.items()
+        ]
+
+
+def create_autocomplete_backend(backend: str) -> AutocompleteBackend:
+    """Creates the autocomplete backend for the configured name.
+    Args:
+        backend (str): "postgres" or "memory".
+    Returns:
+        AutocompleteBackend: The backend instance."""
+    if backend == "postgres":
+        return PostgresAutocompleteBackend()
+    if backend == "memory":
+        return InMemoryAutocompleteBackend()
+    raise ValueError(f"Unknown autocomplete backend: {backend}")
+
+autocomplete_backend = create_autocomplete_backend(settings.AUTOCOMPLETE_BACKEND)
@@ -0,0 +1,75 @@
+"""This script defines the message broker used to fan out real-time events
+(e.g. newly created messages) to the workers holding the recipients' connections.
+The broker is pluggable: the in-memory implementation only reaches connections
+held by the current worker, a shared backend can be added later for multi-worker
+deployments without touching the publishers or the WebSocket gateway."""
+
+from abc import ABC, abstractmethod
+from app.core.config import settings
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+from uuid import UUID
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Handler called with the recipient user ids and the event payload
+EventHandler = Callable[[List[UUID], Dict[str, Any]], Awaitable[None]]
+
+
+class MessageBroker(ABC):
+    """The interface every broker backend implements."""
+
+    @abstractmethod
+    async def publish(self, user_ids: Iterable[UUID], event: Dict[str, Any]) -> None:
+        """Publishes an event to the given recipients.
+        Args:
+            user_ids (Iterable[UUID]): The users that should receive the event.
+            event (Dict[str, Any]): The JSON-serializable event payload."""
+
+    @abstractmethod
+    def subscribe(self, handler: EventHandler) -> None:
+        """Registers a handler called for every published event.
+        Args:
+            handler (EventHandler): The coroutine function receiving the events."""
+
+    async def start(self) -> None:
+        """Starts the broker (e.g. opens connections to a shared backend)."""
+
+    async def stop(self) -> None:
+        """Stops the broker and releases its resources."""
+
+
+class InMemoryBroker(MessageBroker):
+    """Broker that delivers events to the handlers of the current process only."""
+
+    def __init__(self) -> None:
+        self._handlers: List[EventHandler] = []
+
+    async def publish(self, user_ids: Iterable[UUID], event: Dict[str, Any]) -> None:
+        recipients = list(user_ids)
+        for handler in list(self._handlers):
+            try:
+                await handler(recipients, event)
+            except Exception:
+                # A failing subscriber must never fail the publisher
+                logger.exception("Broker handler failed for event %s", event.get("type"))
+
+    def subscribe(self, handler: EventHandler) -> None:
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    async def stop(self) -> None:
+        self._handlers.clear()
+
+
+def create_broker(backend: str) -> MessageBroker:
+    """Creates the broker for the configured backend.
+    Args:
+        backend (str): The backend name (currently only "memory").
+    Returns:
+        MessageBroker: The broker instance."""
+    if backend == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"Unknown broker backend: {backend}")
+
+broker = create_broker(settings.BROKER_BACKEND)
@@ -0,0 +1,85 @@
+"""This script defines the in-process caches of the chat app.
+Caches are per worker: entries expire after a TTL, which bounds how long another
+worker's write can stay invisible, and the worker performing a write
+invalidates its own entries right away."""
+
+from app.core.config import settings
+from collections import OrderedDict
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+import time
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """A least-recently-used cache whose entries also expire after ttl seconds.
+    The number of entries is bounded by max_entries, the least recently used
+    entry is evicted first. Hits, misses and evictions are counted for metrics."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: K) -> Optional[V]:
+        """Returns the cached value, or None if it is missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: K, value: V) -> None:
+        """Caches a value for ttl seconds, evicting the least recently used entries if full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        """Drops the entry of a key, if any."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drops every entry."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the size, the hit, miss and eviction counters and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def detached_copy(instance):
+    """Copies the column attributes of an ORM instance into a new detached instance.
+    The copy is safe to keep across sessions; Session.merge(copy, load=False)
+    attaches it to a session without emitting a query."""
+    copy = type(instance)(**{attr.key: getattr(instance, attr.key) for attr in inspect(type(instance)).column_attrs})
+    make_transient_to_detached(copy)
+    return copy
+
+# Users resolved from access tokens, keyed by user id, see app/api/deps.py
+principal_cache: TTLCache = TTLCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Served user profiles keyed by user id, see app/crud/user.py
+user_cache: TTLCache = TTLCache(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL_SECONDS)
+
+# Friend ids of accepted friendships keyed by user id, see app/core/friend_graph.py
+friend_cache: TTLCache = TTLCache(settings.FRIEND_GRAPH_CACHE_MAX_ENTRIES, settings.FRIEND_GRAPH_CACHE_TTL_SECONDS)
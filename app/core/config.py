@@ -1,7 +1,7 @@
 """This script houses the configuration settings for the chat app."""
 from pydantic import EmailStr, PostgresDsn
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -18,6 +18,87 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    # Password hashing, changing the cost rehashes passwords on the next login
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 256
+    # Bulk user import (python -m app.db.import_users), hash processes default to the CPU count
+    USER_IMPORT_BATCH_SIZE: int = 2000
+    USER_IMPORT_HASH_PROCESSES: Optional[int] = None
+
+    # Authenticated principal cache, per worker
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    # User profile cache, per worker
+    USER_CACHE_MAX_ENTRIES: int = 50000
+    USER_CACHE_TTL_SECONDS: int = 300
+    # Friend graph (accepted friendships per user), per worker
+    FRIEND_GRAPH_CACHE_MAX_ENTRIES: int = 50000
+    FRIEND_GRAPH_CACHE_TTL_SECONDS: int = 300
+    FRIEND_SUGGESTIONS_MAX_RESULTS: int = 50
+    # Periodic log of the cache and password hashing stats, per worker, 0 disables it
+    METRICS_LOG_INTERVAL_SECONDS: int = 300
+
+    # Real-time delivery
+    BROKER_BACKEND: str = "memory"
+    WS_SEND_QUEUE_SIZE: int = 256
+
+    # Presence
+    PRESENCE_BACKEND: str = "memory"
+    # Worker processes serving the app, the variable uvicorn and gunicorn read
+    WEB_CONCURRENCY: int = 1
+    PRESENCE_TIMEOUT_SECONDS: int = 60
+    PRESENCE_FLUSH_INTERVAL_SECONDS: int = 30
+
+    # Messages
+    MESSAGE_BULK_MAX_BATCH: int = 1000
+    MESSAGE_PARTITION_MONTHS_AHEAD: int = 3
+    MESSAGE_PARTITION_ARCHIVE_AFTER_MONTHS: int = 12
+    MESSAGE_PARTITION_CHECK_INTERVAL_SECONDS: int = 21600
+    MESSAGE_EXPORT_BATCH_SIZE: int = 5000
+    THREAD_MAX_DEPTH: int = 10
+    THREAD_MAX_REPLIES: int = 50
+
+    # Attachment storage
+    STORAGE_BACKEND: str = "local"
+    STORAGE_LOCAL_ROOT: str = "storage"
+    STORAGE_PUBLIC_URL: str = "/media"
+    ATTACHMENT_MAX_SIZE: int = 100 * 1024 * 1024
+    # How long an upload can be referenced from a message
+    ATTACHMENT_UPLOAD_TOKEN_EXPIRE_MINUTES: int = 24 * 60
+    ATTACHMENT_DOWNLOAD_CHUNK_SIZE: int = 64 * 1024
+
+    # Notifications
+    NOTIFICATION_COALESCING: bool = True
+    # Retention in days per notification type, for read and for unread notifications
+    NOTIFICATION_READ_TTL_DAYS: Dict[str, int] = {
+        "message": 7, "group_message": 7, "friend_accepted": 30, "friend_request": 30, "group_invitation": 30,
+    }
+    NOTIFICATION_UNREAD_TTL_DAYS: Dict[str, int] = {
+        "message": 30, "group_message": 30, "friend_accepted": 90, "friend_request": 180, "group_invitation": 90,
+    }
+    NOTIFICATION_PURGE_INTERVAL_SECONDS: int = 3600
+    NOTIFICATION_PURGE_BATCH_SIZE: int = 1000
+    NOTIFICATION_PURGE_BATCH_PAUSE_SECONDS: float = 0.1
+    # Write-behind buffer: flush every N ms or M notifications, overflow policy "block" or "drop"
+    NOTIFICATION_BUFFER_FLUSH_INTERVAL_MS: int = 200
+    NOTIFICATION_BUFFER_BATCH_SIZE: int = 500
+    NOTIFICATION_BUFFER_MAX_SIZE: int = 10000
+    NOTIFICATION_BUFFER_OVERFLOW: str = "block"
+    # Live notification stream: "memory" (single worker) or "postgres" (LISTEN/NOTIFY)
+    NOTIFICATION_STREAM_BACKEND: str = "memory"
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS: int = 15
+    # Backoff between attempts to reopen a lost LISTEN connection
+    NOTIFICATION_STREAM_RECONNECT_MIN_SECONDS: float = 1
+    NOTIFICATION_STREAM_RECONNECT_MAX_SECONDS: float = 30
+
+    # Search
+    SEARCH_BACKEND: str = "postgres"
+    AUTOCOMPLETE_BACKEND: str = "postgres"
+    AUTOCOMPLETE_MAX_RESULTS: int = 20
+    # Fuzzy matches scored per query, bounds the work of very common trigrams
+    AUTOCOMPLETE_FUZZY_CANDIDATES: int = 200
+
     # Email Settings
     MAIL_USERNAME: Optional[str] = None
     MAIL_PASSWORD: Optional[str] = None
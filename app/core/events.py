@@ -0,0 +1,66 @@
+"""Application lifecycle event handlers."""
+
+from app.api.connections import manager
+from app.core.autocomplete import autocomplete_backend
+from app.core.broker import broker
+from app.core.metrics import metrics_reporter
+from app.core.notification_buffer import notification_buffer
+from app.core.notification_stream import notification_broadcaster
+from app.core.presence import check_presence_backend, presence_flusher
+from app.core.search import search_backend
+from app.core.security import password_hasher
+from app.db.database import async_session_maker
+from app.db.partitions import partition_maintainer
+from app.db.retention import notification_purger
+from fastapi import FastAPI
+from typing import Callable
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def create_start_app_handler(app: FastAPI) -> Callable:
+    """Creates the handler run when the application starts."""
+    async def start_app() -> None:
+        # Route broker events to the WebSocket connections held by this worker
+        broker.subscribe(manager.deliver)
+        await broker.start()
+        # Wake up live notification streams, across workers with the postgres backend
+        await notification_broadcaster.start()
+        # Store queued notifications in batches, off the request path
+        await notification_buffer.start()
+        # Keep the coming months' messages partitions ahead of the clock, now and periodically
+        await partition_maintainer.start()
+        # Load the autocomplete and search indexes of backends keeping their own
+        try:
+            async with async_session_maker() as db:
+                await autocomplete_backend.rebuild(db)
+        except Exception:
+            logger.exception("Could not build the autocomplete index")
+        try:
+            async with async_session_maker() as db:
+                await search_backend.rebuild(db)
+        except Exception:
+            logger.exception("Could not build the search index")
+        # Delete expired notifications in the background
+        await notification_purger.start()
+        # Persist last-seen times in batches
+        check_presence_backend()
+        await presence_flusher.start()
+        # Log the cache hit rates and the password hashing queue periodically
+        await metrics_reporter.start()
+    return start_app
+
+def create_stop_app_handler(app: FastAPI) -> Callable:
+    """Creates the handler run when the application shuts down."""
+    async def stop_app() -> None:
+        await metrics_reporter.stop()
+        await presence_flusher.stop()
+        await notification_purger.stop()
+        await partition_maintainer.stop()
+        # Drain the notifications still queued before the connections go away
+        await notification_buffer.stop()
+        await notification_broadcaster.stop()
+        await broker.stop()
+        password_hasher.shutdown()
+    return stop_app
@@ -0,0 +1,114 @@
+"""This script defines the friend graph of the chat app.
+The accepted friendships of a user are kept as an adjacency set (the friend ids)
+in the per-worker friend cache, loaded lazily with one query for any number of
+users and invalidated by the friendship CRUD for both users of a changed
+friendship. Friend listings, mutual friends and friend-of-friend suggestions
+are then set operations costing O(degree) instead of SQL joins."""
+
+from app.core.cache import TTLCache, friend_cache
+from app.models.friendship import Friendship, FriendshipStatus
+from collections import Counter
+from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+from uuid import UUID
+import heapq
+
+
+class FriendGraph:
+    """Adjacency sets of accepted friendships, cached per worker."""
+
+    def __init__(self, cache: TTLCache) -> None:
+        self._cache = cache
+
+    async def friends_of_many(self, db: AsyncSession, user_ids: Iterable[UUID]) -> Dict[UUID, FrozenSet[UUID]]:
+        """Returns the friend ids of many users; the uncached ones are loaded with a single query.
+        Args:
+            db (AsyncSession): The database session.
+            user_ids (Iterable[UUID]): The users.
+        Returns:
+            Dict[UUID, FrozenSet[UUID]]: The friend ids of every user (empty for users without friends)."""
+        adjacency: Dict[UUID, FrozenSet[UUID]] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            friends = self._cache.get(user_id)
+            if friends is None:
+                missing.append(user_id)
+            else:
+                adjacency[user_id] = friends
+        if missing:
+            loaded: Dict[UUID, set] = {user_id: set() for user_id in missing}
+            result = await db.execute(
+                select(Friendship.sender_id, Friendship.receiver_id).filter(
+                    Friendship.status == FriendshipStatus.ACCEPTED,
+                    or_(Friendship.sender_id.in_(missing), Friendship.receiver_id.in_(missing)),
+                )
+            )
+            for sender_id, receiver_id in result.all():
+                if sender_id in loaded:
+                    loaded[sender_id].add(receiver_id)
+                if receiver_id in loaded:
+                    loaded[receiver_id].add(sender_id)
+            for user_id, friends in loaded.items():
+                adjacency[user_id] = frozenset(friends)
+                self._cache.set(user_id, adjacency[user_id])
+        return adjacency
+
+    async def friends(self, db: AsyncSession, user_id: UUID) -> FrozenSet[UUID]:
+        """Returns the ids of the user's friends."""
+        return (await self.friends_of_many(db, [user_id]))[user_id]
+
+    async def mutual_friends(self, db: AsyncSession, user_id: UUID, other_id: UUID) -> FrozenSet[UUID]:
+        """Returns the ids of the friends two users have in common."""
+        adjacency = await self.friends_of_many(db, [user_id, other_id])
+        return adjacency[user_id] & adjacency[other_id]
+
+    async def mutual_friend_counts(
+            self, db: AsyncSession, user_id: UUID, other_ids: Iterable[UUID]) -> Dict[UUID, int]:
+        """Returns the number of friends the user has in common with each of the other users.
+        Args:
+            db (AsyncSession): The database session.
+            user_id (UUID): The user.
+            other_ids (Iterable[UUID]): The users to compare with, e.g. the members of a group.
+        Returns:
+            Dict[UUID, int]: The mutual friend count per other user."""
+        other_ids = list(dict.fromkeys(other_ids))
+        adjacency = await self.friends_of_many(db, [user_id, *other_ids])
+        mine = adjacency[user_id]
+        return {other_id: len(mine & adjacency[other_id]) for other_id in other_ids}
+
+    async def suggestions(self, db: AsyncSession, user_id: UUID, limit: int = 10) -> List[Tuple[UUID, int]]:
+        """Suggests friends of friends, ranked by the number of mutual friends.
+        Users the caller already has a friendship with, in any status (pending,
+        rejected or blocked included), are never suggested.
+        Args:
+            db (AsyncSession): The database session.
+            user_id (UUID): The user.
+            limit (int): The maximum number of suggestions.
+        Returns:
+            List[Tuple[UUID, int]]: The suggested user ids and their mutual friend counts, best first."""
+        mine = await self.friends(db, user_id)
+        if not mine:
+            return []
+        overlap: Counter = Counter()
+        for friends in (await self.friends_of_many(db, mine)).values():
+            overlap.update(friends)
+
+        result = await db.execute(
+            select(Friendship.sender_id, Friendship.receiver_id).filter(
+                Friendship.status != FriendshipStatus.ACCEPTED,
+                or_(Friendship.sender_id == user_id, Friendship.receiver_id == user_id),
+            )
+        )
+        excluded = {user_id, *mine, *(id_ for pair in result.all() for id_ in pair)}
+        candidates = ((count, candidate_id) for candidate_id, count in overlap.items() if candidate_id not in excluded)
+        # Ties are broken by id so the order is stable
+        return [(candidate_id, count) for count, candidate_id in heapq.nlargest(limit, candidates)]
+
+    def invalidate(self, *user_ids: UUID) -> None:
+        """Drops the cached adjacency of users whose friendships changed."""
+        for user_id in user_ids:
+            self._cache.invalidate(user_id)
+
+friend_graph = FriendGraph(friend_cache)
@@ -0,0 +1,67 @@
+"""This script defines the periodic metrics log of the chat app.
+The counters of the in-process caches and of the password hashing pool are per
+worker and only kept in memory, so every METRICS_LOG_INTERVAL_SECONDS the
+reporter logs one line per source with its stats (cache sizes, hits, misses,
+evictions and hit rates; hashing queue depth and waits), for the log pipeline
+to chart. An interval of 0 disables the log."""
+
+from app.core.cache import friend_cache, principal_cache, user_cache
+from app.core.config import settings
+from app.core.security import password_hasher
+from typing import Callable, Dict, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+Stats = Callable[[], Dict[str, float]]
+
+
+class MetricsReporter:
+    """Logs the stats of the registered sources every METRICS_LOG_INTERVAL_SECONDS."""
+
+    def __init__(self, sources: Dict[str, Stats], interval: int = settings.METRICS_LOG_INTERVAL_SECONDS) -> None:
+        self.sources = dict(sources)
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Returns the current stats of every source."""
+        return {name: stats() for name, stats in self.sources.items()}
+
+    def log(self) -> None:
+        """Logs one line per source."""
+        for name, stats in self.snapshot().items():
+            logger.info(
+                "%s %s", name,
+                " ".join(f"{key}={value:.3f}" if isinstance(value, float) else f"{key}={value}"
+                         for key, value in stats.items()),
+            )
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.log()
+            except Exception:
+                logger.exception("Could not log metrics")
+
+    async def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+metrics_reporter = MetricsReporter({
+    "principal_cache": principal_cache.stats,
+    "user_cache": user_cache.stats,
+    "friend_cache": friend_cache.stats,
+    "password_hasher": password_hasher.stats,
+})
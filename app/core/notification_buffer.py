@@ -0,0 +1,159 @@
+"""This script defines the write-behind buffer for notifications.
+Request handlers enqueue notifications and return immediately; a background
+task stores them as multi-row inserts, every NOTIFICATION_BUFFER_FLUSH_INTERVAL_MS
+or as soon as NOTIFICATION_BUFFER_BATCH_SIZE are waiting, whichever comes first.
+Sending a message or a friend request therefore no longer waits on the
+notifications it produces; group messages are queued as one item and fanned out
+to the members at flush time.
+
+The queue is bounded. When it is full, the "block" policy makes producers wait
+for the flusher (backpressure), the "drop" policy discards the notification
+and logs it. Buffered notifications are lost if the process dies before a flush;
+they are drained on a clean shutdown."""
+
+from app.core.config import settings
+from app.crud.notifications import create_notifications_bulk, notify_group_members, validate_notification
+from app.db.database import async_session_maker
+from app.schemas.notification import NotificationCreate
+from dataclasses import dataclass
+from sqlalchemy.orm import sessionmaker
+from typing import List, Optional, Union
+from uuid import UUID
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class GroupMessageNotification:
+    """A group message to notify every member but the sender of, see notify_group_members."""
+    group_id: UUID
+    sender_id: UUID
+    message_id: UUID
+    content: str
+
+
+class NotificationBuffer:
+    """Bounded in-process queue of notifications flushed in batches by a background task.
+    Notifications taken from the queue are kept on the buffer until written, so
+    cancelling the flusher never loses them: stop() waits for a running flush
+    and writes out the pending batch and the rest of the queue."""
+
+    def __init__(
+            self,
+            session_maker: sessionmaker = async_session_maker,
+            max_size: int = settings.NOTIFICATION_BUFFER_MAX_SIZE,
+            batch_size: int = settings.NOTIFICATION_BUFFER_BATCH_SIZE,
+            flush_interval: float = settings.NOTIFICATION_BUFFER_FLUSH_INTERVAL_MS / 1000,
+            overflow: str = settings.NOTIFICATION_BUFFER_OVERFLOW) -> None:
+        if overflow not in ("block", "drop"):
+            raise ValueError(f"Unknown notification buffer overflow policy: {overflow}")
+        self._session_maker = session_maker
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._available = asyncio.Event()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self._batch: List[Union[NotificationCreate, GroupMessageNotification]] = []
+        self._flushing: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _put(self, item: Union[NotificationCreate, GroupMessageNotification], user: str) -> bool:
+        if self.overflow == "block":
+            await self._queue.put(item)
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning("Notification buffer full, dropped notification for %s", user)
+                return False
+        self._available.set()
+        return True
+
+    async def enqueue(self, notification: NotificationCreate) -> bool:
+        """Queues a notification to be stored by the next flush.
+        The notification is validated right away, so callers still get a
+        ValueError for bad input. Returns False if it was dropped."""
+        validate_notification(notification)
+        return await self._put(notification, f"user {notification.user_id}")
+
+    async def enqueue_group_message(self, group_id: UUID, sender_id: UUID, message_id: UUID, content: str) -> bool:
+        """Queues the notifications of a group message, fanned out to the members
+        by the next flush with one INSERT ... SELECT. Returns False if it was dropped."""
+        return await self._put(
+            GroupMessageNotification(group_id, sender_id, message_id, content), f"group {group_id}")
+
+    async def _next_batch(self) -> None:
+        """Waits for a first notification, then collects more into the pending
+        batch until it is full or the flush interval has passed.
+        Only the availability event is awaited, items are taken with get_nowait
+        straight into the batch, so a cancellation cannot lose a taken item."""
+        loop = asyncio.get_running_loop()
+        deadline = None
+        while len(self._batch) < self.batch_size:
+            try:
+                self._batch.append(self._queue.get_nowait())
+                if deadline is None:
+                    deadline = loop.time() + self.flush_interval
+                continue
+            except asyncio.QueueEmpty:
+                self._available.clear()
+            if deadline is None:
+                await self._available.wait()
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._available.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+
+    async def _flush(self, batch: List[Union[NotificationCreate, GroupMessageNotification]]) -> None:
+        notifications = [item for item in batch if isinstance(item, NotificationCreate)]
+        group_messages = [item for item in batch if isinstance(item, GroupMessageNotification)]
+        try:
+            async with self._session_maker() as db:
+                if notifications:
+                    await create_notifications_bulk(db, notifications)
+                for item in group_messages:
+                    await notify_group_members(db, item.group_id, item.sender_id, item.message_id, item.content)
+        except Exception:
+            logger.exception("Could not store %d buffered notifications", len(batch))
+
+    async def _run(self) -> None:
+        while True:
+            await self._next_batch()
+            batch, self._batch = self._batch, []
+            # Not cancellable halfway, a batch taken from the queue is always written; stop() awaits it
+            self._flushing = asyncio.create_task(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the flusher, waits for its running flush, then writes out the
+        pending batch and everything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        pending, self._batch = self._batch, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for start in range(0, len(pending), self.batch_size):
+            await self._flush(pending[start:start + self.batch_size])
+
+notification_buffer = NotificationBuffer()
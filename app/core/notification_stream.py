@@ -0,0 +1,175 @@
+"""This script defines the broadcasters waking up live notification streams.
+A broadcaster only carries "user X has new notifications" signals; the stream
+of that user then reads the new rows itself, after the last event it sent. The
+payload therefore stays tiny, and a missed or duplicate signal is harmless.
+
+The in-process broadcaster reaches the streams of the current worker only. The
+Postgres broadcaster sends the signals with NOTIFY on a channel every worker
+LISTENs to, through one dedicated asyncpg connection per worker. Publishing
+runs after the notification is committed, so it never raises: a failed NOTIFY
+is logged and the local streams are woken up anyway. A lost connection is
+reopened in the background with a capped backoff."""
+
+from abc import ABC, abstractmethod
+from app.core.config import settings
+from typing import Dict, Iterable, Optional, Set
+from uuid import UUID
+import asyncio
+import asyncpg
+import logging
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "notifications"
+
+
+class NotificationBroadcaster(ABC):
+    """The interface every notification broadcaster implements.
+    Streams subscribe with an asyncio.Event that is set whenever their user
+    has new notifications."""
+
+    def __init__(self) -> None:
+        self._subscribers: Dict[UUID, Set[asyncio.Event]] = {}
+
+    def subscribe(self, user_id: UUID) -> asyncio.Event:
+        """Registers a stream of the user and returns its wake-up event."""
+        event = asyncio.Event()
+        self._subscribers.setdefault(user_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, user_id: UUID, event: asyncio.Event) -> None:
+        """Removes a stream registered with subscribe."""
+        events = self._subscribers.get(user_id)
+        if events is not None:
+            events.discard(event)
+            if not events:
+                del self._subscribers[user_id]
+
+    def _wake(self, user_ids: Iterable[UUID]) -> None:
+        """Wakes up the local streams of the given users."""
+        for user_id in user_ids:
+            for event in self._subscribers.get(user_id, ()):
+                event.set()
+
+    @abstractmethod
+    async def publish(self, user_ids: Iterable[UUID]) -> None:
+        """Signals that the given users have new notifications.
+        Args:
+            user_ids (Iterable[UUID]): The users whose streams should wake up."""
+
+    async def start(self) -> None:
+        """Starts the broadcaster (e.g. starts listening on the database)."""
+
+    async def stop(self) -> None:
+        """Stops the broadcaster and releases its resources."""
+
+
+class InProcessBroadcaster(NotificationBroadcaster):
+    """Broadcaster reaching the streams held by the current process only."""
+
+    async def publish(self, user_ids: Iterable[UUID]) -> None:
+        self._wake(user_ids)
+
+
+class PostgresBroadcaster(NotificationBroadcaster):
+    """Broadcaster using Postgres LISTEN/NOTIFY to reach the streams of every worker.
+    Each signal is one NOTIFY whose payload is the user id; the worker's own
+    streams are woken up when the notification comes back through LISTEN."""
+
+    def __init__(self, dsn: str) -> None:
+        super().__init__()
+        self._dsn = dsn
+        self._connection: Optional[asyncpg.Connection] = None
+        # asyncpg connections run one statement at a time
+        self._lock = asyncio.Lock()
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._running = False
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            self._wake([UUID(payload)])
+        except ValueError:
+            logger.warning("Ignoring malformed notification signal %r", payload)
+
+    def _on_terminate(self, connection) -> None:
+        if connection is self._connection:
+            self._connection = None
+            self._schedule_reconnect()
+
+    def _schedule_reconnect(self) -> None:
+        if self._running and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _connect(self) -> None:
+        connection = await asyncpg.connect(self._dsn)
+        connection.add_termination_listener(self._on_terminate)
+        await connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+        self._connection = connection
+
+    async def _reconnect(self) -> None:
+        delay = settings.NOTIFICATION_STREAM_RECONNECT_MIN_SECONDS
+        while self._running:
+            try:
+                await self._connect()
+            except Exception:
+                logger.warning("Could not reopen the notification LISTEN connection, retrying in %ss", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.NOTIFICATION_STREAM_RECONNECT_MAX_SECONDS)
+                continue
+            logger.info("Reopened the notification LISTEN connection")
+            # Signals sent while disconnected are lost, every local stream reads again
+            self._wake(list(self._subscribers))
+            return
+
+    async def start(self) -> None:
+        self._running = True
+        await self._connect()
+
+    async def publish(self, user_ids: Iterable[UUID]) -> None:
+        payloads = sorted({str(user_id) for user_id in user_ids})
+        if not payloads:
+            return
+        connection = self._connection
+        if connection is None:
+            # Not started (e.g. scripts) or reconnecting, only local streams can be reached
+            self._wake(UUID(payload) for payload in payloads)
+            return
+        try:
+            async with self._lock:
+                await connection.execute(
+                    "SELECT pg_notify($1, user_id) FROM unnest($2::text[]) AS user_id", NOTIFY_CHANNEL, payloads)
+        except Exception:
+            logger.exception("Could not publish notification signals")
+            self._wake(UUID(payload) for payload in payloads)
+            if connection.is_closed():
+                self._on_terminate(connection)
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            try:
+                await self._reconnect_task
+            except asyncio.CancelledError:
+                pass
+            self._reconnect_task = None
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.close()
+        self._subscribers.clear()
+
+
+def create_notification_broadcaster(backend: str) -> NotificationBroadcaster:
+    """Creates the notification broadcaster for the configured backend.
+    Args:
+        backend (str): "memory" or "postgres".
+    Returns:
+        NotificationBroadcaster: The broadcaster instance."""
+    if backend == "memory":
+        return InProcessBroadcaster()
+    if backend == "postgres":
+        # asyncpg takes a plain libpq URL, without the SQLAlchemy driver suffix
+        return PostgresBroadcaster(str(settings.DATABASE_URL).replace("postgresql+asyncpg://", "postgresql://", 1))
+    raise ValueError(f"Unknown notification stream backend: {backend}")
+
+notification_broadcaster = create_notification_broadcaster(settings.NOTIFICATION_STREAM_BACKEND)
@@ -0,0 +1,91 @@
+"""This script handles keyset (cursor) pagination helpers for the chat app.
+A cursor is an opaque, url-safe token built from the (created_at, id) pair of
+the last row a client has seen, so the next page can be fetched with an index
+range scan instead of an OFFSET that walks and discards every earlier row."""
+
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+import base64
+import binascii
+
+
+def encode_cursor(created_at: datetime, row_id: UUID) -> str:
+    """Encodes a (created_at, id) pair into an opaque cursor.
+    Args:
+        created_at (datetime): The creation timestamp of the row.
+        row_id (UUID): The id of the row.
+    Returns:
+        str: The url-safe cursor."""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decodes an opaque cursor back into a (created_at, id) pair.
+    Args:
+        cursor (str): The cursor returned by encode_cursor.
+    Returns:
+        Tuple[datetime, UUID]: The creation timestamp and id of the row."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), UUID(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Invalid pagination cursor.") from exc
+
+def cursor_for(row) -> Optional[str]:
+    """Builds the cursor pointing at a row with created_at and id attributes.
+    Args:
+        row: The ORM object (or None).
+    Returns:
+        Optional[str]: The cursor, or None if no row was given."""
+    if row is None:
+        return None
+    return encode_cursor(row.created_at, row.id)
+
+def encode_position_cursor(position: int, row_id: UUID) -> str:
+    """Encodes a (position, id) pair for rows ordered by an integer position.
+    Args:
+        position (int): The position of the row, e.g. its stream position.
+        row_id (UUID): The id of the row.
+    Returns:
+        str: The url-safe cursor."""
+    raw = f"{position}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_position_cursor(cursor: str) -> Tuple[int, UUID]:
+    """Decodes a cursor built by encode_position_cursor.
+    Args:
+        cursor (str): The position cursor.
+    Returns:
+        Tuple[int, UUID]: The position and id of the row."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position, row_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        return int(position), UUID(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError("Invalid pagination cursor.") from exc
+
+def encode_ranked_cursor(rank: float, created_at: datetime, row_id: UUID) -> str:
+    """Encodes a (rank, created_at, id) triple for relevance-ordered pages.
+    Args:
+        rank (float): The relevance of the row.
+        created_at (datetime): The creation timestamp of the row.
+        row_id (UUID): The id of the row.
+    Returns:
+        str: The url-safe cursor."""
+    return encode_cursor(created_at, row_id) + "." + repr(float(rank))
+
+def decode_ranked_cursor(cursor: str) -> Tuple[float, datetime, UUID]:
+    """Decodes a cursor built by encode_ranked_cursor.
+    Args:
+        cursor (str): The ranked cursor.
+    Returns:
+        Tuple[float, datetime, UUID]: The rank, creation timestamp and id of the row."""
+    base, _, rank = cursor.partition(".")
+    try:
+        rank_value = float(rank)
+    except ValueError as exc:
+        raise ValueError("Invalid pagination cursor.") from exc
+    created_at, row_id = decode_cursor(base)
+    return rank_value, created_at, row_id
@@ -0,0 +1,216 @@
+"""This script defines the presence subsystem of the chat app.
+Who is online is kept in memory instead of in the users table: open WebSocket
+connections and heartbeats (any frame from the client, or the heartbeat
+endpoint) mark a user online, and a user whose last heartbeat is older than
+PRESENCE_TIMEOUT_SECONDS without an open connection is offline. Only the
+last-seen time is persisted, flushed in batches every
+PRESENCE_FLUSH_INTERVAL_SECONDS, so presence no longer writes a row per event.
+
+The tracker is pluggable like the broker: the in-memory implementation only
+knows the users connected to the current worker, so the app logs an error at
+startup when more than one worker serves it (users on the other workers show as
+offline, last-seen times are still flushed by each worker); a shared backend can
+be added later without touching the callers."""
+
+from abc import ABC, abstractmethod
+from app.core.config import settings
+from app.crud.user import get_last_seen, update_last_seen
+from app.db.database import async_session_maker
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Presence:
+    """The presence of a user."""
+    user_id: UUID
+    is_online: bool
+    last_seen: Optional[datetime] = None
+
+
+class PresenceTracker(ABC):
+    """The interface every presence backend implements."""
+
+    @abstractmethod
+    async def connect(self, user_id: UUID) -> None:
+        """Records a new connection of the user, who is online while it is open."""
+
+    @abstractmethod
+    async def disconnect(self, user_id: UUID) -> None:
+        """Records that one of the user's connections closed."""
+
+    @abstractmethod
+    async def heartbeat(self, user_id: UUID) -> None:
+        """Records activity of the user."""
+
+    @abstractmethod
+    async def get_presence(self, user_ids: Iterable[UUID]) -> Dict[UUID, Presence]:
+        """Returns the presence of the users the tracker knows about.
+        Users it has not seen since the last sweep are left out."""
+
+    @abstractmethod
+    async def take_last_seen(self) -> Dict[UUID, datetime]:
+        """Returns and forgets the last-seen times changed since the previous call."""
+
+    async def sweep(self) -> None:
+        """Drops the state of users that went offline."""
+
+
+class InMemoryPresenceTracker(PresenceTracker):
+    """Tracker keeping the presence of the users of the current worker."""
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timedelta(seconds=timeout)
+        self._connections: Dict[UUID, int] = {}
+        # When each user goes offline unless a new heartbeat arrives
+        self._expires: Dict[UUID, datetime] = {}
+        self._last_seen: Dict[UUID, datetime] = {}
+        self._dirty: Dict[UUID, datetime] = {}
+
+    def _seen(self, user_id: UUID, expires_in: timedelta) -> None:
+        now = datetime.now(timezone.utc)
+        self._expires[user_id] = now + expires_in
+        self._last_seen[user_id] = now
+        self._dirty[user_id] = now
+
+    async def connect(self, user_id: UUID) -> None:
+        self._connections[user_id] = self._connections.get(user_id, 0) + 1
+        self._seen(user_id, self.timeout)
+
+    async def disconnect(self, user_id: UUID) -> None:
+        remaining = self._connections.get(user_id, 0) - 1
+        if remaining > 0:
+            self._connections[user_id] = remaining
+            return
+        self._connections.pop(user_id, None)
+        # Closing the last connection makes the user offline right away
+        self._seen(user_id, timedelta(0))
+
+    async def heartbeat(self, user_id: UUID) -> None:
+        self._seen(user_id, self.timeout)
+
+    async def get_presence(self, user_ids: Iterable[UUID]) -> Dict[UUID, Presence]:
+        now = datetime.now(timezone.utc)
+        return {
+            user_id: Presence(
+                user_id=user_id,
+                is_online=user_id in self._connections or self._expires[user_id] > now,
+                last_seen=self._last_seen[user_id],
+            )
+            for user_id in user_ids if user_id in self._last_seen
+        }
+
+    async def take_last_seen(self) -> Dict[UUID, datetime]:
+        dirty, self._dirty = self._dirty, {}
+        return dirty
+
+    async def sweep(self) -> None:
+        now = datetime.now(timezone.utc)
+        for user_id, expires in list(self._expires.items()):
+            if expires <= now and user_id not in self._connections and user_id not in self._dirty:
+                del self._expires[user_id]
+                del self._last_seen[user_id]
+
+
+def create_presence_tracker(backend: str) -> PresenceTracker:
+    """Creates the presence tracker for the configured backend.
+    Args:
+        backend (str): The backend name (currently only "memory").
+    Returns:
+        PresenceTracker: The tracker instance."""
+    if backend == "memory":
+        return InMemoryPresenceTracker(settings.PRESENCE_TIMEOUT_SECONDS)
+    raise ValueError(f"Unknown presence backend: {backend}")
+
+presence_tracker = create_presence_tracker(settings.PRESENCE_BACKEND)
+
+
+def worker_count(argv: List[str] = sys.argv) -> int:
+    """Returns the number of worker processes serving the app: WEB_CONCURRENCY,
+    or --workers / -w when given on the uvicorn or gunicorn command line."""
+    workers = settings.WEB_CONCURRENCY
+    for index, arg in enumerate(argv):
+        value = None
+        if arg in ("--workers", "-w") and index + 1 < len(argv):
+            value = argv[index + 1]
+        elif arg.startswith("--workers="):
+            value = arg.split("=", 1)[1]
+        if value is not None and value.isdigit():
+            workers = max(workers, int(value))
+    return workers
+
+def check_presence_backend() -> None:
+    """Logs an error when the in-memory tracker serves more than one worker."""
+    workers = worker_count()
+    if isinstance(presence_tracker, InMemoryPresenceTracker) and workers > 1:
+        logger.error(
+            "The memory presence backend only sees the connections of its own worker but %d workers "
+            "serve the app, users connected to the other workers show as offline; run a single worker "
+            "or configure a shared PRESENCE_BACKEND.", workers,
+        )
+
+
+async def get_presence(db: AsyncSession, user_ids: Iterable[UUID]) -> List[Presence]:
+    """Returns the presence of many users, e.g. a friend list.
+    Users unknown to the tracker are offline, their last-seen time is read from
+    the database with one query for all of them."""
+    user_ids = list(dict.fromkeys(user_ids))
+    known = await presence_tracker.get_presence(user_ids)
+    stored = await get_last_seen(db, [user_id for user_id in user_ids if user_id not in known])
+    return [
+        known.get(user_id) or Presence(user_id=user_id, is_online=False, last_seen=stored.get(user_id))
+        for user_id in user_ids
+    ]
+
+
+class PresenceFlusher:
+    """Flushes the changed last-seen times to the database every PRESENCE_FLUSH_INTERVAL_SECONDS."""
+
+    def __init__(self, interval: int = settings.PRESENCE_FLUSH_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def flush(self) -> int:
+        """Writes the pending last-seen times with one statement."""
+        last_seen = await presence_tracker.take_last_seen()
+        await presence_tracker.sweep()
+        if not last_seen:
+            return 0
+        async with async_session_maker() as db:
+            return await update_last_seen(db, last_seen)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Could not flush last-seen times")
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the periodic flush and writes the pending last-seen times."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Could not flush last-seen times")
+
+presence_flusher = PresenceFlusher()
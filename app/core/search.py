@@ -0,0 +1,233 @@
+"""This script defines the message search backends for the chat app.
+Both backends answer the same ranked, keyset-paginated queries, restricted to
+the conversations and groups the caller belongs to. The Postgres backend reads
+the trigger-maintained `messages.search_vector` column through its GIN index;
+the in-memory backend keeps an inverted index in the worker, loaded from the
+messages table at startup, which makes the search path testable and
+benchmarkable without a database."""
+
+from abc import ABC, abstractmethod
+from app.core.config import settings
+from app.core.pagination import decode_ranked_cursor
+from app.models.messages import Message
+from dataclasses import dataclass, field
+from datetime import datetime
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Dict, Iterable, List, Optional, Set
+from uuid import UUID
+import math
+import re
+
+# Text search configuration, must match the expression of Message.search_vector
+TEXT_SEARCH_CONFIG = "simple"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into lowercase word tokens, like the 'simple' text search config."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+@dataclass
+class SearchScope:
+    """The messages a search may return.
+    A search is limited to the given groups plus, with include_direct, the user's
+    direct conversations; conversation_id narrows it to a single conversation."""
+    user_id: UUID
+    group_ids: List[UUID] = field(default_factory=list)
+    conversation_id: Optional[UUID] = None
+    include_direct: bool = True
+
+
+@dataclass
+class SearchHit:
+    """A matching message and its relevance."""
+    message_id: UUID
+    rank: float
+    created_at: datetime
+    message: Optional[Message] = None
+
+
+class SearchBackend(ABC):
+    """The interface every search backend implements."""
+
+    @abstractmethod
+    async def search(
+            self,
+            db: AsyncSession,
+            query: str,
+            scope: SearchScope,
+            limit: int = 20,
+            cursor: Optional[str] = None) -> List[SearchHit]:
+        """Returns the best matches, ordered by rank then recency.
+        Args:
+            db (AsyncSession): The database session.
+            query (str): The user's search terms.
+            scope (SearchScope): The messages the caller may see.
+            limit (int): The page size.
+            cursor (Optional[str]): The ranked cursor of the last hit of the previous page.
+        Returns:
+            List[SearchHit]: The hits of the page."""
+
+    async def index_messages(self, messages: Iterable[Message]) -> None:
+        """Adds or refreshes messages in the index (after insert or edit)."""
+
+    async def remove_messages(self, message_ids: Iterable[UUID]) -> None:
+        """Removes deleted messages from the index."""
+
+    async def rebuild(self, db: AsyncSession) -> None:
+        """Loads the index from the database, for backends keeping their own."""
+
+
+class PostgresSearchBackend(SearchBackend):
+    """Backend using the tsvector column and GIN index of the messages table.
+    A trigger maintains the column on insert and edit, so the index hooks are
+    no-ops."""
+
+    async def search(self, db, query, scope, limit=20, cursor=None):
+        ts_query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+        rank = func.ts_rank(Message.search_vector, ts_query)
+        if scope.conversation_id:
+            visible = Message.conversation_id == scope.conversation_id
+        else:
+            conditions = []
+            if scope.include_direct:
+                conditions += [Message.sender_id == scope.user_id, Message.receiver_id == scope.user_id]
+            if scope.group_ids:
+                conditions.append(Message.group_id.in_(scope.group_ids))
+            if not conditions:
+                return []
+            visible = or_(*conditions)
+        stmt = select(Message, rank).filter(Message.search_vector.op("@@")(ts_query), visible)
+        if cursor:
+            last_rank, created_at, message_id = decode_ranked_cursor(cursor)
+            # Descending order on all three keys, so the next page is "smaller" than the cursor
+            stmt = stmt.filter(
+                tuple_(rank, Message.created_at, Message.id) < tuple_(last_rank, created_at, message_id)
+            )
+        result = await db.execute(
+            stmt.order_by(rank.desc(), Message.created_at.desc(), Message.id.desc()).limit(limit)
+        )
+        return [
+            SearchHit(message_id=message.id, rank=message_rank, created_at=message.created_at, message=message)
+            for message, message_rank in result.all()
+        ]
+
+
+@dataclass
+class _IndexedMessage:
+    """The fields the in-memory backend needs to rank and scope a message."""
+    sender_id: UUID
+    receiver_id: Optional[UUID]
+    group_id: Optional[UUID]
+    conversation_id: Optional[UUID]
+    created_at: datetime
+    term_counts: Dict[str, int]
+    length: int
+
+
+class InMemorySearchBackend(SearchBackend):
+    """Backend keeping an inverted index (term -> message ids) in the worker.
+    Ranking is tf-idf normalised by document length, all query terms must match."""
+
+    def __init__(self) -> None:
+        self._postings: Dict[str, Set[UUID]] = {}
+        self._documents: Dict[UUID, _IndexedMessage] = {}
+
+    def _add(self, message) -> None:
+        tokens = tokenize(message.content or "")
+        term_counts: Dict[str, int] = {}
+        for token in tokens:
+            term_counts[token] = term_counts.get(token, 0) + 1
+        self._documents[message.id] = _IndexedMessage(
+            sender_id=message.sender_id,
+            receiver_id=message.receiver_id,
+            group_id=message.group_id,
+            conversation_id=message.conversation_id,
+            created_at=message.created_at,
+            term_counts=term_counts,
+            length=max(len(tokens), 1),
+        )
+        for token in term_counts:
+            self._postings.setdefault(token, set()).add(message.id)
+
+    async def index_messages(self, messages):
+        for message in messages:
+            await self.remove_messages([message.id])
+            self._add(message)
+
+    async def rebuild(self, db):
+        self._postings.clear()
+        self._documents.clear()
+        result = await db.stream(
+            select(
+                Message.id, Message.sender_id, Message.receiver_id, Message.group_id,
+                Message.conversation_id, Message.created_at, Message.content,
+            ).execution_options(yield_per=5000)
+        )
+        async for row in result:
+            self._add(row)
+
+    async def remove_messages(self, message_ids):
+        for message_id in message_ids:
+            document = self._documents.pop(message_id, None)
+            if document is None:
+                continue
+            for token in document.term_counts:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.discard(message_id)
+                    if not postings:
+                        del self._postings[token]
+
+    def _visible(self, document: _IndexedMessage, scope: SearchScope, group_ids: Set[UUID]) -> bool:
+        if scope.conversation_id:
+            return document.conversation_id == scope.conversation_id
+        if document.group_id:
+            return document.group_id in group_ids
+        return scope.include_direct and scope.user_id in (document.sender_id, document.receiver_id)
+
+    async def search(self, db, query, scope, limit=20, cursor=None):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        # Intersect the rarest posting lists first
+        postings = sorted((self._postings.get(term, set()) for term in terms), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+
+        total = max(len(self._documents), 1)
+        group_ids = set(scope.group_ids)
+        hits = []
+        for message_id in candidates:
+            document = self._documents[message_id]
+            if not self._visible(document, scope, group_ids):
+                continue
+            rank = sum(
+                document.term_counts[term] * math.log(1 + total / len(self._postings[term]))
+                for term in terms
+            ) / document.length
+            hits.append(SearchHit(message_id=message_id, rank=rank, created_at=document.created_at))
+
+        hits.sort(key=lambda hit: (hit.rank, hit.created_at, hit.message_id), reverse=True)
+        if cursor:
+            last = decode_ranked_cursor(cursor)
+            hits = [hit for hit in hits if (hit.rank, hit.created_at, hit.message_id) < last]
+        return hits[:limit]
+
+
+def create_search_backend(backend: str) -> SearchBackend:
+    """Creates the search backend for the configured name.
+    Args:
+        backend (str): "postgres" or "memory".
+    Returns:
+        SearchBackend: The backend instance."""
+    if backend == "postgres":
+        return PostgresSearchBackend()
+    if backend == "memory":
+        return InMemorySearchBackend()
+    raise ValueError(f"Unknown search backend: {backend}")
+
+search_backend = create_search_backend(settings.SEARCH_BACKEND)
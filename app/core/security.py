@@ -1,15 +1,28 @@
 """This script handles password security (hashing and verification)
 and token generation (creation and encoding access tokens with
-expiration details) for the chat application."""
+expiration details) for the chat application.
+bcrypt is deliberately slow, so request handlers hash and verify through the
+bounded thread pool of `password_hasher` instead of blocking the event loop."""
 
 from app.core.config import settings
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from typing import Any, Union, Optional
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar, Union
+import asyncio
+import time
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+T = TypeVar("T")
+
+# Password hashing context; hashes of any other cost are flagged for an update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 # Function to create access token
 def create_access_token(
@@ -29,9 +42,39 @@ def create_access_token(
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+def create_upload_token(user_id: Any, digest: str) -> str:
+    """Creates the token proving that a user uploaded some content.
+    It carries no subject, so it can never be used as an access token.
+    Args:
+        user_id (Any): The uploader.
+        digest (str): The sha256 digest of the uploaded content.
+    Returns:
+        str: The upload token"""
+    expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ATTACHMENT_UPLOAD_TOKEN_EXPIRE_MINUTES)
+    to_encode = {"exp": expire, "scope": "upload", "uid": str(user_id), "digest": digest}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+def verify_upload_token(token: str, user_id: Any) -> str:
+    """Checks an upload token issued to a user.
+    Args:
+        token (str): The upload token.
+        user_id (Any): The user referencing the upload.
+    Returns:
+        str: The digest of the uploaded content.
+    Raises:
+        ValueError: If the token is invalid, expired or was issued to someone else."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as exc:
+        raise ValueError("Invalid or expired upload token.") from exc
+    if payload.get("scope") != "upload" or payload.get("uid") != str(user_id) or not payload.get("digest"):
+        raise ValueError("Invalid or expired upload token.")
+    return payload["digest"]
+
 # Function to verify password
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Checks if a plain text password matches a hashed password.
+    Blocks for the duration of bcrypt, async code uses password_hasher.verify.
     Args:
         plain_password (str): The plain text password.
         hashed_password (str): The hashed password.
@@ -42,8 +85,71 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 # Function to get password hash
 def get_password_hash(password: str) -> str:
     """Generates a hashed password.
+    Blocks for the duration of bcrypt, async code uses password_hasher.hash.
     Args:
         password (str): The password to hash.
     Returns:
         str: The hashed password."""
     return pwd_context.hash(password)
+
+class PasswordHasher:
+    """Runs password hashing and verification in a dedicated thread pool.
+    bcrypt releases the GIL, so the pool's threads hash in parallel while the
+    event loop keeps serving requests. At most max_pending calls are admitted at
+    once, later callers wait for a slot; waiting and in_flight expose the queue
+    depth, and stats() the totals for metrics."""
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._max_pending = max_pending
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.max_wait = 0.0
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_pending)
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.max_wait = max(self.max_wait, time.perf_counter() - queued_at)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        """Hashes a password with the configured cost."""
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Checks a password against its hash.
+        Returns:
+            Tuple[bool, Optional[str]]: Whether it matches, and a new hash to store
+            when it matches but was made with a different cost than the configured one."""
+        return await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the pool size, current queue depth and totals."""
+        return {
+            "workers": self.workers,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "max_wait_seconds": self.max_wait,
+        }
+
+    def shutdown(self) -> None:
+        """Stops the worker threads once the running calls are done."""
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
@@ -0,0 +1,125 @@
+"""This script defines the object stores holding attachment content.
+Uploads are written chunk by chunk to a pending upload and only committed under
+their final, content-addressed key (the sha256 digest) once the whole stream has
+been hashed, so nothing is ever buffered in memory and identical content always
+lands on the same key. Downloads stream the object back chunk by chunk. The local
+filesystem store is the only backend for now; its blocking file calls all run in
+worker threads so the event loop never waits on the disk."""
+
+from abc import ABC, abstractmethod
+from app.core.config import settings
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO
+import asyncio
+import os
+import uuid
+
+
+class PendingUpload(ABC):
+    """An upload being written, not yet visible under its final key."""
+
+    @abstractmethod
+    async def write(self, chunk: bytes) -> None:
+        """Appends a chunk to the upload."""
+
+    @abstractmethod
+    async def commit(self, key: str) -> None:
+        """Publishes the upload under its final key (replacing identical content)."""
+
+    @abstractmethod
+    async def abort(self) -> None:
+        """Discards the upload."""
+
+
+class ObjectStore(ABC):
+    """The interface every object store backend implements."""
+
+    @abstractmethod
+    async def begin_upload(self) -> PendingUpload:
+        """Starts a new upload."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Checks if an object is stored under the key."""
+
+    @abstractmethod
+    def read(self, key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """Streams the content stored under the key (FileNotFoundError if there is none)."""
+
+    def url_for(self, key: str) -> str:
+        """Returns the URL clients use to download the object."""
+        return f"{settings.STORAGE_PUBLIC_URL.rstrip('/')}/{key}"
+
+
+class _LocalPendingUpload(PendingUpload):
+    """A pending upload written to a temporary file next to the final location."""
+
+    def __init__(self, store: "LocalObjectStore", path: Path, file: BinaryIO) -> None:
+        self._store = store
+        self._path = path
+        self._file = file
+
+    async def write(self, chunk: bytes) -> None:
+        await asyncio.to_thread(self._file.write, chunk)
+
+    def _commit(self, key: str) -> None:
+        self._file.close()
+        target = self._store.path_for(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Atomic on the same filesystem; concurrent uploads of the same content write the same bytes
+        os.replace(self._path, target)
+
+    def _abort(self) -> None:
+        self._file.close()
+        self._path.unlink(missing_ok=True)
+
+    async def commit(self, key: str) -> None:
+        await asyncio.to_thread(self._commit, key)
+
+    async def abort(self) -> None:
+        await asyncio.to_thread(self._abort)
+
+
+class LocalObjectStore(ObjectStore):
+    """Object store keeping objects as files under a root directory.
+    Keys are fanned out over two directory levels (ab/cd/abcd...) to keep
+    directories small."""
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+        self._incoming = self.root / "incoming"
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key[:2] / key[2:4] / key
+
+    def _open_incoming(self, path: Path) -> BinaryIO:
+        self._incoming.mkdir(parents=True, exist_ok=True)
+        return open(path, "wb")
+
+    async def begin_upload(self) -> PendingUpload:
+        path = self._incoming / f"{uuid.uuid4()}.part"
+        return _LocalPendingUpload(self, path, await asyncio.to_thread(self._open_incoming, path))
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self.path_for(key).exists)
+
+    async def read(self, key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        file = await asyncio.to_thread(open, self.path_for(key), "rb")
+        try:
+            while chunk := await asyncio.to_thread(file.read, chunk_size):
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+
+
+def create_object_store(backend: str) -> ObjectStore:
+    """Creates the object store for the configured backend.
+    Args:
+        backend (str): The backend name (currently only "local").
+    Returns:
+        ObjectStore: The object store instance."""
+    if backend == "local":
+        return LocalObjectStore(settings.STORAGE_LOCAL_ROOT)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+object_store = create_object_store(settings.STORAGE_BACKEND)
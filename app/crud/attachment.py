@@ -0,0 +1,98 @@
+"""CRUD operations for attachment content (blobs)."""
+
+from app.core.config import settings
+from app.core.security import verify_upload_token
+from app.core.storage import object_store
+from app.models.messages import Blob
+from app.schemas.message import AttachmentCreate
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+import hashlib
+
+
+async def get_blob(db: AsyncSession, digest: str) -> Optional[Blob]:
+    """Get a blob by its sha256 digest."""
+    result = await db.execute(select(Blob).filter(Blob.digest == digest))
+    return result.scalar_one_or_none()
+
+async def get_blobs(db: AsyncSession, digests: Iterable[str]) -> Dict[str, Blob]:
+    """Get the blobs of many digests in one query, keyed by digest."""
+    digests = set(digests)
+    if not digests:
+        return {}
+    result = await db.execute(select(Blob).filter(Blob.digest.in_(digests)))
+    return {blob.digest: blob for blob in result.scalars().all()}
+
+async def resolve_attachments(
+        db: AsyncSession,
+        user_id: UUID,
+        attachment_lists: List[List[AttachmentCreate]]
+        ) -> List[List[Dict[str, Any]]]:
+    """Turn the attachments of a batch of messages into attachment rows.
+    Every attachment must carry an upload token issued to the sender for its
+    digest; the size, type and URL come from the stored blobs (one query).
+    Raises ValueError if a token is invalid or a digest has no blob."""
+    for attachment in (attachment for attachments in attachment_lists for attachment in attachments):
+        if verify_upload_token(attachment.upload_token, user_id) != attachment.digest:
+            raise ValueError("The upload token does not match the attachment digest.")
+    blobs = await get_blobs(
+        db, (attachment.digest for attachments in attachment_lists for attachment in attachments))
+    missing = {
+        attachment.digest for attachments in attachment_lists for attachment in attachments
+        if attachment.digest not in blobs
+    }
+    if missing:
+        raise ValueError(f"Unknown attachment digests: {sorted(missing)}.")
+    return [
+        [
+            {
+                "file_name": attachment.file_name,
+                "file_url": object_store.url_for(blobs[attachment.digest].storage_key),
+                "file_type": blobs[attachment.digest].content_type or "application/octet-stream",
+                "size": blobs[attachment.digest].size,
+                "digest": attachment.digest,
+            } for attachment in attachments
+        ] for attachments in attachment_lists
+    ]
+
+async def store_blob(
+        db: AsyncSession,
+        chunks: AsyncIterator[bytes],
+        content_type: Optional[str] = None
+        ) -> Tuple[Blob, bool]:
+    """Stream an upload into the object store, deduplicated by content.
+    The content is hashed while it is written, so it is never held in memory.
+    If a blob with the same digest already exists the new copy is discarded.
+    Returns the blob and whether it was deduplicated."""
+    upload = await object_store.begin_upload()
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > settings.ATTACHMENT_MAX_SIZE:
+                raise ValueError(f"Attachments may not exceed {settings.ATTACHMENT_MAX_SIZE} bytes.")
+            sha256.update(chunk)
+            await upload.write(chunk)
+    except BaseException:
+        await upload.abort()
+        raise
+
+    digest = sha256.hexdigest()
+    existing = await get_blob(db, digest)
+    if existing:
+        await upload.abort()
+        return existing, True
+
+    await upload.commit(digest)
+    # Concurrent uploads of the same content race to the same key, the first row wins
+    await db.execute(
+        insert(Blob).values(
+            digest=digest, size=size, content_type=content_type, storage_key=digest
+        ).on_conflict_do_nothing(index_elements=[Blob.digest])
+    )
+    await db.commit()
+    return await get_blob(db, digest), False
@@ -1,9 +1,12 @@
 """CRUD operations for friendship model."""
 
+from app.core.friend_graph import friend_graph
+from app.core.notification_buffer import notification_buffer
 from app.models.friendship import Friendship, FriendshipStatus
 from app.models.user import User
 from app.schemas.friendship import FriendshipCreate
-from sqlalchemy import or_, and_
+from app.schemas.notification import NotificationCreate, NotificationType
+from sqlalchemy import and_, func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -25,7 +28,11 @@ async def create_friendship(db: AsyncSession, sender_id: UUID, receiver_id: UUID
     )
     db.add(friendship)
     await db.commit()
+    friend_graph.invalidate(sender_id, receiver_id)
     await db.refresh(friendship)
+    await notification_buffer.enqueue(NotificationCreate(
+        type=NotificationType.FRIEND_REQUEST, content="You have a new friend request.",
+        user_id=receiver_id, sender_id=sender_id, friendship_id=friendship.id))
     return friendship
 
 async def get_friendship_by_id(db: AsyncSession, friendship_id: UUID) -> Optional[Friendship]:
@@ -40,42 +47,50 @@ async def get_friendship_by_id(db: AsyncSession, friendship_id: UUID) -> Optiona
 
 async def get_friendship_between_users(db: AsyncSession, user_id: UUID, friend_id: UUID) -> Optional[Friendship]:
     """Get a friendship between two users."""
+    # Compare the ordered user pair so the lookup is a single probe of ix_friendships_user_pair
+    low, high = sorted((user_id, friend_id))
     result = await db.execute(
         select(Friendship).filter(
-        # ((Friendship.sender_id == user_id) & (Friendship.receiver_id == friend_id)) | ((Friendship.sender_id == friend_id) & (Friendship.receiver_id == user_id))
-        or_(
-            and_(Friendship.sender_id == user_id, Friendship.receiver_id == friend_id),
-            and_(Friendship.sender_id == friend_id, Friendship.receiver_id == user_id)
-            )
+            func.least(Friendship.sender_id, Friendship.receiver_id) == low,
+            func.greatest(Friendship.sender_id, Friendship.receiver_id) == high
         )
     )
     return result.scalar_one_or_none()
     # notes on the query:
-    # The query uses the or_ and and_ functions from SQLAlchemy to create a complex filter condition that checks if a friendship exists between two users. The query filters the Friendship model by sender_id and receiver_id, checking if the sender_id is equal to user_id and the receiver_id is equal to friend_id, or if the sender_id is equal to friend_id and the receiver_id is equal to user_id. This condition ensures that the query returns a friendship between the two users regardless of the sender and receiver order.
+    # The query matches the friendship regardless of which user sent the request by comparing the least and greatest of sender_id and receiver_id against the sorted pair of user ids. Unlike an or_ of two and_ predicates, this matches the expression index declared on the Friendship model, so the planner can answer it with a single index lookup.
 
 
 async def get_user_friends(db: AsyncSession, user_id: UUID, status: Optional[FriendshipStatus] = None) -> List[User]:
     """Get a user's friends with optional status filter."""
-    # query = select(Friendship).filter(
-    #     ((Friendship.sender_id == user_id) | (Friendship.receiver_id == user_id))
-    # )
+    if status == FriendshipStatus.ACCEPTED:
+        # Accepted friends come from the cached adjacency set, only the friends themselves are loaded
+        friend_ids = await friend_graph.friends(db, user_id)
+        if not friend_ids:
+            return []
+        result = await db.execute(select(User).filter(User.id.in_(friend_ids)))
+        return result.scalars().all()
     query = select(User).join(Friendship, or_(
-        Friendship.sender_id == User.id,
-        Friendship.receiver_id == User.id
+        and_(Friendship.sender_id == user_id, Friendship.receiver_id == User.id),
+        and_(Friendship.receiver_id == user_id, Friendship.sender_id == User.id),
     ))
     if status:
         query = query.filter(Friendship.status == status)
     result = await db.execute(query)
     return result.scalars().all()
     # notes on the query:
-    # The query uses the join function from SQLAlchemy to join the User and Friendship models based on the sender_id and receiver_id fields. The query filters the Friendship model by sender_id and receiver_id, checking if the sender_id is equal to the user_id or the receiver_id is equal to the user_id. This condition ensures that the query returns friendships where the user is either the sender or the receiver. The query also includes an optional filter based on the friendship status, allowing the caller to retrieve friends with a specific status if needed. And it returns a list of User objects representing the user's friends.
+    # The join condition pins one side of the friendship to the caller and returns the user on the other side, so only the caller's friendships are read (through the sender and receiver indexes). Without a status filter every friendship of the caller is returned, whatever its status.
 
 async def update_friendship_status(db: AsyncSession, friendship: Friendship, status: FriendshipStatus) -> Friendship:
     """Update a friendship's status."""
     friendship.status = status
     db.add(friendship)
     await db.commit()
+    friend_graph.invalidate(friendship.sender_id, friendship.receiver_id)
     await db.refresh(friendship)
+    if status == FriendshipStatus.ACCEPTED:
+        await notification_buffer.enqueue(NotificationCreate(
+            type=NotificationType.FRIEND_ACCEPTED, content="Your friend request was accepted.",
+            user_id=friendship.sender_id, sender_id=friendship.receiver_id, friendship_id=friendship.id))
     return friendship
 
 async def delete_friendship(db: AsyncSession, friendship_id: UUID) -> bool:
@@ -83,8 +98,10 @@ async def delete_friendship(db: AsyncSession, friendship_id: UUID) -> bool:
     friendship = await get_friendship_by_id(db, friendship_id)
     if not friendship:
         return False
-    db.delete(friendship)
+    user_ids = (friendship.sender_id, friendship.receiver_id)
+    await db.delete(friendship)
     await db.commit()
+    friend_graph.invalidate(*user_ids)
     return True
 
 # notes on the CRUD operations for the Friendship model:
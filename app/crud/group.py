@@ -139,6 +139,14 @@ async def get_group_members(db: AsyncSession, group_id: UUID) -> List[GroupMembe
     )
     return result.scalars().all()
 
+async def is_group_member(db: AsyncSession, group_id: UUID, user_id: UUID) -> bool:
+    """Check if a user is a member of a group."""
+    result = await db.execute(
+        select(GroupMember.id).filter(
+            and_(GroupMember.group_id == group_id, GroupMember.user_id == user_id)
+        ))
+    return result.first() is not None
+
 async def get_user_groups(db: AsyncSession, user_id: UUID) -> List[Group]:
     """Get all groups a user is a member of."""
     result = await db.execute(
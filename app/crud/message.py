@@ -1,74 +1,428 @@
 """CRUD operations for the messages model."""
 
-from app.models.messages import Message, Attachment
-from app.schemas.message import MessageCreate, AttachmentCreate
-from sqlalchemy import or_, and_
+from app.core.broker import broker
+from app.core.config import settings
+from app.core.notification_buffer import notification_buffer
+from app.core.pagination import decode_cursor
+from app.core.search import SearchHit, SearchScope, search_backend
+from app.crud.attachment import resolve_attachments
+from app.crud.reaction import delete_message_reactions
+from app.crud.read_cursor import advance_read_cursor
+from app.crud.unread_counter import increment_message_counters
+from app.models.group import GroupMember
+from app.models.messages import Message, Attachment, get_conversation_id
+from app.models.notification import Notification
+from app.models.read_cursor import ReadCursor
+from app.schemas.message import MessageCreate
+from app.schemas.notification import NotificationCreate, NotificationType
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Integer, delete, func, insert, literal, or_, true, tuple_, update
+from sqlalchemy.dialects.postgresql import array
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import Any, Dict, List, Optional, Union
-from uuid import UUID
+from sqlalchemy.orm import aliased, selectinload, sessionmaker
+from sqlalchemy.sql import Select
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID, uuid4
+
+# Length of the message excerpt carried by its notifications
+NOTIFICATION_PREVIEW_LENGTH = 100
+
+def _message_event(message: Message, attachments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the real-time event payload for a newly created message."""
+    return {
+        "type": "message.created",
+        "message": {
+            "id": str(message.id),
+            "sender_id": str(message.sender_id),
+            "receiver_id": str(message.receiver_id) if message.receiver_id else None,
+            "group_id": str(message.group_id) if message.group_id else None,
+            "content": message.content,
+            "reply_to_message_id": str(message.reply_to_message_id) if message.reply_to_message_id else None,
+            "created_at": message.created_at.isoformat() if message.created_at else None,
+            "attachments": attachments,
+        },
+    }
+
+async def _group_member_ids(db: AsyncSession, group_ids: Iterable[UUID]) -> Dict[UUID, List[UUID]]:
+    """Get the member ids of several groups in one query."""
+    members: Dict[UUID, List[UUID]] = {group_id: [] for group_id in group_ids}
+    if not members:
+        return members
+    result = await db.execute(
+        select(GroupMember.group_id, GroupMember.user_id).filter(GroupMember.group_id.in_(members))
+    )
+    for group_id, user_id in result.all():
+        members[group_id].append(user_id)
+    return members
+
+async def publish_messages(
+        db: AsyncSession,
+        messages: List[Message],
+        attachments: Optional[List[List[Dict[str, Any]]]] = None
+        ) -> None:
+    """Push committed messages to their connected recipients through the broker.
+    Group memberships are resolved with a single query for the whole batch; DM
+    recipients include the sender so their other devices stay in sync."""
+    group_members = await _group_member_ids(db, {m.group_id for m in messages if m.group_id})
+    for index, message in enumerate(messages):
+        if message.receiver_id:
+            recipients = [message.sender_id, message.receiver_id]
+        else:
+            recipients = group_members.get(message.group_id, [])
+        await broker.publish(recipients, _message_event(message, attachments[index] if attachments else []))
+
+async def queue_message_notifications(messages: Iterable[Message]) -> None:
+    """Queue the notifications of committed messages on the write-behind buffer:
+    one for the receiver of a direct message, one fan-out per group message."""
+    for message in messages:
+        preview = message.content[:NOTIFICATION_PREVIEW_LENGTH]
+        if message.group_id:
+            await notification_buffer.enqueue_group_message(message.group_id, message.sender_id, message.id, preview)
+        elif message.receiver_id != message.sender_id:
+            await notification_buffer.enqueue(NotificationCreate(
+                type=NotificationType.MESSAGE, content=preview, user_id=message.receiver_id,
+                sender_id=message.sender_id, message_id=message.id))
 
 async def create_message(db: AsyncSession, message: MessageCreate, sender_id: UUID) -> Message:
-    """Create a new message."""
+    """Create a new message and push it to connected recipients once committed."""
 
     if not message.receiver_id and not message.group_id:
         raise ValueError("Either receiver_id or group_id must be provided.")
-
     # Preparing attachments
-    attachments = []
-    if message.attachments:
-        attachments = [
-            Attachment(
-                **AttachmentCreate(**attachment.model_dump()).model_dump(exclude_unset=True)
-            ) for attachment in message.attachments
-        ]
-    
+    [attachments_data] = await resolve_attachments(db, sender_id, [message.attachments or []])
+    attachments = [Attachment(**attachment) for attachment in attachments_data]
+
     # Create message
     message = Message(
         sender_id=sender_id,
         receiver_id=message.receiver_id,
         group_id=message.group_id,
+        conversation_id=get_conversation_id(sender_id, message.receiver_id) if message.receiver_id else None,
         content=message.content,
         reply_to_message_id=message.reply_to_message_id,
         is_read=False,
         attachments=attachments
     )
     db.add(message)
+    await increment_message_counters(db, [message])
     await db.commit()
     await db.refresh(message)
+    await search_backend.index_messages([message])
+    await publish_messages(db, [message], [attachments_data])
+    await queue_message_notifications([message])
     return message
 
+async def create_messages_bulk(db: AsyncSession, messages: List[MessageCreate], sender_id: UUID) -> List[UUID]:
+    """Create a batch of messages in one transaction.
+    Messages and attachments are written with one multi-row INSERT ... RETURNING
+    each instead of a commit and refresh per message. Ids are generated up front
+    so the returned ids follow the input order, and every message is stamped one
+    microsecond after the previous one so history keeps the submitted order."""
+    if not messages:
+        return []
+    if len(messages) > settings.MESSAGE_BULK_MAX_BATCH:
+        raise ValueError(f"A batch may contain at most {settings.MESSAGE_BULK_MAX_BATCH} messages.")
+
+    # Validate the whole batch before writing anything
+    invalid = [
+        index for index, message in enumerate(messages)
+        if bool(message.receiver_id) == bool(message.group_id)
+    ]
+    if invalid:
+        raise ValueError(f"Exactly one of receiver_id or group_id must be provided (messages {invalid}).")
+    attachments_data = await resolve_attachments(db, sender_id, [message.attachments or [] for message in messages])
+
+    message_rows = []
+    attachment_rows = []
+    for index, message in enumerate(messages):
+        message_id = uuid4()
+        message_rows.append({
+            "id": message_id,
+            # (created_at, id) orders history; the batch shares now(), the offset keeps the input order
+            "created_at": func.now() + timedelta(microseconds=index),
+            "sender_id": sender_id,
+            "receiver_id": message.receiver_id,
+            "group_id": message.group_id,
+            "conversation_id": get_conversation_id(sender_id, message.receiver_id) if message.receiver_id else None,
+            "content": message.content,
+            "reply_to_message_id": message.reply_to_message_id,
+            "is_read": False,
+            "is_edited": False,
+        })
+        attachment_rows.extend(
+            {"id": uuid4(), "message_id": message_id, **attachment} for attachment in attachments_data[index]
+        )
+
+    result = await db.execute(
+        insert(Message).values(message_rows).returning(Message.id, Message.created_at)
+    )
+    created_at = dict(result.all())
+    # Chunked to stay below the driver's bind parameter limit
+    for start in range(0, len(attachment_rows), settings.MESSAGE_BULK_MAX_BATCH):
+        await db.execute(insert(Attachment).values(attachment_rows[start:start + settings.MESSAGE_BULK_MAX_BATCH]))
+
+    # Counters and publishing work from the inserted values, no per-message refresh needed
+    created = [Message(**{**row, "created_at": created_at[row["id"]]}) for row in message_rows]
+    await increment_message_counters(db, created)
+    await db.commit()
+    await search_backend.index_messages(created)
+    await publish_messages(db, created, attachments_data)
+    await queue_message_notifications(created)
+    return [row["id"] for row in message_rows]
+
 async def get_message_by_id(db: AsyncSession, message_id: UUID) -> Optional[Message]:
     """Get a message by id."""
     result = await db.execute(select(Message).filter(Message.id == message_id))
     return result.scalar_one_or_none()
 
+def _visible_to(user_id: UUID):
+    """The condition matching the messages a user may see: direct messages they
+    sent or received and messages of their groups."""
+    member_of = select(GroupMember.group_id).filter(GroupMember.user_id == user_id)
+    return or_(Message.sender_id == user_id, Message.receiver_id == user_id, Message.group_id.in_(member_of))
+
+async def get_visible_message_ids(db: AsyncSession, user_id: UUID, message_ids: Iterable[UUID]) -> List[UUID]:
+    """Filter message ids down to the ones the user may see, in one query:
+    direct messages they sent or received and messages of their groups."""
+    message_ids = list(message_ids)
+    if not message_ids:
+        return []
+    result = await db.execute(select(Message.id).filter(Message.id.in_(message_ids), _visible_to(user_id)))
+    return list(result.scalars().all())
+
+async def is_blob_visible(db: AsyncSession, user_id: UUID, digest: str) -> bool:
+    """Check if the user may see a message with an attachment of this content, in one query.
+    Identical content is shared by every attachment referencing it, so knowing
+    the digest alone does not grant access."""
+    result = await db.execute(
+        select(
+            select(Attachment.id)
+            .join(Message, Message.id == Attachment.message_id)
+            .filter(Attachment.digest == digest, _visible_to(user_id))
+            .exists()
+        )
+    )
+    return result.scalar_one()
+
+def _paginate_messages(query, before: Optional[str], after: Optional[str], skip: int, limit: int):
+    """Apply keyset pagination to a message query.
+    Messages are always returned newest first. A `before` cursor pages back into
+    older history, an `after` cursor fetches newer messages; either one turns the
+    page into an index range scan on (created_at, id) instead of an OFFSET walk.
+    Returns the query and whether the fetched rows must be reversed."""
+    if before and after:
+        raise ValueError("Only one of before or after may be provided.")
+    # The plain created_at bound is redundant with the row comparison but lets
+    # Postgres prune the monthly partitions outside the requested range
+    if after:
+        created_at, message_id = decode_cursor(after)
+        query = query.filter(
+            Message.created_at >= created_at,
+            tuple_(Message.created_at, Message.id) > tuple_(created_at, message_id))
+        return query.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit), True
+    if before:
+        created_at, message_id = decode_cursor(before)
+        query = query.filter(
+            Message.created_at <= created_at,
+            tuple_(Message.created_at, Message.id) < tuple_(created_at, message_id))
+    else:
+        # Legacy offset paging is only kept for the first request without a cursor
+        query = query.offset(skip)
+    return query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit), False
+
 async def get_conversation_messages(
         db: AsyncSession,
         user_id: UUID,
         other_user_id: UUID,
         skip: int = 0,
-        limit: int = 100
+        limit: int = 100,
+        before: Optional[str] = None,
+        after: Optional[str] = None
         ) -> List[Message]:
-    """Get messages between two users."""
-    result = await db.execute(
-        select(Message)
-        .filter(
-            or_(
-                and_(Message.sender_id == user_id, Message.receiver_id == other_user_id),
-                and_(Message.sender_id == other_user_id, Message.receiver_id == user_id)
-            )
+    """Get messages between two users, newest first, with their attachments.
+    Pass the cursor of the oldest message seen as `before` to load older history."""
+    # Both directions share one conversation key, so this is a single index range read
+    query = select(Message).filter(
+        Message.conversation_id == get_conversation_id(user_id, other_user_id)
+    ).options(selectinload(Message.attachments))
+    query, reverse = _paginate_messages(query, before, after, skip, limit)
+    result = await db.execute(query)
+    messages = result.scalars().all()
+    return messages[::-1] if reverse else messages
+
+async def get_group_messages(
+        db: AsyncSession,
+        group_id: UUID,
+        skip: int = 0,
+        limit: int = 100,
+        before: Optional[str] = None,
+        after: Optional[str] = None
+        ) -> List[Message]:
+    """Get messages in a group, newest first, with their attachments.
+    Pass the cursor of the oldest message seen as `before` to load older history."""
+    query = select(Message).filter(Message.group_id == group_id).options(selectinload(Message.attachments))
+    query, reverse = _paginate_messages(query, before, after, skip, limit)
+    result = await db.execute(query)
+    messages = result.scalars().all()
+    return messages[::-1] if reverse else messages
+
+async def export_messages(
+        session_maker: sessionmaker,
+        user_id: UUID,
+        other_user_id: Optional[UUID] = None,
+        group_id: Optional[UUID] = None
+        ) -> AsyncIterator[Dict[str, Any]]:
+    """Stream the full history of a conversation or group, oldest first, with
+    the attachments metadata of each message inlined.
+    Rows are read through a server-side cursor (AsyncSession.stream) in keyset
+    batches of MESSAGE_EXPORT_BATCH_SIZE messages. Every batch runs in its own
+    short transaction, so memory stays flat and no snapshot is held open for the
+    whole export. Group membership must be checked by the caller."""
+    if bool(other_user_id) == bool(group_id):
+        raise ValueError("Exactly one of other_user_id or group_id must be provided.")
+    if other_user_id:
+        scope = Message.conversation_id == get_conversation_id(user_id, other_user_id)
+    else:
+        scope = Message.group_id == group_id
+
+    last_key = None
+    while True:
+        batch = select(
+            Message.id, Message.sender_id, Message.receiver_id, Message.group_id, Message.content,
+            Message.reply_to_message_id, Message.is_edited, Message.created_at, Message.edited_at,
+        ).filter(scope)
+        if last_key:
+            batch = batch.filter(
+                Message.created_at >= last_key[0],
+                tuple_(Message.created_at, Message.id) > tuple_(*last_key))
+        batch = batch.order_by(Message.created_at, Message.id).limit(settings.MESSAGE_EXPORT_BATCH_SIZE).subquery()
+        stmt = (
+            select(batch, Attachment.file_name, Attachment.file_url, Attachment.file_type)
+            .outerjoin(Attachment, Attachment.message_id == batch.c.id)
+            .order_by(batch.c.created_at, batch.c.id)
+            .execution_options(yield_per=500)
         )
-        .order_by(Message.created_at.desc()).offset(skip).limit(limit)
+
+        exported = 0
+        current = None
+        async with session_maker() as db:
+            rows = await db.stream(stmt)
+            async for row in rows:
+                if current is None or current["id"] != row.id:
+                    if current is not None:
+                        yield current
+                    exported += 1
+                    current = {
+                        "id": row.id,
+                        "sender_id": row.sender_id,
+                        "receiver_id": row.receiver_id,
+                        "group_id": row.group_id,
+                        "content": row.content,
+                        "reply_to_message_id": row.reply_to_message_id,
+                        "is_edited": row.is_edited,
+                        "created_at": row.created_at,
+                        "edited_at": row.edited_at,
+                        "attachments": [],
+                    }
+                    last_key = (row.created_at, row.id)
+                if row.file_url is not None:
+                    current["attachments"].append(
+                        {"file_name": row.file_name, "file_url": row.file_url, "file_type": row.file_type}
+                    )
+        if current is not None:
+            yield current
+        if exported < settings.MESSAGE_EXPORT_BATCH_SIZE:
+            return
+
+async def search_messages(
+        db: AsyncSession,
+        user_id: UUID,
+        query: str,
+        group_id: Optional[UUID] = None,
+        other_user_id: Optional[UUID] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None
+        ) -> List[SearchHit]:
+    """Full-text search over the messages a user can see, best matches first.
+    Without a group or other user the search covers all of the user's direct
+    conversations and groups. Every hit carries its message."""
+    if group_id and other_user_id:
+        raise ValueError("Only one of group_id or other_user_id may be provided.")
+    if other_user_id:
+        scope = SearchScope(user_id=user_id, conversation_id=get_conversation_id(user_id, other_user_id))
+    else:
+        memberships = select(GroupMember.group_id).filter(GroupMember.user_id == user_id)
+        if group_id:
+            memberships = memberships.filter(GroupMember.group_id == group_id)
+        group_ids = list((await db.execute(memberships)).scalars().all())
+        if group_id and not group_ids:
+            raise ValueError("User is not a member of the group.")
+        scope = SearchScope(user_id=user_id, group_ids=group_ids, include_direct=group_id is None)
+
+    hits = await search_backend.search(db, query, scope, limit=limit, cursor=cursor)
+
+    # Backends that only return ids get their messages loaded in one query
+    missing = [hit.message_id for hit in hits if hit.message is None]
+    if missing:
+        result = await db.execute(select(Message).filter(Message.id.in_(missing)))
+        messages = {message.id: message for message in result.scalars().all()}
+        hits = [hit for hit in hits if hit.message is not None or hit.message_id in messages]
+        for hit in hits:
+            hit.message = hit.message or messages[hit.message_id]
+    return hits
+
+async def get_message_thread(
+        db: AsyncSession,
+        message_id: UUID,
+        max_depth: int = settings.THREAD_MAX_DEPTH,
+        max_replies: int = settings.THREAD_MAX_REPLIES
+        ) -> List[Tuple[Message, int, int]]:
+    """Get a message and its reply tree in a single recursive query.
+    Each level keeps at most `max_replies` replies per message (oldest first)
+    and the walk stops at `max_depth`. The result is flattened depth-first, in
+    chronological order within a level, as (message, depth, reply_count) tuples
+    where reply_count is the total number of direct replies to that message."""
+    thread = (
+        select(
+            Message.id,
+            literal(0, Integer).label("depth"),
+            array([Message.created_at]).label("path"),
+        )
+        .filter(Message.id == message_id)
+        .cte("thread", recursive=True)
+    )
+    child = aliased(Message)
+    replies = (
+        select(child.id, child.created_at)
+        .filter(child.reply_to_message_id == thread.c.id)
+        .order_by(child.created_at, child.id)
+        .limit(max_replies)
+        .lateral("replies")
+    )
+    thread = thread.union_all(
+        select(
+            replies.c.id,
+            thread.c.depth + 1,
+            func.array_append(thread.c.path, replies.c.created_at),
+        )
+        .select_from(thread.join(replies, true()))
+        .filter(thread.c.depth < max_depth)
     )
-    return result.scalars().all()
 
-async def get_group_messages(db: AsyncSession, group_id: UUID, skip: int = 0, limit: int = 100) -> List[Message]:
-    """Get messages in a group."""
+    reply = aliased(Message)
+    reply_count = (
+        select(func.count(reply.id))
+        .filter(reply.reply_to_message_id == Message.id)
+        .correlate(Message)
+        .scalar_subquery()
+    )
     result = await db.execute(
-        select(Message).filter(Message.group_id == group_id).order_by(Message.created_at.desc()).offset(skip).limit(limit)
+        select(Message, thread.c.depth, reply_count)
+        .join(thread, Message.id == thread.c.id)
+        .order_by(thread.c.path, Message.id)
     )
-    return result.scalars().all()
+    return [(message, depth, count) for message, depth, count in result.all()]
 
 async def update_message(db: AsyncSession, message_id: UUID, message_in: Union[MessageCreate, Dict[str, Any]]) -> Optional[Message]:
     """Update an existing message."""
@@ -86,28 +440,58 @@ async def update_message(db: AsyncSession, message_id: UUID, message_in: Union[M
     
     await db.commit()
     await db.refresh(message)
+    await search_backend.index_messages([message])
     return message
 
+async def delete_message_dependents(db: AsyncSession, message_ids: Union[Iterable[UUID], Select]) -> None:
+    """Clean up the rows referring to messages being deleted, given as ids or a select of ids.
+    Foreign keys cannot point at the partitioned messages table, so this does
+    what ON DELETE used to: attachments and reactions are deleted, notifications
+    and replies lose their message reference. Read cursors keep theirs, the
+    watermark is a position in the history, not a reference. Does not commit."""
+    if not isinstance(message_ids, Select):
+        message_ids = list(message_ids)
+    await db.execute(delete(Attachment).filter(Attachment.message_id.in_(message_ids)))
+    await delete_message_reactions(db, message_ids)
+    await db.execute(
+        update(Notification).filter(Notification.message_id.in_(message_ids)).values(message_id=None))
+    # edited_at is passed through explicitly, otherwise its onupdate would stamp this as an edit
+    await db.execute(
+        update(Message).filter(Message.reply_to_message_id.in_(message_ids))
+        .values(reply_to_message_id=None, edited_at=Message.edited_at))
+
 async def delete_message(db: AsyncSession, message_id: UUID) -> Optional[Message]:
     """Delete a message."""
     message = await get_message_by_id(db, message_id)
     if not message:
         return {"error": "Message not found"}
     await db.delete(message)
+    await delete_message_dependents(db, [message_id])
     await db.commit()
+    await search_backend.remove_messages([message_id])
     return {"message": "Message deleted successfully"}
 
-async def mark_message_as_read(db: AsyncSession, message_id: UUID) -> Optional[Message]:
-    """Mark a message as read."""
-    message = await get_message_by_id(db, message_id)
-    if not message:
-        return None
-    message.is_read = True
-    await db.commit()
-    await db.refresh(message)
-    return message
+
+async def mark_conversation_as_read(
+        db: AsyncSession,
+        user_id: UUID,
+        other_user_id: UUID,
+        up_to_message_id: Optional[UUID] = None,
+        up_to: Optional[datetime] = None
+        ) -> Optional[ReadCursor]:
+    """Mark a conversation as read for a user, up to a message or a timestamp
+    (everything sent so far if neither is given).
+    Read state is the user's watermark in the conversation, so this is the
+    single upsert of advance_read_cursor whatever the number of unread messages,
+    instead of flipping a flag on each of them. Returns None if the watermark
+    did not move."""
+    if up_to_message_id and up_to:
+        raise ValueError("Only one of up_to_message_id or up_to may be provided.")
+    if not up_to_message_id and not up_to:
+        up_to = datetime.now(timezone.utc)
+    return await advance_read_cursor(db, user_id, up_to_message_id, other_user_id=other_user_id, up_to=up_to)
 # Code summary:
-# This snippet defines CRUD operations for the messages model. The create_message function creates a new message in the database, including any attachments associated with the message. The get_message_by_id function retrieves a message by its ID. The get_conversation_messages function retrieves messages exchanged between two users. The get_group_messages function retrieves messages in a group. The update_message function updates an existing message. The delete_message function deletes a message. The mark_message_as_read function marks a message as read in the database.
+# This snippet defines CRUD operations for the messages model. The create_message function creates a new message in the database, including any attachments associated with the message. The get_message_by_id function retrieves a message by its ID. The get_conversation_messages function retrieves messages exchanged between two users. The get_group_messages function retrieves messages in a group. The update_message function updates an existing message. The delete_message function deletes a message.
 #
 # The CRUD operations for the messages model provide the necessary functionality to manage messages in the messaging application. These operations allow users to create, retrieve, update, and delete messages, as well as mark messages as read. By implementing these operations, the application can handle message-related interactions between users and groups effectively.
 #
@@ -1,15 +1,53 @@
 """CRUD operations for notifications model."""
 
+from app.core.config import settings
+from app.core.notification_stream import notification_broadcaster
+from app.core.pagination import decode_cursor, decode_position_cursor
+from app.crud.unread_counter import adjust_notification_counter, increment_notification_counters
+from app.models.group import GroupMember
 from app.models.notification import Notification, NotificationType
 from app.schemas.notification import NotificationCreate
+from sqlalchemy import Text, and_, func, literal, literal_column, tuple_, update
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional
-from uuid import UUID
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID, uuid4
 
+# The writing transaction and the oldest transaction still running (the
+# snapshot's xmin), as bigint; every transaction below the horizon has ended
+CURRENT_XID = literal_column("pg_current_xact_id()::text::bigint")
+STREAM_HORIZON = literal_column("pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
 
-async def create_notification(db: AsyncSession, notification: NotificationCreate) -> Notification:
-    """Create a new notification."""
+def _coalesce_key(notification: NotificationCreate) -> Optional[str]:
+    """The key unread notifications of a chatty source are merged by, if any.
+    Group messages are merged per group, direct messages per sender."""
+    if notification.type == NotificationType.GROUP_MESSAGE.value and notification.group_id:
+        return str(notification.group_id)
+    if notification.type == NotificationType.MESSAGE.value and notification.sender_id:
+        return str(notification.sender_id)
+    return None
+
+def _coalescing_insert(stmt):
+    """Turn an insert into notifications into a merge with the matching unread row.
+    The merged row adds the inserted row's count and points at the latest event;
+    RETURNING tells apart inserted rows (xmax = 0) from merged ones."""
+    return stmt.on_conflict_do_update(
+        index_elements=[Notification.user_id, Notification.type, Notification.coalesce_key],
+        index_where=and_(Notification.is_read.is_not(True), Notification.coalesce_key.is_not(None)),
+        set_={
+            "count": Notification.count + stmt.excluded.count,
+            "sender_id": stmt.excluded.sender_id,
+            "message_id": stmt.excluded.message_id,
+            "message": stmt.excluded.message,
+            # The notification moves back to the top of the listing and the stream
+            "created_at": func.now(),
+            "stream_xid": CURRENT_XID,
+        },
+    ).returning(Notification.id, Notification.user_id, literal_column("xmax = 0").label("inserted"))
+
+def validate_notification(notification: NotificationCreate) -> None:
+    """Raise ValueError if the notification cannot be stored."""
     # Ensure at least one of the optional fields is provided
     if not any([
         notification.sender_id,
@@ -20,39 +58,174 @@ async def create_notification(db: AsyncSession, notification: NotificationCreate
         raise ValueError("At least one of sender_id, group_id, message_id, or friendship_id must be provided.")
      
     # Check if the notification type is valid
-    if notification.type not in NotificationType:
+    if notification.type not in {notification_type.value for notification_type in NotificationType}:
         raise ValueError("Invalid notification type.")
-    
 
-    db_notification = Notification(
+def _notification_values(notification: NotificationCreate) -> Dict[str, Any]:
+    """The column values of a new notification."""
+    return dict(
         user_id=notification.user_id,
         sender_id=notification.sender_id,
         group_id=notification.group_id,
-        type=notification.type,
+        type=NotificationType(notification.type),
         message_id=notification.message_id,
         friendship_id=notification.friendship_id,
-        message=notification.content,
+        content=notification.content,
         is_read=False,
     )
-    db.add(db_notification)
+
+async def create_notification(
+        db: AsyncSession,
+        notification: NotificationCreate,
+        coalesce: bool = settings.NOTIFICATION_COALESCING
+        ) -> Notification:
+    """Create a new notification.
+    With coalesce, a group or direct message notification is merged into the
+    user's unread notification for the same group or sender, if there is one."""
+    validate_notification(notification)
+    values = _notification_values(notification)
+    key = _coalesce_key(notification) if coalesce else None
+    if key is None:
+        db_notification = Notification(**values)
+        db.add(db_notification)
+        await adjust_notification_counter(db, notification.user_id, 1)
+        await db.commit()
+        await db.refresh(db_notification)
+        await notification_broadcaster.publish([notification.user_id])
+        return db_notification
+
+    result = await db.execute(_coalescing_insert(insert(Notification).values(**values, coalesce_key=key, count=1)))
+    notification_id, _, inserted = result.one()
+    if inserted:
+        await adjust_notification_counter(db, notification.user_id, 1)
     await db.commit()
-    await db.refresh(db_notification)
-    return db_notification
+    await notification_broadcaster.publish([notification.user_id])
+    result = await db.execute(
+        select(Notification).filter(Notification.id == notification_id).execution_options(populate_existing=True)
+    )
+    return result.scalar_one()
+
+async def create_notifications_bulk(
+        db: AsyncSession,
+        notifications: List[NotificationCreate],
+        coalesce: bool = settings.NOTIFICATION_COALESCING
+        ) -> int:
+    """Store a batch of already validated notifications with one multi-row insert.
+    Coalescable notifications are merged in memory first, since one INSERT ...
+    ON CONFLICT DO UPDATE may not touch the same row twice, then upserted like
+    in create_notification. Returns the number of new rows."""
+    plain: List[Dict[str, Any]] = []
+    merged: Dict[Tuple[UUID, str, str], Dict[str, Any]] = {}
+    for notification in notifications:
+        values = _notification_values(notification)
+        key = _coalesce_key(notification) if coalesce else None
+        if key is None:
+            plain.append(dict(values, id=uuid4()))
+            continue
+        previous = merged.get((notification.user_id, notification.type, key))
+        count = previous["count"] + 1 if previous else 1
+        # The latest event wins, like in the ON CONFLICT update
+        merged[(notification.user_id, notification.type, key)] = dict(
+            values, id=uuid4(), coalesce_key=key, count=count)
+
+    new_for: List[UUID] = [row["user_id"] for row in plain]
+    if plain:
+        await db.execute(insert(Notification).values(plain))
+    if merged:
+        result = await db.execute(_coalescing_insert(insert(Notification).values(list(merged.values()))))
+        new_for += [user_id for _, user_id, inserted in result.all() if inserted]
+    await increment_notification_counters(db, new_for)
+    await db.commit()
+    await notification_broadcaster.publish({notification.user_id for notification in notifications})
+    return len(new_for)
+
+async def notify_group_members(
+        db: AsyncSession,
+        group_id: UUID,
+        sender_id: UUID,
+        message_id: UUID,
+        content: str
+        ) -> int:
+    """Notify every member of a group but the sender of a new group message.
+    Runs as one INSERT ... SELECT over the members, coalesced into each member's
+    unread notification for the group, so a busy group touches one row per member
+    instead of adding one per message. Returns the number of new rows."""
+    members = select(
+        # id only has a Python-side default, which INSERT ... SELECT does not apply
+        func.gen_random_uuid(),
+        GroupMember.user_id,
+        literal(sender_id, PG_UUID(as_uuid=True)),
+        literal(group_id, PG_UUID(as_uuid=True)),
+        literal(message_id, PG_UUID(as_uuid=True)),
+        literal(NotificationType.GROUP_MESSAGE, Notification.type.type),
+        literal(content, Text),
+        literal(str(group_id)),
+        literal(1),
+        literal(False),
+    ).filter(GroupMember.group_id == group_id, GroupMember.user_id != sender_id)
+    result = await db.execute(_coalescing_insert(insert(Notification).from_select(
+        ["id", "user_id", "sender_id", "group_id", "message_id", "type", "message", "coalesce_key", "count", "is_read"],
+        members,
+    )))
+    rows = result.all()
+    new_for = [user_id for _, user_id, inserted in rows if inserted]
+    await increment_notification_counters(db, new_for)
+    await db.commit()
+    await notification_broadcaster.publish([user_id for _, user_id, _ in rows])
+    return len(new_for)
 
 async def get_user_notifications(
     db: AsyncSession,
     user_id: UUID,
     is_read: Optional[bool] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    before: Optional[str] = None
 ) -> List[Notification]:
-    """Get notifications for a user."""
+    """Get notifications for a user, newest first.
+    Pass the cursor of the oldest notification seen as `before` to load the next
+    page; with a cursor the page is an index range read whatever its depth."""
     query = select(Notification).filter(Notification.user_id == user_id)
-    if is_read is not None:
-        query = query.filter(Notification.is_read == is_read)
+    if is_read:
+        query = query.filter(Notification.is_read.is_(True))
+    elif is_read is not None:
+        # Same predicate as the partial index on unread notifications
+        query = query.filter(Notification.is_read.is_not(True))
+    if before:
+        created_at, notification_id = decode_cursor(before)
+        query = query.filter(
+            tuple_(Notification.created_at, Notification.id) < tuple_(created_at, notification_id))
+    else:
+        # Legacy offset paging is only kept for the first request without a cursor
+        query = query.offset(skip)
     result = await db.execute(
-        query.order_by(Notification.created_at.desc())
-        .offset(skip).limit(limit)
+        query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_notifications_after(
+    db: AsyncSession,
+    user_id: UUID,
+    after: Optional[str],
+    limit: int = 100
+) -> List[Notification]:
+    """Get a user's notifications created (or coalesced into) after a stream cursor, in stream order.
+    The stream is ordered by the transaction that wrote each row and only reads
+    rows of transactions below the horizon, which have all ended: a transaction
+    committing late can never land behind a cursor already handed out, as it
+    could with (created_at, id) or a sequence drawn before commit. A long running
+    transaction delays the stream, it never makes it skip rows.
+    Without a cursor, returns the latest notification only, as the starting point of a stream."""
+    query = select(Notification).filter(Notification.user_id == user_id, Notification.stream_xid < STREAM_HORIZON)
+    if after is None:
+        result = await db.execute(
+            query.order_by(Notification.stream_xid.desc(), Notification.id.desc()).limit(1))
+        return result.scalars().all()
+    stream_xid, notification_id = decode_position_cursor(after)
+    result = await db.execute(
+        query.filter(tuple_(Notification.stream_xid, Notification.id) > tuple_(stream_xid, notification_id))
+        .order_by(Notification.stream_xid, Notification.id)
+        .limit(limit)
     )
     return result.scalars().all()
 
@@ -63,11 +236,35 @@ async def mark_notification_as_read(db: AsyncSession, notification_id: UUID) ->
         )
     notification = result.scalar_one_or_none()
     if notification:
+        if not notification.is_read:
+            await adjust_notification_counter(db, notification.user_id, -1)
         notification.is_read = True
         await db.commit()
         await db.refresh(notification)
     return notification
 
+async def mark_all_notifications_as_read(
+    db: AsyncSession,
+    user_id: UUID,
+    type: Optional[NotificationType] = None
+) -> int:
+    """Mark all of a user's notifications, or all of a given type, as read.
+    Runs as one UPDATE ... RETURNING wrapped in a count without loading any
+    notification. Returns the number of notifications that became read."""
+    query = update(Notification).filter(
+        Notification.user_id == user_id,
+        Notification.is_read.is_not(True)
+    )
+    if type is not None:
+        query = query.filter(Notification.type == type)
+    updated = query.values(is_read=True).returning(Notification.id).cte("updated")
+    result = await db.execute(select(func.count()).select_from(updated))
+    count = result.scalar_one()
+    if count:
+        await adjust_notification_counter(db, user_id, -count)
+    await db.commit()
+    return count
+
 async def delete_notification(db: AsyncSession, notification_id: UUID) -> Optional[Notification]:
     """Delete a notification."""
     result = await db.execute(
@@ -75,6 +272,8 @@ async def delete_notification(db: AsyncSession, notification_id: UUID) -> Option
         )
     notification = result.scalar_one_or_none()
     if notification:
+        if not notification.is_read:
+            await adjust_notification_counter(db, notification.user_id, -1)
         await db.delete(notification)
         await db.commit()
     return notification
@@ -89,7 +288,6 @@ async def delete_notification(db: AsyncSession, notification_id: UUID) -> Option
 # The code is also designed to handle potential errors gracefully, ensuring that the application can respond appropriately to various scenarios, such as missing notifications or database issues.
 # Overall, this code provides a solid foundation for managing notifications in a web application, with a focus on performance and usability.
 # To-do:
-# - Add marking all notifications as read at once for a user
 # - Add more detailed error handling and logging.
 # - Implement unit tests for each CRUD operation.
 # - Consider adding more filtering options for notifications (e.g., by type).
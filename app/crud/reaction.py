@@ -0,0 +1,87 @@
+"""CRUD operations for message reactions.
+Every change to the per-user reaction rows updates the message's materialized
+emoji -> count map in the same transaction, and only when the reaction row
+actually changed, so repeated or concurrent requests cannot skew the counts."""
+
+from app.models.reaction import MessageReaction, MessageReactionSummary
+from sqlalchemy import Integer, case, cast, delete, func, update
+from sqlalchemy.dialects.postgresql import array, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql import Select
+from typing import Dict, Iterable, Union
+from uuid import UUID
+
+
+def _bump(emoji: str, delta: int):
+    """The counts map with the emoji's count moved by delta, dropping it at zero."""
+    current = func.coalesce(cast(MessageReactionSummary.counts.op("->>")(emoji), Integer), 0)
+    return case(
+        (current + delta <= 0, MessageReactionSummary.counts.op("-")(emoji)),
+        else_=func.jsonb_set(MessageReactionSummary.counts, array([emoji]), func.to_jsonb(current + delta)),
+    )
+
+async def add_reaction(db: AsyncSession, message_id: UUID, user_id: UUID, emoji: str) -> bool:
+    """Add a user's reaction to a message.
+    Returns False if the user had already reacted with this emoji."""
+    result = await db.execute(
+        insert(MessageReaction)
+        .values(message_id=message_id, user_id=user_id, emoji=emoji)
+        .on_conflict_do_nothing()
+        .returning(MessageReaction.message_id)
+    )
+    if result.scalar_one_or_none() is None:
+        return False
+    await db.execute(
+        insert(MessageReactionSummary)
+        .values(message_id=message_id, counts={emoji: 1})
+        .on_conflict_do_update(
+            index_elements=[MessageReactionSummary.message_id],
+            set_={"counts": _bump(emoji, 1), "updated_at": func.now()},
+        )
+    )
+    await db.commit()
+    return True
+
+async def remove_reaction(db: AsyncSession, message_id: UUID, user_id: UUID, emoji: str) -> bool:
+    """Remove a user's reaction from a message.
+    Returns False if the user had not reacted with this emoji."""
+    result = await db.execute(
+        delete(MessageReaction)
+        .filter(
+            MessageReaction.message_id == message_id,
+            MessageReaction.user_id == user_id,
+            MessageReaction.emoji == emoji,
+        )
+        .returning(MessageReaction.message_id)
+    )
+    if result.scalar_one_or_none() is None:
+        return False
+    await db.execute(
+        update(MessageReactionSummary)
+        .filter(MessageReactionSummary.message_id == message_id)
+        .values(counts=_bump(emoji, -1), updated_at=func.now())
+    )
+    await db.commit()
+    return True
+
+async def delete_message_reactions(db: AsyncSession, message_ids: Union[Iterable[UUID], Select]) -> None:
+    """Delete the reactions of deleted messages, given as ids or a select of ids. Does not commit."""
+    if not isinstance(message_ids, Select):
+        message_ids = list(message_ids)
+    await db.execute(delete(MessageReaction).filter(MessageReaction.message_id.in_(message_ids)))
+    await db.execute(delete(MessageReactionSummary).filter(MessageReactionSummary.message_id.in_(message_ids)))
+
+async def get_reaction_summaries(db: AsyncSession, message_ids: Iterable[UUID]) -> Dict[UUID, Dict[str, int]]:
+    """Get the emoji -> count maps of a page of messages in one query.
+    Messages without reactions map to an empty dict."""
+    summaries: Dict[UUID, Dict[str, int]] = {message_id: {} for message_id in message_ids}
+    if not summaries:
+        return summaries
+    result = await db.execute(
+        select(MessageReactionSummary.message_id, MessageReactionSummary.counts)
+        .filter(MessageReactionSummary.message_id.in_(summaries))
+    )
+    for message_id, counts in result.all():
+        summaries[message_id] = counts
+    return summaries
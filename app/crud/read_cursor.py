@@ -0,0 +1,126 @@
+"""CRUD operations for the read cursor model."""
+
+from app.models.group import GroupMember
+from app.models.messages import Message, get_conversation_id
+from app.models.read_cursor import ReadCursor
+from app.models.unread_counter import CounterScope, UnreadCounter
+from datetime import datetime
+from sqlalchemy import and_, exists, func, literal, tuple_, update
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Optional
+from uuid import UUID, uuid4
+
+
+def _chat_scope(user_id: UUID, group_id: Optional[UUID], other_user_id: Optional[UUID]):
+    """Resolve the cursor key column, its value and the matching unique constraint."""
+    if bool(group_id) == bool(other_user_id):
+        raise ValueError("Exactly one of group_id or other_user_id must be provided.")
+    if group_id:
+        return ReadCursor.group_id, group_id, "uq_read_cursors_user_id_group_id"
+    return ReadCursor.conversation_id, get_conversation_id(user_id, other_user_id), "uq_read_cursors_user_id_conversation_id"
+
+def _unread_count_query(user_id: UUID, key_column, key_value: UUID, cursor: Optional[ReadCursor]):
+    """Build the count of messages above a user's watermark in a conversation or group.
+    The watermark is bound as constants, so with a cursor the count is a range
+    scan of the (group_id | conversation_id, created_at, id) index starting at
+    it, and without one a scan of the whole chat. Messages sent by the user are
+    not counted."""
+    message_key = getattr(Message, key_column.key)
+    query = select(func.count(Message.id)).filter(message_key == key_value, Message.sender_id != user_id)
+    if cursor is not None:
+        # The plain created_at bound also prunes the monthly partitions below the watermark
+        query = query.filter(
+            Message.created_at >= cursor.last_read_at,
+            tuple_(Message.created_at, Message.id) > tuple_(cursor.last_read_at, cursor.last_read_message_id),
+        )
+    return query
+
+async def advance_read_cursor(
+        db: AsyncSession,
+        user_id: UUID,
+        message_id: Optional[UUID] = None,
+        group_id: Optional[UUID] = None,
+        other_user_id: Optional[UUID] = None,
+        up_to: Optional[datetime] = None
+        ) -> Optional[ReadCursor]:
+    """Move a user's read watermark in a conversation or group up to a message,
+    or up to the latest message created at or before `up_to`.
+    This is a single INSERT ... SELECT ... ON CONFLICT DO UPDATE: the message is
+    looked up, checked to belong to the chat (and, for groups, that the user is a
+    member) and the cursor upserted in one statement. The watermark only moves
+    forward. Returns None if the message is not in the chat or the cursor is
+    already past it."""
+    if bool(message_id) == bool(up_to):
+        raise ValueError("Exactly one of message_id or up_to must be provided.")
+    key_column, key_value, constraint = _chat_scope(user_id, group_id, other_user_id)
+    message_scope = getattr(Message, key_column.key) == key_value
+    source = select(
+        literal(uuid4(), PG_UUID(as_uuid=True)),
+        literal(user_id, PG_UUID(as_uuid=True)),
+        literal(key_value, PG_UUID(as_uuid=True)),
+        Message.id,
+        Message.created_at,
+    ).filter(message_scope)
+    if message_id:
+        source = source.filter(Message.id == message_id)
+    else:
+        source = source.filter(Message.created_at <= up_to).order_by(
+            Message.created_at.desc(), Message.id.desc()).limit(1)
+    if group_id:
+        source = source.filter(
+            exists().where(and_(GroupMember.group_id == group_id, GroupMember.user_id == user_id))
+        )
+
+    stmt = insert(ReadCursor).from_select(
+        ["id", "user_id", key_column.key, "last_read_message_id", "last_read_at"], source
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint=constraint,
+        set_={
+            "last_read_message_id": stmt.excluded.last_read_message_id,
+            "last_read_at": stmt.excluded.last_read_at,
+            "updated_at": func.now(),
+        },
+        # Messages created in the same instant are ordered by id, like everywhere else
+        where=tuple_(ReadCursor.last_read_at, ReadCursor.last_read_message_id)
+        < tuple_(stmt.excluded.last_read_at, stmt.excluded.last_read_message_id),
+    ).returning(ReadCursor)
+    result = await db.execute(stmt)
+    cursor = result.scalar_one_or_none()
+    if cursor is not None:
+        # Resync the materialized badge counter with what is left above the new watermark
+        scope, scope_id = (CounterScope.GROUP, group_id) if group_id else (CounterScope.CONVERSATION, other_user_id)
+        await db.execute(
+            update(UnreadCounter)
+            .filter(UnreadCounter.user_id == user_id, UnreadCounter.scope == scope, UnreadCounter.scope_id == scope_id)
+            .values(unread_count=_unread_count_query(user_id, key_column, key_value, cursor).scalar_subquery())
+        )
+    await db.commit()
+    return cursor
+
+async def get_read_cursor(
+        db: AsyncSession,
+        user_id: UUID,
+        group_id: Optional[UUID] = None,
+        other_user_id: Optional[UUID] = None
+        ) -> Optional[ReadCursor]:
+    """Get a user's read cursor for a conversation or group."""
+    key_column, key_value, _ = _chat_scope(user_id, group_id, other_user_id)
+    result = await db.execute(
+        select(ReadCursor).filter(ReadCursor.user_id == user_id, key_column == key_value)
+    )
+    return result.scalar_one_or_none()
+
+async def get_unread_count(
+        db: AsyncSession,
+        user_id: UUID,
+        group_id: Optional[UUID] = None,
+        other_user_id: Optional[UUID] = None
+        ) -> int:
+    """Count the messages above a user's read watermark in a conversation or group."""
+    key_column, key_value, _ = _chat_scope(user_id, group_id, other_user_id)
+    cursor = await get_read_cursor(db, user_id, group_id=group_id, other_user_id=other_user_id)
+    result = await db.execute(_unread_count_query(user_id, key_column, key_value, cursor))
+    return result.scalar_one()
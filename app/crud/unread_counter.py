@@ -0,0 +1,116 @@
+"""CRUD operations for the unread counter model.
+The increment and decrement helpers never commit, they run inside the
+transaction of the write they account for."""
+
+from app.models.group import GroupMember
+from app.models.messages import Message
+from app.models.unread_counter import CounterScope, UnreadCounter
+from collections import Counter
+from sqlalchemy import Integer, column, func, literal, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Any, Dict, Iterable
+from uuid import UUID
+
+
+def _upsert_increment(stmt):
+    """Turn an insert into counters into an increment of the existing rows."""
+    return stmt.on_conflict_do_update(
+        index_elements=[UnreadCounter.user_id, UnreadCounter.scope, UnreadCounter.scope_id],
+        set_={
+            "unread_count": UnreadCounter.unread_count + stmt.excluded.unread_count,
+            "updated_at": func.now(),
+        },
+    )
+
+async def increment_message_counters(db: AsyncSession, messages: Iterable[Message]) -> None:
+    """Count new messages against their recipients' counters.
+    Direct messages are aggregated into one multi-row upsert, each group gets
+    one INSERT ... SELECT over its members (the sender excluded)."""
+    direct = Counter()
+    groups = Counter()
+    for message in messages:
+        if message.receiver_id:
+            direct[(message.receiver_id, message.sender_id)] += 1
+        else:
+            groups[(message.group_id, message.sender_id)] += 1
+
+    if direct:
+        await db.execute(_upsert_increment(insert(UnreadCounter).values([
+            {"user_id": receiver_id, "scope": CounterScope.CONVERSATION, "scope_id": sender_id, "unread_count": count}
+            for (receiver_id, sender_id), count in direct.items()
+        ])))
+    for (group_id, sender_id), count in groups.items():
+        members = select(
+            GroupMember.user_id,
+            literal(CounterScope.GROUP, UnreadCounter.scope.type),
+            literal(group_id, PG_UUID(as_uuid=True)),
+            literal(count),
+        ).filter(GroupMember.group_id == group_id, GroupMember.user_id != sender_id)
+        await db.execute(_upsert_increment(
+            insert(UnreadCounter).from_select(["user_id", "scope", "scope_id", "unread_count"], members)
+        ))
+
+async def adjust_counter(db: AsyncSession, user_id: UUID, scope: CounterScope, scope_id: UUID, delta: int) -> None:
+    """Add delta (possibly negative) to a single counter, never going below zero."""
+    if delta >= 0:
+        await db.execute(_upsert_increment(insert(UnreadCounter).values(
+            user_id=user_id, scope=scope, scope_id=scope_id, unread_count=delta
+        )))
+        return
+    await db.execute(
+        update(UnreadCounter)
+        .filter(UnreadCounter.user_id == user_id, UnreadCounter.scope == scope, UnreadCounter.scope_id == scope_id)
+        .values(unread_count=func.greatest(UnreadCounter.unread_count + delta, 0))
+    )
+
+async def adjust_notification_counter(db: AsyncSession, user_id: UUID, delta: int) -> None:
+    """Add delta to a user's unread notification counter."""
+    await adjust_counter(db, user_id, CounterScope.NOTIFICATIONS, user_id, delta)
+
+async def increment_notification_counters(db: AsyncSession, user_ids: Iterable[UUID]) -> None:
+    """Count one new notification for each of the users, in one upsert."""
+    counts = Counter(user_ids)
+    if not counts:
+        return
+    await db.execute(_upsert_increment(insert(UnreadCounter).values([
+        {"user_id": user_id, "scope": CounterScope.NOTIFICATIONS, "scope_id": user_id, "unread_count": count}
+        for user_id, count in counts.items()
+    ])))
+
+async def decrement_notification_counters(db: AsyncSession, counts: Dict[UUID, int]) -> None:
+    """Subtract the given number of notifications from each user's counter, in one update."""
+    if not counts:
+        return
+    deltas = values(
+        column("user_id", PG_UUID(as_uuid=True)), column("delta", Integer), name="deltas"
+    ).data(list(counts.items()))
+    await db.execute(
+        update(UnreadCounter)
+        .filter(
+            UnreadCounter.user_id == deltas.c.user_id,
+            UnreadCounter.scope == CounterScope.NOTIFICATIONS,
+            UnreadCounter.scope_id == deltas.c.user_id,
+        )
+        .values(unread_count=func.greatest(UnreadCounter.unread_count - deltas.c.delta, 0))
+    )
+
+async def get_badge_counts(db: AsyncSession, user_id: UUID) -> Dict[str, Any]:
+    """Get all non-zero unread counters of a user.
+    This only reads the user's counter rows, its cost depends on the number of
+    conversations and groups, not on the number of messages."""
+    result = await db.execute(
+        select(UnreadCounter.scope, UnreadCounter.scope_id, UnreadCounter.unread_count)
+        .filter(UnreadCounter.user_id == user_id, UnreadCounter.unread_count > 0)
+    )
+    badges: Dict[str, Any] = {"notifications": 0, "conversations": {}, "groups": {}}
+    for scope, scope_id, unread_count in result.all():
+        if scope == CounterScope.NOTIFICATIONS:
+            badges["notifications"] = unread_count
+        elif scope == CounterScope.CONVERSATION:
+            badges["conversations"][scope_id] = unread_count
+        else:
+            badges["groups"][scope_id] = unread_count
+    badges["total"] = badges["notifications"] + sum(badges["conversations"].values()) + sum(badges["groups"].values())
+    return badges
@@ -1,11 +1,16 @@
 """CRUD operations for user model."""
 
-from app.core.security import get_password_hash, verify_password
+from app.core.autocomplete import autocomplete_backend
+from app.core.cache import principal_cache, user_cache
+from app.core.security import password_hasher
 from app.models.user import User
-from app.schemas.user import UserCreate, UserUpdate
+from app.schemas.user import User as UserProfile, UserCreate, UserUpdate
+from datetime import datetime
+from sqlalchemy import DateTime, column, or_, update, values
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, List, Optional, Union
 from uuid import UUID
 
 
@@ -16,11 +21,12 @@ async def create_user(db: AsyncSession, user: UserCreate) -> User:
         username=user.username,
         first_name=user.first_name,
         last_name=user.last_name,
-        hashed_password=get_password_hash(user.password),
+        hashed_password=await password_hasher.hash(user.password),
     )
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    await autocomplete_backend.index_users([user])
     return user
 
 async def get_user_by_id(db: AsyncSession, user_id: UUID) -> Optional[User]:
@@ -38,6 +44,35 @@ async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User
     result = await db.execute(select(User).filter(User.username == username))
     return result.scalar_one_or_none()
 
+def _cache_profile(user: User) -> UserProfile:
+    """Cache the served profile of a user."""
+    profile = UserProfile.model_validate(user, from_attributes=True)
+    user_cache.set(user.id, profile)
+    return profile
+
+def _invalidate_profile(user_id: UUID) -> None:
+    """Drop a user's cached profile and the cached principal."""
+    user_cache.invalidate(user_id)
+    principal_cache.invalidate(user_id)
+
+async def get_users_by_ids(db: AsyncSession, user_ids: Iterable[UUID]) -> Dict[UUID, UserProfile]:
+    """Get the profiles of many users, e.g. the senders of a message page.
+    Cached profiles are served from the user cache, the misses are loaded with a
+    single IN query. Unknown ids are left out."""
+    profiles: Dict[UUID, UserProfile] = {}
+    missing = []
+    for user_id in dict.fromkeys(user_ids):
+        profile = user_cache.get(user_id)
+        if profile is None:
+            missing.append(user_id)
+        else:
+            profiles[user_id] = profile
+    if missing:
+        result = await db.execute(select(User).filter(User.id.in_(missing)))
+        for user in result.scalars().all():
+            profiles[user.id] = _cache_profile(user)
+    return profiles
+
 async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[User]:
     """Get all users with pagination."""
     result = await db.execute(select(User).offset(skip).limit(limit))
@@ -55,7 +90,7 @@ async def update_user(db: AsyncSession, user_id: UUID, user_in: Union[UserUpdate
     
     # Handle password update separately
     if "password" in user_in:
-        user_in["hashed_password"] = get_password_hash(user_in["password"])
+        user_in["hashed_password"] = await password_hasher.hash(user_in["password"])
         del user_in["password"]
 
     # Update user fields
@@ -63,9 +98,41 @@ async def update_user(db: AsyncSession, user_id: UUID, user_in: Union[UserUpdate
         setattr(user, key, value)
     
     await db.commit()
+    # Also drops deactivated users from the caches, they must fail authentication at once
+    _invalidate_profile(user_id)
     await db.refresh(user)
+    await autocomplete_backend.index_users([user])
     return user
 
+async def update_last_seen(db: AsyncSession, last_seen: Dict[UUID, datetime]) -> int:
+    """Store the last-seen times of many users with one UPDATE ... FROM (VALUES ...).
+    Times older than the stored ones are ignored. Returns the number of updated users."""
+    if not last_seen:
+        return 0
+    seen = values(
+        column("user_id", PG_UUID(as_uuid=True)), column("seen_at", DateTime(timezone=True)), name="seen"
+    ).data(list(last_seen.items()))
+    result = await db.execute(
+        update(User)
+        .filter(
+            User.id == seen.c.user_id,
+            or_(User.last_seen_at.is_(None), User.last_seen_at < seen.c.seen_at),
+        )
+        # Presence is not a profile change, keep updated_at as it is
+        .values(last_seen_at=seen.c.seen_at, updated_at=User.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
+
+async def get_last_seen(db: AsyncSession, user_ids: Iterable[UUID]) -> Dict[UUID, Optional[datetime]]:
+    """Get the stored last-seen times of many users in one query."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    result = await db.execute(select(User.id, User.last_seen_at).filter(User.id.in_(user_ids)))
+    return dict(result.all())
+
 async def delete_user(db: AsyncSession, user_id: UUID) -> Optional[User]:
     """Delete a user."""
     user = await get_user_by_id(db, user_id)
@@ -73,13 +140,23 @@ async def delete_user(db: AsyncSession, user_id: UUID) -> Optional[User]:
         return None
     await db.delete(user)
     await db.commit()
+    _invalidate_profile(user_id)
+    await autocomplete_backend.remove_users([user_id])
     return user
 
 async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
-    """Authenticate a user by email and password."""
+    """Authenticate a user by email and password.
+    A password hashed with another bcrypt cost than the configured one is
+    rehashed and stored on a successful login."""
     user = await get_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not verified:
         return None
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        principal_cache.invalidate(user.id)
+        await db.refresh(user)
     return user
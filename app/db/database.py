@@ -13,8 +13,11 @@ Base = declarative_base()
 # Import modules for Alembic to detect
 from app.models.friendship import Friendship
 from app.models.group import Group, GroupMember
-from app.models.messages import Message
+from app.models.messages import Attachment, Blob, Message
 from app.models.notification import Notification
+from app.models.reaction import MessageReaction, MessageReactionSummary
+from app.models.read_cursor import ReadCursor
+from app.models.unread_counter import UnreadCounter
 from app.models.user import User
 
 
@@ -0,0 +1,269 @@
+"""Bulk import of user accounts.
+
+Creating accounts one by one through create_user costs a bcrypt hash, a commit
+and a refresh per user, which takes hours for a large customer. This command
+streams a CSV (header row) or NDJSON file with the UserCreate fields (email,
+username, first_name, last_name, password) and loads it in batches:
+
+1. Every row is validated, and rejected when its email or username was already
+   seen in the file or already exists in the database, before any hashing.
+2. The passwords of a batch are hashed across a process pool.
+3. The batch is COPYed into a temporary table and moved into users with
+   INSERT ... ON CONFLICT DO NOTHING, so accounts created concurrently by
+   sign-ups are reported instead of failing the whole batch.
+
+Every batch is committed on its own, a failed import can be resumed by running
+it again: already imported rows are reported as existing. Rejected rows are
+written to the error report (CSV: line, email, username, error). Workers using
+the in-memory autocomplete backend see the imported users after a restart.
+
+Usage:
+    python -m app.db.import_users users.csv [--report errors.csv] [--batch-size 2000] [--processes 8]
+    python -m app.db.import_users users.ndjson --format ndjson
+"""
+
+from app.core.config import settings
+from app.core.security import get_password_hash
+from app.db.database import engine
+from app.models.user import User
+from app.schemas.user import UserCreate
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pydantic import ValidationError
+from sqlalchemy import or_, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.future import select
+from typing import Any, Dict, Iterator, List, Optional, Set, TextIO, Tuple
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+import uuid
+
+STAGING_TABLE = "user_import"
+COPIED_COLUMNS = ["id", "email", "username", "first_name", "last_name", "hashed_password"]
+
+
+@dataclass
+class ImportRow:
+    """A valid row waiting to be loaded."""
+    line: int
+    user: UserCreate
+
+
+@dataclass
+class RejectedRow:
+    """A rejected row of the error report."""
+    line: int
+    email: Optional[str]
+    username: Optional[str]
+    error: str
+
+
+def read_rows(source: TextIO, file_format: str) -> Iterator[Tuple[int, Any]]:
+    """Streams the records of the input file with their line numbers.
+    Args:
+        source (TextIO): The open input file.
+        file_format (str): "csv" (with a header row) or "ndjson" (one JSON object per line).
+    Returns:
+        Iterator[Tuple[int, Any]]: The line number and the parsed record (or the
+        ValueError raised parsing it)."""
+    if file_format == "csv":
+        reader = csv.DictReader(source)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line, raw in enumerate(source, start=1):
+        if not raw.strip():
+            continue
+        try:
+            yield line, json.loads(raw)
+        except ValueError as exc:
+            yield line, ValueError(f"Invalid JSON: {exc}")
+
+def _validate(record: Any) -> UserCreate:
+    """Validates a record against UserCreate, raising ValueError with a readable reason."""
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Expected an object.")
+    try:
+        user = UserCreate(**record)
+    except ValidationError as exc:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+        )) from exc
+    if not user.password:
+        raise ValueError("password: Field required")
+    return user
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    """Hashes a chunk of passwords, runs in a worker process."""
+    return [get_password_hash(password) for password in passwords]
+
+async def _existing_keys(conn: AsyncConnection, rows: List[ImportRow]) -> Tuple[Set[str], Set[str]]:
+    """Returns the emails and usernames of the batch that are already taken."""
+    emails = [row.user.email for row in rows]
+    usernames = [row.user.username for row in rows]
+    result = await conn.execute(
+        select(User.email, User.username).filter(or_(User.email.in_(emails), User.username.in_(usernames)))
+    )
+    taken = result.all()
+    return {email for email, _ in taken}, {username for _, username in taken}
+
+class UserImporter:
+    """Loads validated rows batch by batch and collects the rejected ones.
+    Duplicates inside the file are found with the emails and usernames seen so
+    far (two sets, a few MB for 100k users); duplicates of existing accounts
+    with one query per batch."""
+
+    def __init__(self, pool: ProcessPoolExecutor, processes: int, batch_size: int) -> None:
+        self.pool = pool
+        self.processes = processes
+        self.batch_size = batch_size
+        self.imported = 0
+        self.errors: List[RejectedRow] = []
+        self._emails: Dict[str, int] = {}
+        self._usernames: Dict[str, int] = {}
+        self._batch: List[ImportRow] = []
+
+    def _reject(self, line: int, record: Any, error: str) -> None:
+        record = record if isinstance(record, dict) else {}
+        self.errors.append(RejectedRow(line, record.get("email"), record.get("username"), error))
+
+    async def add(self, line: int, record: Any) -> None:
+        """Validates a record and queues it, loading the batch once full."""
+        try:
+            user = _validate(record)
+        except ValueError as exc:
+            self._reject(line, record, str(exc))
+            return
+        if user.email in self._emails:
+            self._reject(line, record, f"Duplicate email, first seen on line {self._emails[user.email]}.")
+            return
+        if user.username in self._usernames:
+            self._reject(line, record, f"Duplicate username, first seen on line {self._usernames[user.username]}.")
+            return
+        self._emails[user.email] = line
+        self._usernames[user.username] = line
+        self._batch.append(ImportRow(line, user))
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def _hash(self, rows: List[ImportRow]) -> List[str]:
+        """Hashes the passwords of the rows in the process pool, one chunk per process."""
+        passwords = [row.user.password for row in rows]
+        size = -(-len(passwords) // self.processes)
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(self.pool, _hash_passwords, passwords[start:start + size])
+            for start in range(0, len(passwords), size)
+        ))
+        return [hashed for chunk in chunks for hashed in chunk]
+
+    async def flush(self) -> None:
+        """Loads the queued rows in one transaction."""
+        rows, self._batch = self._batch, []
+        if not rows:
+            return
+        async with engine.connect() as conn:
+            emails, usernames = await _existing_keys(conn, rows)
+        pending = []
+        for row in rows:
+            if row.user.email in emails:
+                self.errors.append(RejectedRow(row.line, row.user.email, row.user.username, "Email already registered."))
+            elif row.user.username in usernames:
+                self.errors.append(RejectedRow(row.line, row.user.email, row.user.username, "Username already taken."))
+            else:
+                pending.append(row)
+        if not pending:
+            return
+
+        # Hashing takes most of the time, it happens outside of the load transaction
+        records = [
+            (uuid.uuid4(), row.user.email, row.user.username, row.user.first_name, row.user.last_name, hashed)
+            for row, hashed in zip(pending, await self._hash(pending))
+        ]
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                f"CREATE TEMPORARY TABLE {STAGING_TABLE} (id UUID, email VARCHAR, username VARCHAR, "
+                "first_name VARCHAR, last_name VARCHAR, hashed_password VARCHAR) ON COMMIT DROP"
+            ))
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(STAGING_TABLE, records=records, columns=COPIED_COLUMNS)
+            result = await conn.execute(text(
+                f"INSERT INTO users ({', '.join(COPIED_COLUMNS)}, is_active, is_online) "
+                f"SELECT {', '.join(COPIED_COLUMNS)}, true, false FROM {STAGING_TABLE} "
+                "ON CONFLICT DO NOTHING RETURNING id"
+            ))
+            inserted = {row_id for (row_id,) in result.all()}
+        self.imported += len(inserted)
+        for row, record in zip(pending, records):
+            if record[0] not in inserted:
+                # Taken between the check and the insert
+                self.errors.append(RejectedRow(
+                    row.line, row.user.email, row.user.username, "Email or username already registered."))
+
+def write_report(errors: List[RejectedRow], target: TextIO) -> None:
+    """Writes the rejected rows as CSV, in file order."""
+    writer = csv.writer(target)
+    writer.writerow(["line", "email", "username", "error"])
+    for error in sorted(errors, key=lambda error: error.line):
+        writer.writerow([error.line, error.email, error.username, error.error])
+
+async def import_users(
+        source: TextIO,
+        file_format: str,
+        batch_size: int = settings.USER_IMPORT_BATCH_SIZE,
+        processes: Optional[int] = settings.USER_IMPORT_HASH_PROCESSES) -> UserImporter:
+    """Imports the users of a CSV or NDJSON stream.
+    Args:
+        source (TextIO): The open input file.
+        file_format (str): "csv" or "ndjson".
+        batch_size (int): The number of rows hashed and loaded per transaction.
+        processes (Optional[int]): The number of hashing processes (default: CPU count).
+    Returns:
+        UserImporter: The importer, with the imported count and the rejected rows."""
+    processes = processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        importer = UserImporter(pool, processes, batch_size)
+        for line, record in read_rows(source, file_format):
+            await importer.add(line, record)
+        await importer.flush()
+    return importer
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    """Runs the bulk user import command."""
+    parser = argparse.ArgumentParser(description="Bulk import user accounts from CSV or NDJSON.")
+    parser.add_argument("path", help="The input file, - for stdin.")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension.")
+    parser.add_argument("--report", help="Where to write the rejected rows (CSV), defaults to stderr.")
+    parser.add_argument("--batch-size", type=int, default=settings.USER_IMPORT_BATCH_SIZE)
+    parser.add_argument("--processes", type=int, default=settings.USER_IMPORT_HASH_PROCESSES)
+    args = parser.parse_args(argv)
+    file_format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    started = time.perf_counter()
+    source = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+    try:
+        importer = await import_users(source, file_format, args.batch_size, args.processes)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        await engine.dispose()
+
+    if args.report:
+        with open(args.report, "w", newline="", encoding="utf-8") as report:
+            write_report(importer.errors, report)
+    elif importer.errors:
+        write_report(importer.errors, sys.stderr)
+    print(
+        f"Imported {importer.imported} users, rejected {len(importer.errors)} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,207 @@
+"""Maintenance of the monthly partitions of the messages table.
+
+The messages table is range partitioned by created_at, one partition per month
+(messages_y2026m10 holds October 2026). Future months are created ahead of time
+by a background task of the app (every MESSAGE_PARTITION_CHECK_INTERVAL_SECONDS)
+and by this command. Rows without a monthly partition land in the DEFAULT
+partition (messages_default) instead of failing, and are moved into their
+month's partition when it is created. Old partitions can be detached and either
+moved to the archive schema or dropped.
+
+Usage:
+    python -m app.db.partitions create [--months-ahead 3]
+    python -m app.db.partitions archive [--older-than 12] [--drop]
+"""
+
+from app.core.config import settings
+from app.crud.message import delete_message_dependents
+from app.db.database import engine
+from datetime import date, datetime, timezone
+from sqlalchemy import column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from typing import List, Optional, Tuple
+import argparse
+import asyncio
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "messages"
+DEFAULT_PARTITION = f"{PARTITIONED_TABLE}_default"
+ARCHIVE_SCHEMA = "archive"
+
+_PARTITION_RE = re.compile(rf"^{PARTITIONED_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """Returns the first day of the month `months` after the given month."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def current_month() -> date:
+    """Returns the first day of the current UTC month."""
+    today = datetime.now(timezone.utc).date()
+    return today.replace(day=1)
+
+def partition_name(month: date) -> str:
+    """Returns the name of the partition holding the given month."""
+    return f"{PARTITIONED_TABLE}_y{month.year}m{month.month:02d}"
+
+async def create_message_partitions(
+        conn: AsyncConnection,
+        months_ahead: int = settings.MESSAGE_PARTITION_MONTHS_AHEAD,
+        start: Optional[date] = None) -> List[str]:
+    """Creates the partitions from the start month (default: current month) up to months_ahead later.
+    Also ensures the DEFAULT partition. A month whose rows already landed in the
+    DEFAULT partition is created as a plain table, filled with those rows and
+    then attached, since Postgres refuses to create a partition over rows of the
+    DEFAULT partition. Concurrent callers are serialized with an advisory lock.
+    Args:
+        conn (AsyncConnection): The database connection.
+        months_ahead (int): How many future months to prepare.
+        start (Optional[date]): The first month to create.
+    Returns:
+        List[str]: The names of the partitions that were ensured."""
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": PARTITIONED_TABLE})
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARTITIONED_TABLE} DEFAULT"))
+    existing = {name for name, _ in await list_message_partitions(conn)}
+    first = (start or current_month()).replace(day=1)
+    names = []
+    for offset in range(months_ahead + 1):
+        month = add_months(first, offset)
+        name = partition_name(month)
+        names.append(name)
+        if name in existing:
+            continue
+        bounds = f"FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+        window = {
+            "start": datetime(month.year, month.month, 1, tzinfo=timezone.utc),
+            "end": datetime(add_months(month, 1).year, add_months(month, 1).month, 1, tzinfo=timezone.utc),
+        }
+        strays = await conn.execute(text(
+            f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+        ), window)
+        if strays.first() is None:
+            await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {PARTITIONED_TABLE} FOR VALUES {bounds}"))
+            continue
+        await conn.execute(text(
+            f"CREATE TABLE {name} (LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        moved = await conn.execute(text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        ), window)
+        await conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+        logger.warning("Moved %d messages from %s into %s", moved.rowcount, DEFAULT_PARTITION, name)
+    return names
+
+async def list_message_partitions(conn: AsyncConnection) -> List[Tuple[str, date]]:
+    """Lists the attached monthly partitions, oldest first."""
+    result = await conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": PARTITIONED_TABLE})
+    partitions = []
+    for (name,) in result.all():
+        match = _PARTITION_RE.match(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+async def archive_message_partitions(
+        conn: AsyncConnection,
+        older_than_months: int = settings.MESSAGE_PARTITION_ARCHIVE_AFTER_MONTHS,
+        drop: bool = False) -> List[str]:
+    """Detaches the partitions whose whole month is older than the cutoff.
+    Detached partitions are moved to the archive schema (or dropped), they stay
+    queryable there but no longer cost anything to the hot table's planning,
+    indexes or vacuum. Attachments, reactions, notifications and replies keep
+    pointing at archived messages; dropped messages get them cleaned up like
+    delete_message does. The connection must be in autocommit mode because
+    DETACH PARTITION CONCURRENTLY cannot run inside a transaction.
+    Args:
+        conn (AsyncConnection): An autocommit database connection.
+        older_than_months (int): Keep this many months before the current one.
+        drop (bool): Drop the detached partitions instead of archiving them.
+    Returns:
+        List[str]: The names of the detached partitions."""
+    cutoff = add_months(current_month(), -older_than_months)
+    detached = []
+    if not drop:
+        await conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+    for name, month in await list_message_partitions(conn):
+        if add_months(month, 1) > cutoff:
+            break
+        await conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name} CONCURRENTLY"))
+        if drop:
+            await delete_message_dependents(conn, select(column("id")).select_from(table(name)))
+            await conn.execute(text(f"DROP TABLE {name}"))
+        else:
+            await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+        detached.append(name)
+    return detached
+
+class PartitionMaintainer:
+    """Runs create_message_partitions every MESSAGE_PARTITION_CHECK_INTERVAL_SECONDS,
+    so a long-running worker never outlives the months created at startup."""
+
+    def __init__(self, interval: int = settings.MESSAGE_PARTITION_CHECK_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> List[str]:
+        """Ensures the partitions of the current and coming months."""
+        async with engine.begin() as conn:
+            return await create_message_partitions(conn)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Could not create the upcoming message partitions")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+partition_maintainer = PartitionMaintainer()
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    """Runs the partition maintenance command."""
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of the messages table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Create the partitions of the coming months.")
+    create.add_argument("--months-ahead", type=int, default=settings.MESSAGE_PARTITION_MONTHS_AHEAD)
+    archive = commands.add_parser("archive", help="Detach and archive old partitions.")
+    archive.add_argument("--older-than", type=int, default=settings.MESSAGE_PARTITION_ARCHIVE_AFTER_MONTHS)
+    archive.add_argument("--drop", action="store_true", help="Drop detached partitions instead of archiving them.")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        async with engine.begin() as conn:
+            names = await create_message_partitions(conn, args.months_ahead)
+        print(f"Ensured partitions: {', '.join(names)}")
+    else:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            names = await archive_message_partitions(conn, args.older_than, args.drop)
+        print(f"Detached partitions: {', '.join(names) or 'none'}")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
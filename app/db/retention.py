@@ -0,0 +1,159 @@
+"""Retention of old notifications.
+
+Notifications expire after a per-type time to live, one for read and one for
+unread notifications (NOTIFICATION_READ_TTL_DAYS / NOTIFICATION_UNREAD_TTL_DAYS).
+Every type and read state is walked on its own, oldest first by (created_at, id)
+through the (type, created_at, id) index and only up to its own TTL, so a short
+TTL on one type never makes the purge read the recent rows of the others.
+Expired rows are deleted in small batches. Every batch runs in its own short
+transaction, and the purger pauses between batches. Locks are therefore held briefly and WAL is produced at
+a steady rate, so vacuum and replicas can keep up.
+
+The purger runs in the background of the app (see app/core/events.py) and can
+also be run by hand:
+    python -m app.db.retention
+"""
+
+from app.core.config import settings
+from app.crud.unread_counter import decrement_notification_counters
+from app.db.database import async_session_maker, engine
+from app.models.notification import Notification, NotificationType
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, delete, tuple_
+from sqlalchemy.future import select
+from sqlalchemy.orm import sessionmaker
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _expiry_rules(now: datetime) -> List[Tuple[NotificationType, Any]]:
+    """The conditions matching the notifications past their TTL, one per type and read state."""
+    rules = []
+    for notification_type in NotificationType:
+        read_ttl = settings.NOTIFICATION_READ_TTL_DAYS.get(notification_type.value)
+        unread_ttl = settings.NOTIFICATION_UNREAD_TTL_DAYS.get(notification_type.value)
+        if read_ttl is not None:
+            rules.append((notification_type, and_(
+                Notification.type == notification_type,
+                Notification.created_at < now - timedelta(days=read_ttl),
+                Notification.is_read.is_(True),
+            )))
+        if unread_ttl is not None:
+            rules.append((notification_type, and_(
+                Notification.type == notification_type,
+                Notification.created_at < now - timedelta(days=unread_ttl),
+                Notification.is_read.is_not(True),
+            )))
+    return rules
+
+async def _purge_rule(
+        session_maker: sessionmaker,
+        expired,
+        batch_size: int,
+        pause: float,
+        purged: Counter) -> None:
+    """Deletes the notifications matching one expiry rule, batch by batch."""
+    last_key = None
+    while True:
+        async with session_maker() as db:
+            window = select(Notification.created_at, Notification.id).filter(expired)
+            if last_key:
+                window = window.filter(tuple_(Notification.created_at, Notification.id) > tuple_(*last_key))
+            result = await db.execute(
+                window.order_by(Notification.created_at, Notification.id).limit(batch_size))
+            keys = result.all()
+            if not keys:
+                return
+            last_key = tuple(keys[-1])
+
+            # The rule is checked again, a notification read meanwhile falls under the read TTL
+            result = await db.execute(
+                delete(Notification)
+                .filter(Notification.id.in_([key.id for key in keys]), expired)
+                .returning(Notification.user_id, Notification.type, Notification.is_read)
+            )
+            unread: Counter = Counter()
+            for user_id, notification_type, is_read in result.all():
+                purged[notification_type.value] += 1
+                if not is_read:
+                    unread[user_id] += 1
+            await decrement_notification_counters(db, unread)
+            await db.commit()
+        if len(keys) < batch_size:
+            return
+        await asyncio.sleep(pause)
+
+async def purge_expired_notifications(
+        session_maker: sessionmaker = async_session_maker,
+        batch_size: int = settings.NOTIFICATION_PURGE_BATCH_SIZE,
+        pause: float = settings.NOTIFICATION_PURGE_BATCH_PAUSE_SECONDS) -> Dict[str, int]:
+    """Deletes the expired notifications in bounded batches.
+    For every type and read state, each batch reads the next batch_size oldest
+    expired rows after the previous batch, deletes them and adjusts the unread
+    counters of deleted unread notifications.
+    Args:
+        session_maker (sessionmaker): Opens one session per batch.
+        batch_size (int): The number of rows deleted per batch.
+        pause (float): Seconds to sleep between batches.
+    Returns:
+        Dict[str, int]: The number of purged notifications per type."""
+    purged: Counter = Counter()
+    for _, expired in _expiry_rules(datetime.now(timezone.utc)):
+        await _purge_rule(session_maker, expired, batch_size, pause, purged)
+    return dict(purged)
+
+
+class NotificationPurger:
+    """Runs purge_expired_notifications every NOTIFICATION_PURGE_INTERVAL_SECONDS."""
+
+    def __init__(self, interval: int = settings.NOTIFICATION_PURGE_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> Dict[str, int]:
+        """Runs one purge and logs how many rows it removed."""
+        started = asyncio.get_running_loop().time()
+        purged = await purge_expired_notifications()
+        logger.info(
+            "Purged %d expired notifications in %.1fs %s",
+            sum(purged.values()), asyncio.get_running_loop().time() - started, purged)
+        return purged
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Notification purge failed")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+notification_purger = NotificationPurger()
+
+async def main() -> None:
+    """Runs one purge from the command line."""
+    logging.basicConfig(level=logging.INFO)
+    purged = await notification_purger.run_once()
+    print(f"Purged notifications: {purged or 'none'}")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
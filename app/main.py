@@ -1,6 +1,6 @@
 """The main entry point of the application."""
 
-from app.api.routes import users, auth, friends, messages, groups, notifications
+from app.api.routes import users, auth, friends, media, messages, groups, notifications, presence, ws
 from app.core.config import settings
 from app.core.events import create_start_app_handler, create_stop_app_handler
 from app.db.init_db import init_db
@@ -39,6 +39,10 @@ def create_application() -> FastAPI:
     application.include_router(messages.router, prefix=f"{settings.API_V1_STR}/messages", tags=["Messages"])
     application.include_router(groups.router, prefix=f"{settings.API_V1_STR}/groups", tags=["Groups"])
     application.include_router(notifications.router, prefix=f"{settings.API_V1_STR}/notifications", tags=["Notifications"])
+    application.include_router(presence.router, prefix=f"{settings.API_V1_STR}/presence", tags=["Presence"])
+    application.include_router(ws.router, prefix=settings.API_V1_STR, tags=["Realtime"])
+    # Serves the attachment URLs built by the object store (STORAGE_PUBLIC_URL/<key>)
+    application.include_router(media.router, prefix=settings.STORAGE_PUBLIC_URL.rstrip("/"), tags=["Media"])
 
     return application
 
@@ -1,6 +1,6 @@
 """The friendship model."""
 from app.db.database import Base
-from sqlalchemy import Column, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -26,3 +26,11 @@ class Friendship(Base):
     # Relationships
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_friend_requests")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_friend_requests")
+
+    # Order-independent index on the user pair, serves get_friendship_between_users;
+    # one index per side for a user's friendships (index-only for the friend graph, app/core/friend_graph.py)
+    __table_args__ = (
+        Index("ix_friendships_user_pair", func.least(sender_id, receiver_id), func.greatest(sender_id, receiver_id)),
+        Index("ix_friendships_sender_id_status", sender_id, status, receiver_id),
+        Index("ix_friendships_receiver_id_status", receiver_id, status, sender_id),
+    )
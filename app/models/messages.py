@@ -1,27 +1,47 @@
 """The message model"""
 
 from app.db.database import Base
-from sqlalchemy import Boolean, CheckConstraint, Column, DateTime, ForeignKey, String, Text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import BigInteger, Boolean, CheckConstraint, Column, DateTime, ForeignKey, Index, String, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
+import hashlib
 import uuid
 
+
+def get_conversation_id(user_id: uuid.UUID, other_user_id: uuid.UUID) -> uuid.UUID:
+    """Derive the canonical conversation key for a direct message thread.
+    The key is the md5 of the ordered (min, max) participant pair, so both
+    directions of a conversation share it. It matches the SQL expression
+    md5(least(a, b)::text || ':' || greatest(a, b)::text)::uuid used to backfill."""
+    low, high = sorted((user_id, other_user_id))
+    return uuid.UUID(hashlib.md5(f"{low}:{high}".encode()).hexdigest())
+
 class Message(Base):
     """The message model defines the structure of the 'messages' table, 
-    which stores user messages for a messaging app."""
+    which stores user messages for a messaging app.
+    The table is range partitioned by created_at into monthly partitions (see
+    app/db/partitions.py). Postgres requires the partition key in the primary
+    key, so the table key is (id, created_at) while the ORM still identifies
+    messages by id alone. Foreign keys cannot point at messages.id any more,
+    the referencing columns use explicit join conditions instead."""
     __tablename__ = "messages"
 
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
     sender_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     receiver_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=True)
     group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete="CASCADE"), nullable=True)
+    # Derived from the participant pair for direct messages, see get_conversation_id
+    conversation_id = Column(UUID(as_uuid=True), nullable=True)
     content = Column(Text, nullable=False)
+    # to_tsvector('simple', content), set on insert and edit by the messages_search_vector_update
+    # trigger (see app/core/search.py); deferred so history reads skip it
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     attachment_id = Column(UUID(as_uuid=True), ForeignKey("attachments.id", ondelete="SET NULL"), nullable=True)
     is_read = Column(Boolean, default=False)
     is_edited = Column(Boolean, default=False)
-    reply_to_message_id = Column(UUID, ForeignKey("messages.id"), nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    reply_to_message_id = Column(UUID, nullable=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True, nullable=False, server_default=func.now())
     edited_at = Column(DateTime(timezone=True), onupdate=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -29,9 +49,17 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
     group = relationship("Group", back_populates="messages")
-    reply_to = relationship("Message",remote_side="Message.id", back_populates="replies")
-    attachments = relationship("Attachment", back_populates="message", uselist=True)
-    replies = relationship("Message", back_populates="reply_to", uselist=True)
+    reply_to = relationship(
+        "Message", primaryjoin="foreign(Message.reply_to_message_id) == Message.id",
+        remote_side="Message.id", back_populates="replies")
+    attachments = relationship(
+        "Attachment", primaryjoin="Message.id == foreign(Attachment.message_id)",
+        back_populates="message", uselist=True)
+    replies = relationship(
+        "Message", primaryjoin="foreign(Message.reply_to_message_id) == Message.id",
+        back_populates="reply_to", uselist=True)
+
+    __mapper_args__ = {"primary_key": [id]}
 
     # Define either receiver_id or group_id must be set, but not both
     __table_args__ = (
@@ -39,21 +67,41 @@ class Message(Base):
         CheckConstraint('NOT(receiver_id IS NULL AND group_id IS NULL)'),
         # Check constraint: both receiver_id and group_id cannot be null
         CheckConstraint('NOT(receiver_id IS NOT NULL AND group_id IS NOT NULL)'),
+        # Composite indexes backing keyset pagination of message history
+        Index("ix_messages_group_id_created_at_id", "group_id", "created_at", "id"),
+        Index("ix_messages_conversation_id_created_at_id", "conversation_id", "created_at", "id"),
+        Index("ix_messages_search_vector", "search_vector", postgresql_using="gin"),
+        # Serves the reply-thread walk and the per-message reply counts
+        Index("ix_messages_reply_to_message_id_created_at", "reply_to_message_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
 class Attachment(Base):
     __tablename__ = "attachments"
     id = Column(UUID(as_uuid=True), primary_key=True, index=True, default=uuid.uuid4)
-    message_id = Column(UUID(as_uuid=True), ForeignKey("messages.id"))
+    message_id = Column(UUID(as_uuid=True), index=True)
     file_url = Column(String, nullable=False)
     file_name = Column(String, nullable=True)
     file_type = Column(String, nullable=False)
+    # Set for uploaded files; identical content shares one blob
+    size = Column(BigInteger, nullable=True)
+    digest = Column(String(64), ForeignKey("blobs.digest"), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
-    message = relationship("Message", back_populates="attachments")
+    blob = relationship("Blob")
+    message = relationship(
+        "Message", primaryjoin="foreign(Attachment.message_id) == Message.id", back_populates="attachments")
+
+class Blob(Base):
+    """The blob model defines the structure of the 'blobs' table, which stores
+    one row per distinct uploaded content, keyed by its sha256 digest.
+    Attachments forwarded many times all point at the same blob."""
+    __tablename__ = "blobs"
+    digest = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=True)
+    storage_key = Column(String, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-# to do - implement message reactions
 # to do - implement message editing and deletion
-# to do - implement read receipts per user for group chats
-# to do - implement message search
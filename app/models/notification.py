@@ -1,7 +1,7 @@
 """This houses the models for defining the notification table."""
 
 from app.db.database import Base
-from sqlalchemy import Boolean, Column, Enum, ForeignKey, DateTime, Text
+from sqlalchemy import BigInteger, Boolean, Column, Enum, ForeignKey, DateTime, Index, Integer, String, Text, and_, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -19,26 +19,51 @@ class NotificationType(enum.Enum):
 
 class Notification(Base):
     """The notification model defines the structure of the 'notifications' table,
-    which stores user notifications for the chat app."""
+    which stores user notifications for the chat app.
+    Chatty sources are coalesced: while a notification with the same coalesce_key
+    is unread, new events are merged into it and bump its count instead of
+    adding rows (see app/crud/notifications.py)."""
     __tablename__ = "notifications"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=False)
     sender_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
     group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete="SET NULL"), nullable=True)
-    message_id = Column(UUID(as_uuid=True), ForeignKey("messages.id", ondelete="SET NULL"), nullable=True)
+    # No foreign key, messages is partitioned and its id alone is not unique to Postgres
+    message_id = Column(UUID(as_uuid=True), nullable=True)
     friendship_id = Column(UUID(as_uuid=True), ForeignKey("friendships.id", ondelete="SET NULL"), nullable=True)
     type = Column(Enum(NotificationType), nullable=False)
-    message = Column(Text, nullable=False)
+    # Mapped as content, `message` is the relationship to the referenced message
+    content = Column("message", Text, nullable=False)
+    # The group or sender that unread notifications of this type are merged by
+    coalesce_key = Column(String, nullable=True)
+    count = Column(Integer, nullable=False, default=1, server_default="1")
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # The transaction that created or last coalesced the row, orders the live stream
+    # (rows older than the stream support are 0)
+    stream_xid = Column(BigInteger, nullable=True, server_default=text("(pg_current_xact_id()::text::bigint)"))
 
     # Relationships
     user = relationship("User", foreign_keys=[user_id], back_populates="notifications")
     sender = relationship("User", foreign_keys=[sender_id])
     group = relationship("Group", foreign_keys=[group_id])
-    message = relationship("Message", foreign_keys=[message_id])
+    message = relationship("Message", primaryjoin="foreign(Notification.message_id) == Message.id")
     friendship = relationship("Friendship", foreign_keys=[friendship_id])
 
-# to do - add an expiration mechanis to auto-delete notifications after a certain period of time
-# to do - add a method to mark notifications as read
+    __table_args__ = (
+        # Keyset listing of a user's notifications, read backwards for newest first
+        Index("ix_notifications_user_id_created_at_id", "user_id", "created_at", "id"),
+        # The polled unread listing and mark-all-as-read only touch unread rows
+        Index(
+            "ix_notifications_user_id_unread", "user_id", "created_at", "id",
+            postgresql_where=is_read.is_not(True)),
+        # Live stream reads, after the last event sent
+        Index("ix_notifications_user_id_stream_xid_id", "user_id", "stream_xid", "id"),
+        # Oldest-first keyset scan of the retention purge, per type (app/db/retention.py)
+        Index("ix_notifications_type_created_at_id", "type", "created_at", "id"),
+        # At most one unread notification per coalescing target, the ON CONFLICT arbiter
+        Index(
+            "uq_notifications_unread_coalesce_key", "user_id", "type", "coalesce_key", unique=True,
+            postgresql_where=and_(is_read.is_not(True), coalesce_key.is_not(None))),
+    )
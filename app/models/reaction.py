@@ -0,0 +1,30 @@
+"""This houses the models for defining the message reaction tables."""
+
+from app.db.database import Base
+from sqlalchemy import Column, DateTime, ForeignKey, String, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.sql import func
+
+
+class MessageReaction(Base):
+    """The message reaction model defines the structure of the 'message_reactions' table,
+    which records who reacted to a message with which emoji.
+    The primary key makes a reaction unique per (message, user, emoji)."""
+    __tablename__ = "message_reactions"
+
+    # No foreign key, messages is partitioned and its id alone is not unique
+    message_id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    emoji = Column(String(32), primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class MessageReactionSummary(Base):
+    """The message reaction summary model defines the structure of the
+    'message_reaction_summaries' table, which keeps the materialized emoji -> count
+    map of each message. It is updated in the same transaction as the reaction
+    rows, so rendering a message never has to count them."""
+    __tablename__ = "message_reaction_summaries"
+
+    message_id = Column(UUID(as_uuid=True), primary_key=True)
+    counts = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,31 @@
+"""This houses the model for defining the read cursor table."""
+
+from app.db.database import Base
+from sqlalchemy import CheckConstraint, Column, DateTime, ForeignKey, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import uuid
+
+
+class ReadCursor(Base):
+    """The read cursor model defines the structure of the 'read_cursors' table,
+    which stores how far each user has read a conversation or a group chat.
+    Every message created at or before the watermark counts as read for that user,
+    so read state is one row per (user, chat) instead of a flag per message."""
+    __tablename__ = "read_cursors"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    conversation_id = Column(UUID(as_uuid=True), nullable=True)
+    group_id = Column(UUID(as_uuid=True), ForeignKey("groups.id", ondelete="CASCADE"), nullable=True)
+    last_read_message_id = Column(UUID(as_uuid=True), nullable=True)
+    last_read_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # A cursor tracks either a direct conversation or a group, never both
+        CheckConstraint('NOT(conversation_id IS NULL AND group_id IS NULL)'),
+        CheckConstraint('NOT(conversation_id IS NOT NULL AND group_id IS NOT NULL)'),
+        UniqueConstraint("user_id", "conversation_id", name="uq_read_cursors_user_id_conversation_id"),
+        UniqueConstraint("user_id", "group_id", name="uq_read_cursors_user_id_group_id"),
+    )
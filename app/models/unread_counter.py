@@ -0,0 +1,27 @@
+"""This houses the model for defining the unread counter table."""
+
+from app.db.database import Base
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+import enum
+
+
+class CounterScope(enum.Enum):
+    """This class defines what an unread counter counts."""
+    CONVERSATION = "conversation"
+    GROUP = "group"
+    NOTIFICATIONS = "notifications"
+
+class UnreadCounter(Base):
+    """The unread counter model defines the structure of the 'unread_counters' table,
+    which keeps materialized unread totals for the inbox badges.
+    The scope_id is the other participant for direct conversations, the group id
+    for groups and the user's own id for notifications."""
+    __tablename__ = "unread_counters"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    scope = Column(Enum(CounterScope), primary_key=True)
+    scope_id = Column(UUID(as_uuid=True), primary_key=True)
+    unread_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
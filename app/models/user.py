@@ -1,9 +1,8 @@
 """User Table Model."""
 from app.db.database import Base
-from sqlalchemy import Boolean, Column, DateTime, String
+from sqlalchemy import Boolean, Column, DateTime, Index, String, func, literal_column
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
 import uuid
 
 class User(Base):
@@ -16,7 +15,10 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # No longer written, presence is tracked in memory (app/core/presence.py)
     is_online = Column(Boolean, default=False)
+    # Flushed in batches from the presence tracker
+    last_seen_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -31,3 +33,16 @@ class User(Base):
 
     # Many to Many Relationship with groups
     groups = relationship("GroupMember", back_populates="user")
+
+    __table_args__ = (
+        # Autocomplete, see app/core/autocomplete.py (the expressions must match): short prefixes on the username,
+        # longer queries through trigrams over username and names
+        Index("ix_users_username_prefix", func.lower(username).collate("C")),
+        Index(
+            "ix_users_autocomplete_trgm",
+            func.lower(
+                username + literal_column("' '") + func.coalesce(first_name, literal_column("''"))
+                + literal_column("' '") + func.coalesce(last_name, literal_column("''"))
+            ).label("autocomplete"),
+            postgresql_using="gin", postgresql_ops={"autocomplete": "gin_trgm_ops"}),
+    )
@@ -1,8 +1,9 @@
 """Friendship schema module."""
+from app.schemas.user import User
 from enum import Enum
 from datetime import datetime
 from pydantic import BaseModel, UUID4
-from typing import Optional
+from typing import List, Optional
 
 
 class FriendshipStatus(str, Enum):
@@ -42,3 +43,19 @@ class FriendshipInDBBase(FriendshipBase):
 class Friendship(FriendshipInDBBase):
     """This extends the FriendshipInDBBase fields."""
     pass
+
+# Friend graph
+class MutualFriends(BaseModel):
+    """The friends the caller has in common with another user."""
+    user_id: UUID4
+    count: int
+    friend_ids: List[UUID4]
+
+class FriendSuggestion(BaseModel):
+    """A friend of friends, with the number of friends in common."""
+    user: User
+    mutual_friends: int
+
+class FriendSuggestions(BaseModel):
+    """Friend suggestions, most mutual friends first."""
+    items: List[FriendSuggestion]
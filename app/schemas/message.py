@@ -1,18 +1,34 @@
 """ """
+from app.schemas.user import User
 from datetime import datetime
 from pydantic import BaseModel, UUID4
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 class AttachmentBase(BaseModel):
     """Base class for attachment."""
     file_name: str
     file_url: str
     file_type: str
-    # size: int
+    size: Optional[int] = None
+    digest: Optional[str] = None
 
-class AttachmentCreate(AttachmentBase):
-    """Create attachment class."""
-    pass
+class AttachmentCreate(BaseModel):
+    """Create attachment class.
+    The content is referenced by the digest and upload token returned by the
+    upload; its size, type and URL are taken from the stored blob."""
+    file_name: str
+    digest: str
+    upload_token: str
+
+class AttachmentUpload(BaseModel):
+    """The stored content of an uploaded file, to be referenced from an attachment."""
+    file_name: str
+    file_url: str
+    file_type: str
+    size: int
+    digest: str
+    upload_token: str
+    deduplicated: bool = False
 
 class AttachmentInDBBase(AttachmentBase):
     """Base class for attachment stored in database."""
@@ -70,3 +86,49 @@ class MessageInDBBase(MessageBase):
 class Message(MessageInDBBase):
     """This extends the MessageInDBBase fields."""
     attachments: List[Attachment] = []
+    # emoji -> count, filled from the batch fetch in app/crud/reaction.py
+    reactions: Dict[str, int] = {}
+
+class MessagePage(BaseModel):
+    """A page of messages with the cursors to fetch the neighbouring pages,
+    and the profiles of their senders keyed by user id."""
+    items: List[Message] = []
+    senders: Dict[UUID4, User] = {}
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+class MessageBulkCreate(BaseModel):
+    """A batch of messages sent by the same user."""
+    messages: List[MessageCreate]
+
+class MessageBulkResult(BaseModel):
+    """The ids of the created messages, in input order."""
+    ids: List[UUID4] = []
+
+class MessageSearchHit(MessageInDBBase):
+    """A message matching a search, with its relevance."""
+    rank: float
+
+class MessageSearchPage(BaseModel):
+    """A page of search hits, best matches first."""
+    items: List[MessageSearchHit] = []
+    next_cursor: Optional[str] = None
+
+class MessageThreadNode(MessageInDBBase):
+    """A message of a reply thread, with its depth below the root message."""
+    depth: int
+    reply_count: int
+    reactions: Dict[str, int] = {}
+
+class MessageThread(BaseModel):
+    """A reply thread flattened depth-first, starting with the root message."""
+    items: List[MessageThreadNode] = []
+
+class ReactionSummary(BaseModel):
+    """The reaction counts of a message."""
+    message_id: UUID4
+    reactions: Dict[str, int] = {}
+
+class ReactionSummaries(BaseModel):
+    """The reaction counts of a page of messages."""
+    items: List[ReactionSummary] = []
@@ -3,7 +3,7 @@
 from enum import Enum
 from datetime import datetime
 from pydantic import BaseModel, UUID4
-from typing import Optional
+from typing import List, Optional
 
 
 class NotificationType(str, Enum):
@@ -40,6 +40,8 @@ class NotificationInDBBase(NotificationBase):
     group_id: Optional[UUID4] = None
     message_id: Optional[UUID4] = None
     friendship_id: Optional[UUID4] = None
+    # Number of events merged into this notification while it was unread
+    count: int = 1
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -50,3 +52,8 @@ class NotificationInDBBase(NotificationBase):
 class Notification(NotificationInDBBase):
     """This extends the NotificationInDBBase fields."""
     pass
+
+class NotificationPage(BaseModel):
+    """A page of notifications with the cursor of the next (older) page."""
+    items: List[Notification] = []
+    next_cursor: Optional[str] = None
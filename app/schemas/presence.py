@@ -0,0 +1,16 @@
+"""Pydantic schemas for presence."""
+
+from datetime import datetime
+from pydantic import BaseModel, UUID4
+from typing import List, Optional
+
+
+class Presence(BaseModel):
+    """The presence of a user."""
+    user_id: UUID4
+    is_online: bool
+    last_seen: Optional[datetime] = None
+
+class PresenceList(BaseModel):
+    """The presence of several users, in request order."""
+    items: List[Presence] = []
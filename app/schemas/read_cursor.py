@@ -0,0 +1,36 @@
+"""Pydantic schemas for read cursors."""
+
+from datetime import datetime
+from pydantic import BaseModel, UUID4
+from typing import Optional
+
+
+class ReadCursorUpdate(BaseModel):
+    """Advances the read watermark of a conversation or group to a message."""
+    message_id: UUID4
+    group_id: Optional[UUID4] = None
+    other_user_id: Optional[UUID4] = None
+
+class ReadCursor(BaseModel):
+    """This class is used for returning read cursors to clients."""
+    conversation_id: Optional[UUID4] = None
+    group_id: Optional[UUID4] = None
+    last_read_message_id: Optional[UUID4] = None
+    last_read_at: datetime
+
+    class Config:
+        """Config class for ORM model."""
+        orm_mode = True
+
+class UnreadCount(BaseModel):
+    """The number of unread messages in a conversation or group."""
+    unread: int
+
+class MarkAsRead(BaseModel):
+    """Marks a chat as read up to a message or a timestamp (everything if neither is set)."""
+    up_to_message_id: Optional[UUID4] = None
+    up_to: Optional[datetime] = None
+
+class MarkAsReadResult(BaseModel):
+    """The number of items that became read."""
+    updated: int
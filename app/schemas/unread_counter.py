@@ -0,0 +1,13 @@
+"""Pydantic schemas for unread counters."""
+
+from pydantic import BaseModel, UUID4
+from typing import Dict
+
+
+class BadgeCounts(BaseModel):
+    """The unread totals shown on the inbox badges.
+    Conversations are keyed by the other participant, groups by group id."""
+    notifications: int = 0
+    conversations: Dict[UUID4, int] = {}
+    groups: Dict[UUID4, int] = {}
+    total: int = 0
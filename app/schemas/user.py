@@ -2,7 +2,7 @@
 
 from datetime import datetime
 from pydantic import BaseModel, EmailStr, UUID4
-from typing import Optional
+from typing import List, Optional
 
 
 # Shared properties
@@ -11,7 +11,6 @@ class UserBase(BaseModel):
     email: Optional[EmailStr] = None
     username: Optional[str] = None
     is_active: Optional[bool] = True
-    is_online: Optional[bool] = False
 
 # Properties to receive via API on creation
 class UserCreate(UserBase):
@@ -47,3 +46,15 @@ class User(UserInDBBase):
 class UserInDB(UserInDBBase):
     """This class inherits from UserInDBBase and adds hashed password field."""
     hashed_password: str
+
+# Autocomplete suggestions
+class UserSuggestion(BaseModel):
+    """A user matching an autocomplete query."""
+    user_id: UUID4
+    username: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+
+class UserSuggestions(BaseModel):
+    """Autocomplete suggestions, best first."""
+    items: List[UserSuggestion] = []